@@ -20,9 +20,89 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 5 * 1024 * 1024  # 最大上传文件大小（5MB）
     ALLOWED_EXTENSIONS: set = {"jpg", "jpeg", "png"}  # 允许的图片格式
     
+    # 批量提交配置
+    BATCH_MAX_FILES: int = 500  # 单个批量任务的最大图片数
+    BATCH_MAX_ZIP_SIZE: int = 500 * 1024 * 1024  # 批量上传的 ZIP 文件最大大小（500MB）
+    
     # Redis 缓存配置
     REDIS_HOST: str = "redis"  # Redis 服务器地址
     REDIS_PORT: int = 6379  # Redis 服务器端口
+    REDIS_DB: int = 0  # Redis 数据库编号
+    REDIS_QUEUE_PREFIX: str = "taskqueue"  # Redis 队列键前缀
+    REDIS_RESULT_TTL: int = 3600  # 任务结果在 Redis 中的保留时间（秒）
+    REDIS_STORE_RESULT_IMAGES: bool = True  # 是否将结果图片保存到 Redis，供不共享磁盘的节点读取
+    REDIS_STORE_INPUT_IMAGES: bool = True  # 是否将上传的图片保存到 Redis，供不共享磁盘的工作节点读取（保留 UPLOAD_TTL 秒）
+    
+    # 人脸检测配置
+    FACE_DETECTION_MODEL: int = 0  # MediaPipe 人脸检测模型：0 近距离（2米内），1 全距离
+    FACE_DETECTION_CONFIDENCE: float = 0.5  # 人脸检测最低置信度
+    FACE_DETECTION_SIZE: int = 640  # 检测前将图片缩小到的长边尺寸（像素），0 表示使用原图检测
+    
+    # 同步接口（头像裁剪、人像检测）执行器配置
+    INLINE_MAX_WORKERS: int = 0  # 处理线程数，0 表示使用 CPU 核心数
+    INLINE_MAX_PENDING: int = 32  # 最大排队请求数，超出时返回 429
+    
+    # 背景移除同步处理（sync=true）配置
+    SYNC_MAX_WORKERS: int = 1  # API 进程中同步处理背景移除的线程数，0 表示关闭同步处理
+    SYNC_MAX_PIXELS: int = 640 * 640  # 允许同步处理的最大像素数，更大的图片转为异步任务
+    
+    # 头像裁剪输出配置
+    AVATAR_DEFAULT_QUALITY: int = 90  # JPEG/WebP 输出的默认质量（1-100）
+    AVATAR_MAX_OUTPUT_SIZE: int = 1024  # 请求可指定的最大输出边长（像素）
+    
+    # 背景移除结果编码配置（格式由背景移除配置或请求参数指定）
+    RESULT_DEFAULT_QUALITY: int = 85  # WebP/AVIF 未指定质量时使用的编码质量（1-100，WebP 为 100 时无损）
+    RESULT_PNG_COMPRESSION: int = 6  # PNG 未指定压缩级别时使用的级别（0-9，越大体积越小、编码越慢）
+    RESULT_WEBP_METHOD: int = 4  # WebP 编码的压缩力度（0-6，越大体积越小、编码越慢）
+    RESULT_AVIF_SPEED: int = 8  # AVIF 编码速度（0-10，越小体积越小、编码越慢）
+    
+    # 边缘细化（band 引擎）配置
+    MATTING_TILE_SIZE: int = 128  # 过渡带分块边长（像素）
+    MATTING_TILE_MARGIN: int = 16  # 每个分块向外扩展的像素数，为分块边缘提供邻域
+    MATTING_WORKERS: int = 2  # 并行求解分块的进程数，0 表示在当前进程中求解
+    MATTING_PARALLEL_MIN_TILES: int = 8  # 分块数达到该值时才使用进程池
+    
+    # 模型会话池配置
+    MODEL_SESSION_MEMORY_MB: int = 1024  # 工作进程中常驻模型会话的内存预算（MB），超出时按LRU淘汰
+    
+    # 工作进程池配置
+    WORKER_CONCURRENCY: int = 2  # 背景移除工作进程数量
+    WORKER_SHUTDOWN_TIMEOUT: int = 30  # 关闭时等待工作进程完成当前任务的最长时间（秒）
+    WORKER_RESTART_DELAY: int = 5  # 工作进程崩溃后重启前的等待时间（秒）
+    WORKER_POLL_INTERVAL: float = 1.0  # 未收到入队通知时的兜底轮询间隔（秒）
+    WORKER_BATCH_SIZE: int = 1  # 单次批量推理的最大任务数，1 表示不合并；需要以可变 batch 维度导出的模型，rembg 自带的模型通常不支持
+    WORKER_BATCH_MAX_WAIT_MS: int = 50  # 凑满一个批次的最长等待时间（毫秒）
+    CONFIG_CACHE_TTL: int = 60  # 工作进程缓存背景移除配置的时间（秒），仅用于未携带配置快照的任务
+    
+    # 结果缓存配置
+    RESULT_CACHE_ENABLED: bool = True  # 是否对相同图片和参数复用已生成的结果
+    RESULT_CACHE_DIR: str = "data/cache"  # 结果缓存目录
+    RESULT_CACHE_MAX_SIZE_MB: int = 2048  # 结果缓存最大占用空间（MB）
+    RESULT_CACHE_TTL: int = 7 * 24 * 3600  # 缓存条目保留时间（秒）
+    RESULT_CACHE_EVICT_INTERVAL: int = 60  # 两次容量检查之间的最小间隔（秒）
+    
+    # 任务状态推送配置
+    TASK_EVENTS_POLL_INTERVAL: float = 2.0  # SSE 连接在未收到推送时重新检查任务状态的间隔（秒）
+    TASK_EVENTS_TIMEOUT: int = 300  # SSE 连接的最长保持时间（秒）
+    
+    # 任务队列配置
+    TASK_QUEUE_BACKEND: str = "file"  # 队列后端：file（JSON文件）、sqlite 或 redis
+    TASK_QUEUE_SQLITE_PATH: str = "data/tasks.db"  # SQLite 队列数据库路径
+    TASK_QUEUE_BULK_SHARE: float = 0.1  # 交互通道持续有任务时，优先领取批量通道任务的概率（防止批量任务饿死）
+    TASK_LEASE_SECONDS: int = 60  # 领取任务的租约时长（秒），工作进程处理期间定期续约，过期视为工作进程已崩溃
+    TASK_HEARTBEAT_INTERVAL: int = 15  # 工作进程续约的间隔（秒），应明显小于租约时长
+    TASK_SWEEP_INTERVAL: int = 10  # 检查过期租约的间隔（秒）
+    TASK_MAX_ATTEMPTS: int = 3  # 任务最多执行的次数，租约过期达到该次数后转入死信状态
+    TASK_RETRY_BACKOFF: float = 5.0  # 重新执行前的等待时间（秒），每次重试加倍
+    
+    # 磁盘清理配置
+    JANITOR_INTERVAL: int = 300  # 清理任务的执行间隔（秒），0 表示关闭
+    TASK_RESULT_TTL: int = 3600  # 已结束任务及其结果图片的保留时间（秒）
+    UPLOAD_TTL: int = 24 * 3600  # 未被任务删除的上传文件的保留时间（秒），应大于任务的最长排队时间
+    DATA_DISK_QUOTA_MB: int = 0  # 上传、结果和队列目录的总空间上限（MB），超出时提前删除最早的结果图片，0 表示不限制
+    
+    # 监控指标配置
+    METRICS_MULTIPROC_DIR: str = "data/metrics"  # API 进程与工作进程共享的 Prometheus 指标目录（未设置 PROMETHEUS_MULTIPROC_DIR 时使用）
     
     class Config:
         env_file = ".env"  # 指定环境变量文件路径
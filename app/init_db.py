@@ -1,12 +1,38 @@
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine
 from app.models.config import BackgroundRemovalConfig
 from app.database import Base
 
+def add_missing_columns():
+    """
+    为已存在的表补充模型中新增的列
+    
+    create_all 只会创建不存在的表，不会修改已有表的结构。
+    这里对比模型和数据库中的列，对缺少的列执行 ALTER TABLE ADD COLUMN（使用列的 server_default 作为默认值）
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                statement = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                if column.server_default is not None:
+                    statement += f" DEFAULT '{column.server_default.arg}'"
+                conn.execute(text(statement))
+                print(f"已为表 {table.name} 添加列 {column.name}")
+
 def init_db():
     """初始化数据库"""
     # 创建所有表
     Base.metadata.create_all(bind=engine)
+    # 补充已有表中缺少的列
+    add_missing_columns()
     
     # 创建数据库会话
     db = SessionLocal()
@@ -1,14 +1,25 @@
 import os
+import asyncio
 import multiprocessing
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from datetime import datetime, timedelta
 from jose import jwt
 from .core.config import settings
 from .routers import background, avatar, person, config
-from app.worker import start_worker
+from app.worker import WorkerPool
+from app.utils.task_queue import create_backend, migrate_file_tasks
+from app.utils.task_events import task_events
+from app.utils.executor import get_inline_executor, get_sync_executor
+from app.utils.janitor import Janitor
+from app.utils.matting import shutdown_tile_pool
+from app.database import SessionLocal
+from app.utils import metrics
+from app.init_db import init_db
 from fastapi.responses import FileResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 
 # 设置环境变量以解决OpenMP线程冲突问题
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
@@ -102,19 +113,43 @@ async def login(username: str = "test_user", password: str = "test_password"):
 # 健康检查端点
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
-
-def start_worker_process():
-    """启动工作进程"""
-    # 确保工作进程使用spawn方式启动，避免OpenMP线程冲突
-    ctx = multiprocessing.get_context('spawn')
-    worker_process = ctx.Process(target=start_worker)
-    worker_process.start()
-    return worker_process
+    return {
+        "status": "healthy",
+        "inline_executor": get_inline_executor().stats(),
+        "sync_executor": get_sync_executor().stats(),
+        "janitor": app.state.janitor.last_report if hasattr(app.state, "janitor") else None
+    }
+
+# 监控指标端点：汇总 API 进程和所有工作进程的指标
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    # 队列深度需要查询队列后端，放到线程池中执行
+    content = await run_in_threadpool(metrics.render)
+    return Response(content, media_type=CONTENT_TYPE_LATEST)
+
+def register_metrics(worker_pool: WorkerPool):
+    """注册在抓取时计算的队列深度和工作进程指标"""
+    metrics.register_gauge(
+        "task_queue_depth", "队列中待处理和处理中的任务数", background.task_queue.queue_depth, label="status"
+    )
+    metrics.register_gauge("workers_alive", "存活的工作进程数", worker_pool.alive_count)
+    metrics.register_gauge("worker_restarts", "崩溃后重启的工作进程数", lambda: worker_pool.restarts)
+
+def start_worker_pool():
+    """启动工作进程池"""
+    worker_pool = WorkerPool(settings.WORKER_CONCURRENCY)
+    worker_pool.start()
+    # 提交任务时通知工作进程立即领取
+    background.task_queue.attach_notifier(worker_pool.task_event)
+    return worker_pool
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动时的事件处理"""
+    # 启用多进程指标并清理上次运行的指标文件（在记录任何指标、启动工作进程之前）
+    metrics.init_metrics()
+    metrics.clear_multiproc_dir()
+    
     # 创建必要的目录
     os.makedirs("data/uploads", exist_ok=True)
     os.makedirs("data/results/images", exist_ok=True)
@@ -130,14 +165,45 @@ async def startup_event():
     print(f"KMP_DUPLICATE_LIB_OK: {os.environ.get('KMP_DUPLICATE_LIB_OK')}")
     print(f"OMP_NUM_THREADS: {os.environ.get('OMP_NUM_THREADS')}")
     print(f"多进程启动方式: {multiprocessing.get_start_method()}")
-
-    # 启动工作进程
-    app.state.worker_process = start_worker_process()
+    
+    # 创建数据库表并补充新增的列
+    init_db()
+    
+    # 切换到非文件队列后端时，迁移文件队列中遗留的任务
+    if settings.TASK_QUEUE_BACKEND != "file":
+        migrated = migrate_file_tasks(create_backend())
+        if migrated:
+            print(f"已将 {migrated} 个文件队列任务迁移到 {settings.TASK_QUEUE_BACKEND} 后端")
+
+    # 创建同步接口的执行器，并预先创建全部线程（各自初始化人脸检测器）
+    get_inline_executor()
+    
+    # 预加载同步背景移除使用的默认模型
+    db = SessionLocal()
+    try:
+        background.warm_sync_session(db)
+    finally:
+        db.close()
+    
+    app.state.worker_pool = start_worker_pool()
+    register_metrics(app.state.worker_pool)
+    # 将工作进程上报的任务状态推送给订阅的客户端
+    task_events.start(app.state.worker_pool.events, asyncio.get_running_loop())
+    
+    # 定期清理过期的结果、上传文件，并限制磁盘占用
+    app.state.janitor = Janitor(background.task_queue)
+    app.state.janitor.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时的事件处理"""
-    # 停止工作进程
-    if hasattr(app.state, "worker_process"):
-        app.state.worker_process.terminate()
-        app.state.worker_process.join()
\ No newline at end of file
+    # 停止工作进程池，等待正在处理的任务完成（在线程池中等待，不阻塞事件循环）
+    if hasattr(app.state, "worker_pool"):
+        await run_in_threadpool(app.state.worker_pool.stop)
+    if hasattr(app.state, "janitor"):
+        app.state.janitor.stop()
+    task_events.stop()
+    get_inline_executor().shutdown()
+    get_sync_executor().shutdown()
+    # 同步接口使用 band 引擎时在 API 进程中创建的分块求解进程池
+    shutdown_tile_pool()
\ No newline at end of file
@@ -13,5 +13,30 @@ class BackgroundRemovalConfig(Base):
     alpha_foreground = Column(Integer, default=240, comment="alpha matting前景阈值")
     alpha_background = Column(Integer, default=10, comment="alpha matting背景阈值")
     alpha_erode = Column(Integer, default=15, comment="alpha matting腐蚀尺寸")
+    composite_mode = Column(String(20), default="resize", server_default="resize", comment="合成方式：resize 放大处理结果，mask 只放大掩码与原图合成")
+    refine_edges = Column(Boolean, default=False, server_default="0", comment="mask 合成时是否使用引导滤波修正边缘")
+    matting_engine = Column(String(20), nullable=True, comment="边缘细化引擎：none、guided、band、pymatting，为空时按 use_alpha_matting 选择")
+    output_format = Column(String(10), default="png", server_default="png", comment="结果格式：png、webp、avif，auto 按请求的 Accept 头选择")
+    output_quality = Column(Integer, nullable=True, comment="WebP/AVIF 编码质量（1-100），为空时使用全局默认值")
+    png_compression = Column(Integer, nullable=True, comment="PNG 压缩级别（0-9），为空时使用全局默认值")
+    lossy_alpha = Column(Boolean, default=False, server_default="0", comment="WebP 是否对透明通道使用有损编码")
     is_default = Column(Boolean, default=False, comment="是否为默认配置")
-    description = Column(String(200), nullable=True, comment="配置描述") 
\ No newline at end of file
+    description = Column(String(200), nullable=True, comment="配置描述")
+
+    def processing_params(self) -> dict:
+        """返回影响处理结果的参数，作为任务的配置快照"""
+        return {
+            "max_size": self.max_size,
+            "model": self.model,
+            "use_alpha_matting": self.use_alpha_matting,
+            "alpha_foreground": self.alpha_foreground,
+            "alpha_background": self.alpha_background,
+            "alpha_erode": self.alpha_erode,
+            "composite_mode": self.composite_mode or "resize",
+            "refine_edges": bool(self.refine_edges),
+            "matting_engine": self.matting_engine,
+            "output_format": self.output_format or "png",
+            "output_quality": self.output_quality,
+            "png_compression": self.png_compression,
+            "lossy_alpha": bool(self.lossy_alpha)
+        } 
\ No newline at end of file
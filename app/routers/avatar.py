@@ -1,9 +1,13 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, Response
 import cv2
 import numpy as np
-from ..utils.image_processing import validate_image, detect_faces, crop_avatar
+from ..utils.image_processing import (
+    validate_image, detect_faces, crop_avatar, resize_to_fit, encode_image, IMAGE_FORMATS
+)
+from ..utils.executor import get_inline_executor, ExecutorSaturated
 from ..core.security import verify_token
+from ..core.config import settings
 from typing import Optional
 
 # 创建路由实例
@@ -26,9 +30,36 @@ async def get_current_user(token: str = Depends(verify_token)):
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     return token
 
+def _detect_and_crop(contents: bytes, output_format: Optional[str] = None,
+                     size: Optional[int] = None, quality: int = 90):
+    """
+    解码图片、检测人脸并裁剪头像（在线程池中执行）
+    
+    指定 output_format 时，先将裁剪结果缩放到 size 再编码，返回编码后的图片数据
+    """
+    nparr = np.frombuffer(contents, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        return None, []
+    
+    faces = detect_faces(img)
+    if not faces:
+        return None, faces
+    
+    avatar = crop_avatar(img, faces[0])
+    if output_format is None:
+        return avatar, faces
+    
+    if size:
+        avatar = resize_to_fit(avatar, size)
+    return encode_image(avatar, output_format, quality), faces
+
 @router.post("/crop")
 async def crop_avatar_endpoint(
     image: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="输出格式：png、jpeg 或 webp，不指定时只返回 JSON"),
+    size: Optional[int] = Query(None, ge=16, le=settings.AVATAR_MAX_OUTPUT_SIZE, description="输出头像（正方形）的边长（像素）"),
+    quality: int = Query(settings.AVATAR_DEFAULT_QUALITY, ge=1, le=100, description="JPEG/WebP 质量"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -36,34 +67,52 @@ async def crop_avatar_endpoint(
     
     参数:
         image (UploadFile): 上传的图片文件
+        format (Optional[str]): 输出格式，指定时直接返回裁剪后的图片
+        size (Optional[int]): 输出头像的边长，编码前先缩放
+        quality (int): JPEG/WebP 编码质量
         current_user (dict): 当前用户信息（通过令牌验证）
     
     返回:
-        JSONResponse: 包含处理结果的 JSON 响应
+        JSONResponse: 未指定 format 时，包含处理结果的 JSON 响应
+        Response: 指定 format 时，裁剪后的图片（响应头 X-Face-Count 为检测到的人脸数）
     
     处理流程:
         1. 验证上传的图片文件
         2. 读取图片数据
         3. 检测人脸位置
         4. 裁剪头像
-        5. 返回处理结果
+        5. 按需缩放并编码
+        6. 返回处理结果
     """
+    if format is not None:
+        format = format.lower()
+        if format == "jpg":
+            format = "jpeg"
+        if format not in IMAGE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported output format: {format}")
+    
     # 验证图片
     if not validate_image(image):
         raise HTTPException(status_code=400, detail="Invalid image file")
     
     # 读取图片
     contents = await image.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
-    # 检测人脸
-    faces = detect_faces(img)
+    # 解码、检测人脸和裁剪头像在线程池中执行，避免阻塞事件循环
+    try:
+        avatar, faces = await get_inline_executor().run(_detect_and_crop, contents, format, size, quality)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=429, detail="Server busy, please retry later", headers={"Retry-After": "1"})
+    
     if not faces:
         raise HTTPException(status_code=400, detail="No face detected in the image")
     
-    # 裁剪头像
-    avatar = crop_avatar(img, faces[0])
+    if format is not None:
+        return Response(
+            content=avatar,
+            media_type=IMAGE_FORMATS[format][1],
+            headers={"X-Face-Count": str(len(faces))}
+        )
     
     # 返回结果
     return JSONResponse(
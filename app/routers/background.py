@@ -1,25 +1,46 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
-from fastapi.responses import Response, FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request
+from fastapi.responses import Response, FileResponse, StreamingResponse
 import cv2
 import numpy as np
 from PIL import Image
 import io
 from sqlalchemy.orm import Session
 from ..utils.image_processing import validate_image
-from ..utils.image_utils import change_background
+from ..utils.image_utils import change_background, change_background_options
 from ..core.security import verify_token
 from ..database import get_db
 from ..models.config import BackgroundRemovalConfig
-from typing import Optional
+from typing import List, Optional, Tuple
 import os
+import json
+import time
+import uuid
+import asyncio
+import zipfile
 from pathlib import Path
+from fastapi.concurrency import run_in_threadpool
 
+from app.core.config import settings
 from app.utils.task_queue import TaskQueue
-from app.schemas.background_removal import BackgroundRemovalResponse, TaskStatusResponse
+from app.utils.task_events import task_events
+from app.utils.result_cache import ResultCache, make_cache_key, link_or_copy
+from app.utils.result_encoding import (
+    RESULT_FORMATS, available_formats, negotiate_format, result_extension, media_type_for
+)
+from app.utils.executor import get_sync_executor, ExecutorSaturated
+from app.utils.session_pool import get_session_pool
+from app.utils import metrics
+from app.utils.uploads import (
+    save_upload, extract_zip_images, SavedUpload, UploadTooLarge, UnsupportedImageType, UPLOAD_CHUNK_SIZE
+)
+from app.schemas.background_removal import (
+    BackgroundRemovalResponse, TaskStatusResponse, BatchSubmitResponse, BatchItemStatus, BatchStatusResponse
+)
 
 # 创建路由实例
 router = APIRouter()
 task_queue = TaskQueue()
+result_cache = ResultCache() if settings.RESULT_CACHE_ENABLED else None
 
 async def get_current_user(token: str = Query(..., description="JWT token")):
     """
@@ -38,14 +59,208 @@ async def get_current_user(token: str = Query(..., description="JWT token")):
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     return verify_token(token)
 
+def _get_config(db: Session, config_id: Optional[int]) -> BackgroundRemovalConfig:
+    """获取指定的背景移除配置，未指定时为默认配置"""
+    if config_id:
+        config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.id == config_id).first()
+        if not config:
+            raise HTTPException(status_code=404, detail="Configuration not found")
+    else:
+        config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.is_default == True).first()
+        if not config:
+            raise HTTPException(status_code=404, detail="No default configuration found")
+    return config
+
+def _submit_upload(upload: SavedUpload, config: BackgroundRemovalConfig, config_snapshot: dict,
+                   user_id: Optional[str], extra_params: Optional[dict] = None,
+                   lane: str = "interactive") -> Tuple[str, bool]:
+    """
+    为已保存的上传图片创建背景移除任务
+    
+    相同图片和参数已处理过时直接复用缓存的结果，创建已完成的任务。
+    lane 为任务通道：单张上传使用 interactive，批量提交使用 bulk（优先级较低）。
+    
+    返回:
+        (任务ID, 是否来自缓存)
+    """
+    extra_params = extra_params or {}
+    
+    # 相同图片和参数已处理过时，直接复用缓存的结果
+    cache_key = None
+    if result_cache is not None:
+        cache_key = make_cache_key(upload.sha256, config_snapshot)
+        cached_path = result_cache.get(cache_key)
+        if cached_path is not None:
+            task_id = str(uuid.uuid4())
+            result_dir = Path("data/results/images")
+            result_dir.mkdir(parents=True, exist_ok=True)
+            result_path = result_dir / f"{task_id}.{result_extension(config_snapshot.get('output_format'))}"
+            try:
+                link_or_copy(cached_path, result_path)
+            except OSError:
+                # 缓存文件在读取时被淘汰，按正常流程处理
+                pass
+            else:
+                # 结果已存在，不再需要上传的文件
+                upload.path.unlink(missing_ok=True)
+                task_queue.add_completed_task(
+                    task_type="background_removal",
+                    params={
+                        "user_id": user_id,
+                        "config": config_snapshot,
+                        "cache_key": cache_key,
+                        **extra_params
+                    },
+                    result_path=str(result_path),
+                    task_id=task_id
+                )
+                return task_id, True
+    
+    # 添加到任务队列
+    task_id = task_queue.add_task(
+        task_type="background_removal",
+        params={
+            "input_path": str(upload.path),
+            "user_id": user_id,
+            "config_id": config.id,
+            "config": config_snapshot,
+            "cache_key": cache_key,
+            **extra_params
+        },
+        lane=lane
+    )
+    return task_id, False
+
+def _image_pixels(path: Path) -> int:
+    """读取图片头获取像素数（不解码图片数据）"""
+    with Image.open(path) as image:
+        return image.width * image.height
+
+def _remove_sync(input_path: Path, config_snapshot: dict, cache_key: Optional[str]) -> Tuple[bytes, dict]:
+    """
+    在同步执行器线程中移除背景（使用 API 进程的模型会话池）
+    
+    返回:
+        (PNG 内容, 各阶段耗时)
+    """
+    model = config_snapshot.get('model', 'u2net')
+    output = io.BytesIO()
+    timings = {}
+    change_background(
+        str(input_path), output, model=model, session=get_session_pool().get(model),
+        timings=timings, **change_background_options(config_snapshot)
+    )
+    content = output.getvalue()
+    if cache_key and result_cache is not None:
+        result_cache.put_bytes(cache_key, content)
+    return content, timings
+
+def _image_response(content: bytes, output_format: str, path: str) -> Response:
+    # 格式可能由 Accept 头协商得到，缓存需要区分 Accept
+    return Response(
+        content=content,
+        media_type=RESULT_FORMATS[output_format][1],
+        headers={"X-Processing-Path": path, "Vary": "Accept"}
+    )
+
+def _output_snapshot(config_snapshot: dict, request: Request, output_format: Optional[str],
+                     quality: Optional[int]) -> dict:
+    """
+    确定结果图片的格式和编码质量，返回更新后的配置快照
+    
+    请求参数 format 优先于配置的格式，必须是服务端支持的格式；
+    未指定时按配置的格式和请求的 Accept 头协商（配置为 auto 时选择客户端支持的体积最小的格式）。
+    quality 覆盖配置中的 WebP/AVIF 编码质量。
+    """
+    if output_format is not None:
+        output_format = output_format.lower()
+        if output_format not in available_formats():
+            raise HTTPException(status_code=400, detail=f"Unsupported output format: {output_format}")
+    else:
+        output_format = negotiate_format(config_snapshot.get('output_format'), request.headers.get("accept"))
+    
+    config_snapshot = {**config_snapshot, "output_format": output_format}
+    if quality is not None:
+        config_snapshot["output_quality"] = quality
+    return config_snapshot
+
+async def _try_remove_sync(upload: SavedUpload, config_snapshot: dict, started: float) -> Optional[Response]:
+    """
+    同步处理小图片，在同一个响应中直接返回 PNG
+    
+    命中结果缓存时直接返回缓存的结果。同步处理已关闭、图片像素数超过 SYNC_MAX_PIXELS、
+    模型会话尚未在 API 进程中预热或同步执行器没有空闲线程时返回 None，由调用方提交异步任务。
+    """
+    if settings.SYNC_MAX_WORKERS <= 0:
+        return None
+    
+    cache_key = make_cache_key(upload.sha256, config_snapshot) if result_cache is not None else None
+    cached_path = result_cache.get(cache_key) if cache_key else None
+    if cached_path is not None:
+        try:
+            content = await run_in_threadpool(cached_path.read_bytes)
+        except OSError:
+            # 缓存文件在读取时被淘汰，按未命中处理
+            content = None
+        if content is not None:
+            upload.path.unlink(missing_ok=True)
+            metrics.observe_latency("cache", time.perf_counter() - started)
+            return _image_response(content, config_snapshot['output_format'], "cache")
+    
+    try:
+        pixels = await run_in_threadpool(_image_pixels, upload.path)
+    except Exception:
+        return None
+    if pixels > settings.SYNC_MAX_PIXELS:
+        return None
+    
+    executor = get_sync_executor()
+    model = config_snapshot.get('model', 'u2net')
+    if not get_session_pool().is_loaded(model):
+        # 在后台预热模型，之后的请求才走同步路径（加载模型期间该线程不接受同步请求）
+        executor.try_submit(get_session_pool().get, model)
+        return None
+    
+    try:
+        content, timings = await executor.run(_remove_sync, upload.path, config_snapshot, cache_key)
+    except ExecutorSaturated:
+        return None
+    except Exception as e:
+        upload.path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Background removal failed: {str(e)}")
+    
+    upload.path.unlink(missing_ok=True)
+    metrics.observe_stages(timings)
+    metrics.observe_latency("sync", time.perf_counter() - started)
+    return _image_response(content, config_snapshot['output_format'], "sync")
+
+def warm_sync_session(db: Session):
+    """在后台预加载默认配置的模型，使同步处理无需等待模型加载"""
+    if settings.SYNC_MAX_WORKERS <= 0:
+        return
+    config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.is_default == True).first()
+    if config:
+        get_sync_executor().try_submit(get_session_pool().get, config.model)
+
 @router.post("/remove", response_model=BackgroundRemovalResponse)
 async def remove_background(
+    request: Request,
     token: str = Query(..., description="JWT token"),
     file: UploadFile = File(..., description="Image file to process"),
     config_id: Optional[int] = Query(None, description="Configuration ID"),
+    sync: bool = Query(False, description="Process small images synchronously and return the image directly"),
+    format: Optional[str] = Query(None, description="Result format: png, webp or avif (default: configuration / Accept header)"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="WebP/AVIF quality"),
     db: Session = Depends(get_db)
 ):
-    """提交背景移除任务"""
+    """
+    提交背景移除任务
+    
+    sync 为 true 时，小图片在 API 进程中直接处理，响应内容为结果图片（X-Processing-Path 为 sync 或 cache）；
+    不满足同步处理条件时与普通请求相同，提交异步任务并返回任务ID。
+    结果格式由 format 参数指定，未指定时按配置的格式和 Accept 头协商。
+    """
+    started = time.perf_counter()
     # 验证用户
     current_user = await get_current_user(token)
     
@@ -53,55 +268,263 @@ async def remove_background(
     if not validate_image(file):
         raise HTTPException(status_code=400, detail="Invalid image file")
     
-    # 获取配置
-    if config_id:
-        config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.id == config_id).first()
-        if not config:
-            raise HTTPException(status_code=404, detail="Configuration not found")
-    else:
-        config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.is_default == True).first()
-        if not config:
-            raise HTTPException(status_code=404, detail="No default configuration found")
+    # 获取配置和生效的处理参数快照
+    config = _get_config(db, config_id)
+    config_snapshot = _output_snapshot(config.processing_params(), request, format, quality)
     
-    # 创建上传目录
-    upload_dir = Path("data/uploads")
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    # 分块写入上传目录，超过大小限制或不是图片时中止
+    try:
+        upload = await save_upload(file, Path("data/uploads"))
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+    except UnsupportedImageType:
+        raise HTTPException(status_code=415, detail="Unsupported image type")
     
-    # 保存上传的文件
-    file_path = upload_dir / file.filename
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    if sync:
+        response = await _try_remove_sync(upload, config_snapshot, started)
+        if response is not None:
+            return response
     
-    # 添加到任务队列
-    task_id = task_queue.add_task(
-        task_type="background_removal",
-        params={
-            "input_path": str(file_path),
-            "user_id": current_user.get("sub"),
-            "config": {
-                "max_size": config.max_size,
-                "model": config.model,
-                "use_alpha_matting": config.use_alpha_matting,
-                "alpha_foreground": config.alpha_foreground,
-                "alpha_background": config.alpha_background,
-                "alpha_erode": config.alpha_erode
-            }
-        }
-    )
+    task_id, from_cache = _submit_upload(upload, config, config_snapshot, current_user.get("sub"))
     
     return BackgroundRemovalResponse(
         task_id=task_id,
-        message="Task submitted successfully"
+        message="Task completed from cache" if from_cache else "Task submitted successfully"
     )
 
+def _unique_name(filename: str, used: set, extension: str = "png") -> str:
+    """生成批量结果 ZIP 中不重复的文件名（去掉目录，扩展名改为结果格式的扩展名）"""
+    stem = Path(filename or "image").stem or "image"
+    name = f"{stem}.{extension}"
+    index = 1
+    while name in used:
+        name = f"{stem}_{index}.{extension}"
+        index += 1
+    used.add(name)
+    return name
+
+@router.post("/batch", response_model=BatchSubmitResponse)
+async def submit_batch(
+    request: Request,
+    token: str = Query(..., description="JWT token"),
+    files: List[UploadFile] = File(..., description="Image files, or a single zip archive of images"),
+    config_id: Optional[int] = Query(None, description="Configuration ID"),
+    format: Optional[str] = Query(None, description="Result format: png, webp or avif (default: configuration / Accept header)"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="WebP/AVIF quality"),
+    db: Session = Depends(get_db)
+):
+    """
+    批量提交背景移除任务
+    
+    接受多个图片文件或一个包含图片的 ZIP 文件，所有图片使用同一配置，
+    每张图片创建一个任务，并返回一个批量任务ID用于查询整体进度和下载结果 ZIP。
+    无法处理的文件（格式不支持、超过大小）记录为失败项，不影响其他图片。
+    """
+    # 验证用户
+    current_user = await get_current_user(token)
+    user_id = current_user.get("sub")
+    
+    config = _get_config(db, config_id)
+    config_snapshot = _output_snapshot(config.processing_params(), request, format, quality)
+    extension = result_extension(config_snapshot['output_format'])
+    upload_dir = Path("data/uploads")
+    
+    # 保存上传的文件，ZIP 文件在线程池中解压；请求被拒绝时删除已保存的文件
+    saved = []
+    try:
+        for file in files:
+            try:
+                upload = await save_upload(file, upload_dir, zip_max_size=settings.BATCH_MAX_ZIP_SIZE)
+            except (UploadTooLarge, UnsupportedImageType) as e:
+                saved.append((file.filename, e))
+                continue
+            
+            if upload.image_type != "zip":
+                saved.append((file.filename, upload))
+                continue
+            
+            try:
+                remaining = settings.BATCH_MAX_FILES - len(saved)
+                if remaining <= 0:
+                    raise UploadTooLarge()
+                saved.extend(await run_in_threadpool(extract_zip_images, upload.path, upload_dir, remaining))
+            except UploadTooLarge:
+                raise HTTPException(status_code=413, detail=f"Too many files (max {settings.BATCH_MAX_FILES})")
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="Invalid zip file")
+            finally:
+                upload.path.unlink(missing_ok=True)
+        
+        if not saved:
+            raise HTTPException(status_code=400, detail="No files uploaded")
+        if len(saved) > settings.BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Too many files (max {settings.BATCH_MAX_FILES})")
+    except BaseException:
+        for _, item in saved:
+            if isinstance(item, SavedUpload):
+                item.path.unlink(missing_ok=True)
+        raise
+    
+    # 为每张图片创建任务
+    job_id = str(uuid.uuid4())
+    used_names = set()
+    items = []
+    for filename, item in saved:
+        if isinstance(item, SavedUpload):
+            task_id, _ = _submit_upload(item, config, config_snapshot, user_id, {"job_id": job_id}, lane="bulk")
+            items.append({"task_id": task_id, "filename": _unique_name(filename, used_names, extension)})
+        else:
+            error = "File too large" if isinstance(item, UploadTooLarge) else "Unsupported image type"
+            items.append({"task_id": None, "filename": filename or "", "error": error})
+    
+    # 批量任务的汇总记录保存在同一队列后端中，所有图片结束后才开始计算保留时间
+    await run_in_threadpool(
+        task_queue.add_batch_task,
+        params={"user_id": user_id, "config": config_snapshot, "items": items},
+        task_id=job_id
+    )
+    # 所有图片都命中缓存（或都无法处理）时没有工作进程会结束该批量任务
+    await run_in_threadpool(task_queue.finish_batch, job_id)
+    
+    accepted = sum(1 for item in items if item["task_id"])
+    return BatchSubmitResponse(
+        job_id=job_id,
+        total=len(items),
+        accepted=accepted,
+        message="Batch submitted successfully"
+    )
+
+def _get_batch(job_id: str, current_user: dict) -> dict:
+    """获取批量任务记录并检查权限（读取队列后端，在线程池中调用）"""
+    job = task_queue.get_task_status(job_id)
+    if not job or job.get('type') != "background_batch":
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if job['params'].get('user_id') != current_user.get("sub"):
+        raise HTTPException(status_code=403, detail="Not authorized to access this batch")
+    return job
+
+def _get_item_tasks(job: dict) -> List[Optional[dict]]:
+    """批量任务中每张图片的任务数据（没有任务或任务不存在时为 None）"""
+    return [
+        task_queue.get_task_status(item["task_id"]) if item.get("task_id") else None
+        for item in job['params']['items']
+    ]
+
+@router.get("/batch/{job_id}", response_model=BatchStatusResponse)
+async def get_batch_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """获取批量任务的整体进度和每张图片的状态"""
+    job = await run_in_threadpool(_get_batch, job_id, current_user)
+    item_tasks = await run_in_threadpool(_get_item_tasks, job)
+    
+    counts = {"pending": 0, "processing": 0, "completed": 0, "failed": 0}
+    items = []
+    for item, task_data in zip(job['params']['items'], item_tasks):
+        task_id = item.get("task_id")
+        if task_data:
+            status, error = task_data['status'], task_data.get('error')
+        else:
+            status, error = "failed", item.get("error", "Task not found")
+        # 多次重试仍未完成（dead）的任务计入失败数
+        key = "failed" if status == "dead" else status
+        counts[key] = counts.get(key, 0) + 1
+        items.append(BatchItemStatus(task_id=task_id, filename=item["filename"], status=status, error=error))
+    
+    total = len(items)
+    done = counts["completed"] + counts["failed"]
+    if done == total and job['status'] == 'running':
+        # 兜底：例如图片任务在其他节点上结束时未能更新汇总记录
+        await run_in_threadpool(task_queue.finish_batch, job_id)
+    return BatchStatusResponse(
+        job_id=job_id,
+        status="completed" if done == total else "processing",
+        total=total,
+        pending=counts["pending"],
+        processing=counts["processing"],
+        completed=counts["completed"],
+        failed=counts["failed"],
+        progress=done / total if total else 1.0,
+        items=items
+    )
+
+class _ZipStream:
+    """只写缓冲区，zipfile 写入的数据由生成器分段取出，用于流式输出 ZIP"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _iter_batch_zip(results: List[Tuple[str, str]]):
+    """逐个读取结果图片并生成 ZIP 数据块，内存中只保留一个读取块（同步生成器，由 StreamingResponse 在线程池中迭代）"""
+    stream = _ZipStream()
+    # 结果图片已经压缩过，直接存储
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for task_id, name in results:
+            task_data = task_queue.get_task_status(task_id)
+            result_path = task_data.get('result_path') if task_data else None
+            with archive.open(name, mode="w", force_zip64=True) as entry:
+                if result_path and os.path.exists(result_path):
+                    with open(result_path, "rb") as f:
+                        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                            entry.write(chunk)
+                            yield stream.drain()
+                else:
+                    # 结果可能由其他节点生成，尝试从队列后端读取
+                    entry.write(task_queue.get_result_bytes(task_id) or b"")
+            yield stream.drain()
+    yield stream.drain()
+
+@router.get("/batch/{job_id}/download")
+async def download_batch(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """以 ZIP 流的形式下载批量任务中已完成的结果"""
+    job = await run_in_threadpool(_get_batch, job_id, current_user)
+    item_tasks = await run_in_threadpool(_get_item_tasks, job)
+    
+    results = [
+        (item["task_id"], item["filename"])
+        for item, task_data in zip(job['params']['items'], item_tasks)
+        if task_data and task_data['status'] == 'completed'
+    ]
+    
+    if not results:
+        raise HTTPException(status_code=400, detail="No completed results")
+    
+    return StreamingResponse(
+        _iter_batch_zip(results),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch_{job_id}.zip"'}
+    )
+
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    """获取结果缓存统计信息（命中率、容量等）"""
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
 @router.get("/status/{task_id}", response_model=TaskStatusResponse)
 async def get_task_status(
     task_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """获取任务状态"""
-    task_data = task_queue.get_task_status(task_id)
+    task_data = await run_in_threadpool(task_queue.get_task_status, task_id)
     if not task_data:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -116,13 +539,78 @@ async def get_task_status(
         error=task_data.get('error')
     )
 
+def _format_sse(event: str, data: dict) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/events/{task_id}")
+async def task_status_events(
+    task_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    推送任务状态变更（Server-Sent Events）
+    
+    依次推送 pending → processing → completed/failed 状态，
+    任务完成时附带结果下载地址，推送完成后关闭连接。
+    """
+    task_data = await run_in_threadpool(task_queue.get_task_status, task_id)
+    if not task_data:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    # 检查用户权限
+    if task_data['params'].get('user_id') != current_user.get("sub"):
+        raise HTTPException(status_code=403, detail="Not authorized to access this task")
+    
+    async def event_stream():
+        queue = task_events.subscribe(task_id)
+        deadline = time.monotonic() + settings.TASK_EVENTS_TIMEOUT
+        last_status = None
+        try:
+            while time.monotonic() < deadline:
+                # 查询队列后端（文件、SQLite 或 Redis）是阻塞操作，不在事件循环中执行
+                task_data = await run_in_threadpool(task_queue.get_task_status, task_id)
+                if not task_data:
+                    yield _format_sse("error", {"task_id": task_id, "error": "Task not found"})
+                    return
+                
+                status = task_data['status']
+                if status != last_status:
+                    last_status = status
+                    payload = {"task_id": task_id, "status": status}
+                    if status == 'completed':
+                        payload["result_url"] = f"{settings.API_V1_STR}/background/result/{task_id}"
+                    elif status in ('failed', 'dead'):
+                        payload["error"] = task_data.get('error')
+                    yield _format_sse("status", payload)
+                
+                if status in ('completed', 'failed', 'dead') or await request.is_disconnected():
+                    return
+                
+                # 等待工作进程推送的状态变更，超时后重新检查（兼容其他节点上的工作进程）
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=settings.TASK_EVENTS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+            
+            yield _format_sse("timeout", {"task_id": task_id, "status": last_status})
+        finally:
+            task_events.unsubscribe(task_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/result/{task_id}")
 async def get_task_result(
     task_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     """获取任务结果"""
-    task_data = task_queue.get_task_status(task_id)
+    task_data = await run_in_threadpool(task_queue.get_task_status, task_id)
     if not task_data:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -137,10 +625,21 @@ async def get_task_result(
     # 返回结果文件
     result_path = task_data.get('result_path')
     if not result_path or not os.path.exists(result_path):
-        raise HTTPException(status_code=404, detail="Result file not found")
+        # 结果可能由其他节点生成，尝试从队列后端读取
+        content = await run_in_threadpool(task_queue.get_result_bytes, task_id)
+        if content is None:
+            raise HTTPException(status_code=404, detail="Result file not found")
+        extension = result_extension(task_data['params'].get('config', {}).get('output_format'))
+        return Response(
+            content=content,
+            media_type=media_type_for(extension),
+            headers={"Content-Disposition": f'attachment; filename="result_{task_id}.{extension}"'}
+        )
     
+    # 结果格式由文件扩展名确定
+    extension = Path(result_path).suffix.lstrip(".")
     return FileResponse(
         result_path,
-        media_type="image/png",
-        filename=f"result_{task_id}.png"
+        media_type=media_type_for(result_path),
+        filename=f"result_{task_id}.{extension}"
     ) 
\ No newline at end of file
@@ -6,6 +6,7 @@ from pathlib import Path
 
 from app.core.auth import get_current_user
 from app.utils.task_queue import TaskQueue
+from app.utils.result_encoding import media_type_for
 from app.schemas.background_removal import BackgroundRemovalResponse, TaskStatusResponse
 
 router = APIRouter()
@@ -87,8 +88,9 @@ async def get_task_result(
     if not result_path or not os.path.exists(result_path):
         raise HTTPException(status_code=404, detail="Result file not found")
     
+    extension = Path(result_path).suffix.lstrip(".")
     return FileResponse(
         result_path,
-        media_type="image/png",
-        filename=f"result_{task_id}.png"
+        media_type=media_type_for(result_path),
+        filename=f"result_{task_id}.{extension}"
     ) 
\ No newline at end of file
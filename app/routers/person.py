@@ -1,8 +1,8 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from fastapi.responses import JSONResponse
-import cv2
-import numpy as np
-from ..utils.image_processing import validate_image, detect_faces
+from ..utils.image_processing import validate_image, detect_faces, decode_image
+from ..core.config import settings
+from ..utils.executor import get_inline_executor, ExecutorSaturated
 from ..core.security import verify_token
 
 router = APIRouter()
@@ -12,6 +12,17 @@ async def get_current_user(token: str = Depends(verify_token)):
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     return token
 
+def _decode_and_detect(contents: bytes):
+    """
+    解码图片并检测人脸（在线程池中执行）
+    
+    只需要人脸位置，因此以接近检测尺寸的降低分辨率解码，坐标按原图尺寸返回
+    """
+    img, original_size = decode_image(contents, settings.FACE_DETECTION_SIZE)
+    if img is None:
+        return []
+    return detect_faces(img, original_size=original_size)
+
 @router.post("/detect")
 async def detect_person_endpoint(
     image: UploadFile = File(...),
@@ -23,11 +34,12 @@ async def detect_person_endpoint(
     
     # 读取图片
     contents = await image.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
-    # 检测人脸
-    faces = detect_faces(img)
+    # 解码和人脸检测在线程池中执行，避免阻塞事件循环
+    try:
+        faces = await get_inline_executor().run(_decode_and_detect, contents)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=429, detail="Server busy, please retry later", headers={"Retry-After": "1"})
     
     # 返回结果
     return JSONResponse(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class BackgroundRemovalResponse(BaseModel):
     task_id: str
@@ -9,4 +9,27 @@ class TaskStatusResponse(BaseModel):
     task_id: str
     status: str
     result_path: Optional[str] = None
-    error: Optional[str] = None 
\ No newline at end of file
+    error: Optional[str] = None
+
+class BatchSubmitResponse(BaseModel):
+    job_id: str
+    total: int
+    accepted: int
+    message: str
+
+class BatchItemStatus(BaseModel):
+    task_id: Optional[str] = None
+    filename: str
+    status: str
+    error: Optional[str] = None
+
+class BatchStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    pending: int
+    processing: int
+    completed: int
+    failed: int
+    progress: float
+    items: List[BatchItemStatus]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
 
 class BackgroundRemovalConfigBase(BaseModel):
     """背景移除配置基础模型"""
@@ -10,6 +10,13 @@ class BackgroundRemovalConfigBase(BaseModel):
     alpha_foreground: int = Field(default=240, description="alpha matting前景阈值")
     alpha_background: int = Field(default=10, description="alpha matting背景阈值")
     alpha_erode: int = Field(default=15, description="alpha matting腐蚀尺寸")
+    composite_mode: Literal["resize", "mask"] = Field(default="resize", description="合成方式：resize 放大处理结果，mask 只放大掩码与原图合成")
+    refine_edges: bool = Field(default=False, description="mask 合成时是否使用引导滤波修正边缘")
+    matting_engine: Optional[Literal["none", "guided", "band", "pymatting"]] = Field(None, description="边缘细化引擎，为空时按 use_alpha_matting 选择 pymatting 或 none")
+    output_format: Literal["png", "webp", "avif", "auto"] = Field(default="png", description="结果格式，auto 按请求的 Accept 头选择")
+    output_quality: Optional[int] = Field(None, ge=1, le=100, description="WebP/AVIF 编码质量，为空时使用全局默认值")
+    png_compression: Optional[int] = Field(None, ge=0, le=9, description="PNG 压缩级别，为空时使用全局默认值")
+    lossy_alpha: bool = Field(default=False, description="WebP 是否对透明通道使用有损编码")
     is_default: bool = Field(default=False, description="是否为默认配置")
     description: Optional[str] = Field(None, description="配置描述")
 
@@ -26,6 +33,13 @@ class BackgroundRemovalConfigUpdate(BaseModel):
     alpha_foreground: Optional[int] = Field(None, description="alpha matting前景阈值")
     alpha_background: Optional[int] = Field(None, description="alpha matting背景阈值")
     alpha_erode: Optional[int] = Field(None, description="alpha matting腐蚀尺寸")
+    composite_mode: Optional[Literal["resize", "mask"]] = Field(None, description="合成方式")
+    refine_edges: Optional[bool] = Field(None, description="mask 合成时是否使用引导滤波修正边缘")
+    matting_engine: Optional[Literal["none", "guided", "band", "pymatting"]] = Field(None, description="边缘细化引擎")
+    output_format: Optional[Literal["png", "webp", "avif", "auto"]] = Field(None, description="结果格式")
+    output_quality: Optional[int] = Field(None, ge=1, le=100, description="WebP/AVIF 编码质量")
+    png_compression: Optional[int] = Field(None, ge=0, le=9, description="PNG 压缩级别")
+    lossy_alpha: Optional[bool] = Field(None, description="WebP 是否对透明通道使用有损编码")
     is_default: Optional[bool] = Field(None, description="是否为默认配置")
     description: Optional[str] = Field(None, description="配置描述")
 
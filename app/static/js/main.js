@@ -240,6 +240,86 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // 等待任务完成：优先通过 SSE 接收服务端推送的状态变更，
+    // 浏览器不支持或连接失败时回退到轮询状态接口
+    function waitForTask(taskId, token) {
+        if (!window.EventSource) {
+            return pollTaskStatus(taskId, token);
+        }
+        
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`/api/v1/background/events/${taskId}?token=${token}`);
+            let settled = false;
+            
+            const finish = (result) => {
+                if (settled) return;
+                settled = true;
+                source.close();
+                resolve(result);
+            };
+            
+            source.addEventListener('status', (event) => {
+                const data = JSON.parse(event.data);
+                if (data.status === 'processing') {
+                    processingStatus.textContent = '正在处理中...';
+                    updateProgress(50);
+                } else if (['completed', 'failed', 'dead'].includes(data.status)) {
+                    updateProgress(90);
+                    finish(data);
+                }
+            });
+            
+            source.addEventListener('timeout', () => finish({ status: 'timeout' }));
+            
+            source.onerror = () => {
+                if (settled) return;
+                // 推送连接失败，回退到轮询
+                settled = true;
+                source.close();
+                pollTaskStatus(taskId, token).then(resolve, reject);
+            };
+        });
+    }
+
+    // 轮询任务状态，返回最终状态；请求失败时返回 null
+    async function pollTaskStatus(taskId, token) {
+        const maxAttempts = 30; // 最多轮询30次
+        
+        for (let attempts = 1; attempts <= maxAttempts; attempts++) {
+            // 等待1秒再查询
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            
+            // 查询任务状态
+            let statusResponse;
+            try {
+                statusResponse = await fetch(`/api/v1/background/status/${taskId}?token=${token}`,{
+                    headers: getHeaders(),
+                });
+                
+                if (!statusResponse.ok) {
+                    throw new Error(`获取状态失败: ${statusResponse.status}`);
+                }
+            } catch (error) {
+                handleApiError(error, statusResponse);
+                return null;
+            }
+            
+            const statusResult = await statusResponse.json();
+            
+            // 更新进度 - 使用更自然的进度计算
+            // 前期进度增长较慢，后期加快
+            const progressPercent = Math.min(10 + Math.pow(attempts / maxAttempts, 0.7) * 80, 90);
+            updateProgress(progressPercent);
+            processingStatus.textContent = `正在处理中... (${attempts}/${maxAttempts})`;
+            
+            if (['completed', 'failed', 'dead'].includes(statusResult.status)) {
+                return statusResult;
+            }
+        }
+        
+        return { status: 'timeout' };
+    }
+
     // 处理图片并调用API
     async function processImage(file) {
         // 如果已经在处理中，直接返回
@@ -294,93 +374,61 @@ document.addEventListener('DOMContentLoaded', function() {
             processingStatus.textContent = '任务已提交，正在处理中...';
             updateProgress(10);
             
-            // 轮询任务状态
-            let isCompleted = false;
-            let attempts = 0;
-            const maxAttempts = 30; // 最多轮询30次
+            // 等待任务完成（服务端推送状态变更，不支持时回退到轮询）
+            const statusResult = await waitForTask(taskId, token);
+            if (!statusResult) {
+                // 错误已由 handleApiError 处理
+                return;
+            }
             
-            while (!isCompleted && attempts < maxAttempts) {
-                attempts++;
-                
-                // 等待1秒再查询
-                await new Promise(resolve => setTimeout(resolve, 1000));
-                
-                // 查询任务状态
-                let statusResponse;
-                try {
-                    statusResponse = await fetch(`/api/v1/background/status/${taskId}?token=${token}`,{
-                        headers: getHeaders(),
-                    });
-                    
-                    if (!statusResponse.ok) {
-                        throw new Error(`获取状态失败: ${statusResponse.status}`);
-                    }
-                } catch (error) {
-                    handleApiError(error, statusResponse);
-                    return;
-                }
-                
-                const statusResult = await statusResponse.json();
-                
-                // 更新进度 - 使用更自然的进度计算
-                // 前期进度增长较慢，后期加快
-                const progressPercent = Math.min(10 + Math.pow(attempts / maxAttempts, 0.7) * 80, 90);
-                updateProgress(progressPercent);
-                processingStatus.textContent = `正在处理中... (${attempts}/${maxAttempts})`;
+            if (statusResult.status === 'failed' || statusResult.status === 'dead') {
+                throw new Error('处理失败: ' + (statusResult.error || '未知错误'));
+            }
+            if (statusResult.status !== 'completed') {
+                throw new Error('处理超时，请稍后再试');
+            }
+            
+            processingStatus.textContent = '正在获取处理结果...';
+            // 获取处理结果
+            let resultResponse;
+            try {
+                resultResponse = await fetch(`/api/v1/background/result/${taskId}?token=${token}`,{
+                    headers: getHeaders(),
+                });
                 
-                // 检查任务是否完成
-                if (statusResult.status === 'completed') {
-                    isCompleted = true;
-                    
-                    processingStatus.textContent = '正在获取处理结果...';
-                    // 获取处理结果
-                    let resultResponse;
-                    try {
-                        resultResponse = await fetch(`/api/v1/background/result/${taskId}?token=${token}`,{
-                            headers: getHeaders(),
-                        });
-                        
-                        if (!resultResponse.ok) {
-                            throw new Error(`获取结果失败: ${resultResponse.status}`);
-                        }
-                    } catch (error) {
-                        handleApiError(error, resultResponse);
-                        return;
-                    }
-                    
-                    const imageBlob = await resultResponse.blob();
-                    
-                    // 释放之前的URL（如果有的话）
-                    if (processedImageUrl) {
-                        URL.revokeObjectURL(processedImageUrl);
-                    }
-                    
-                    processedImageUrl = URL.createObjectURL(imageBlob);
-                    
-                    // 更新预览图并应用背景色
-                    try {
-                        processingStatus.textContent = '正在应用背景颜色...';
-                        await applyImageWithBackground(processedImageUrl);
-                        updateProgress(100);
-                        
-                        // 启用下载按钮
-                        downloadBtn.disabled = false;
-                        
-                        // 处理完成
-                        processingStatus.textContent = '处理完成！';
-                        await new Promise(resolve => setTimeout(resolve, 500));
-                        hideProcessingModal();
-                    } catch (error) {
-                        console.error('应用背景时出错:', error);
-                        throw new Error('应用背景失败: ' + error.message);
-                    }
-                } else if (statusResult.status === 'failed') {
-                    throw new Error('处理失败: ' + (statusResult.error || '未知错误'));
+                if (!resultResponse.ok) {
+                    throw new Error(`获取结果失败: ${resultResponse.status}`);
                 }
+            } catch (error) {
+                handleApiError(error, resultResponse);
+                return;
             }
             
-            if (!isCompleted) {
-                throw new Error('处理超时，请稍后再试');
+            const imageBlob = await resultResponse.blob();
+            
+            // 释放之前的URL（如果有的话）
+            if (processedImageUrl) {
+                URL.revokeObjectURL(processedImageUrl);
+            }
+            
+            processedImageUrl = URL.createObjectURL(imageBlob);
+            
+            // 更新预览图并应用背景色
+            try {
+                processingStatus.textContent = '正在应用背景颜色...';
+                await applyImageWithBackground(processedImageUrl);
+                updateProgress(100);
+                
+                // 启用下载按钮
+                downloadBtn.disabled = false;
+                
+                // 处理完成
+                processingStatus.textContent = '处理完成！';
+                await new Promise(resolve => setTimeout(resolve, 500));
+                hideProcessingModal();
+            } catch (error) {
+                console.error('应用背景时出错:', error);
+                throw new Error('应用背景失败: ' + error.message);
             }
             
         } catch (error) {
@@ -0,0 +1,126 @@
+import logging
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 已提示过不支持批量推理的模型，每个模型只提示一次
+_unbatched_models = set()
+
+class _CaptureInput(Exception):
+    """用于中断 predict 并取出预处理后的模型输入"""
+
+    def __init__(self, feeds: Dict):
+        self.feeds = feeds
+
+class _CaptureSession:
+    """替代 inner_session：记录 run() 的输入后中断"""
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def run(self, output_names, input_feed, *args, **kwargs):
+        raise _CaptureInput(input_feed)
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+class _ReplaySession:
+    """替代 inner_session：直接返回批量推理中对应的输出"""
+
+    def __init__(self, inner, outputs):
+        self._inner = inner
+        self._outputs = outputs
+
+    def run(self, output_names, input_feed, *args, **kwargs):
+        return self._outputs
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+class PrecomputedMaskSession:
+    """
+    返回预先计算好的掩码的会话
+
+    传给 rembg.remove() 后，remove 会跳过推理，
+    直接使用这些掩码执行 alpha matting、背景替换等后处理。
+    """
+
+    def __init__(self, masks: List[Image.Image]):
+        self.masks = masks
+
+    def predict(self, img, *args, **kwargs) -> List[Image.Image]:
+        return self.masks
+
+def _supports_batching(session) -> bool:
+    """模型输入是否为单输入且 batch 维度可变"""
+    inner = getattr(session, "inner_session", None)
+    if inner is None:
+        return False
+    inputs = inner.get_inputs()
+    if len(inputs) != 1:
+        return False
+    batch_dim = inputs[0].shape[0]
+    return not isinstance(batch_dim, int) or batch_dim != 1
+
+def check_batching(session, model: str) -> bool:
+    """
+    检查模型是否支持批量推理，不支持时输出一次警告
+
+    批量推理要求 ONNX 模型以可变 batch 维度导出；rembg 自带的模型通常固定为 1，
+    此时 WORKER_BATCH_SIZE 不起作用，任务仍逐张推理。
+    """
+    if _supports_batching(session):
+        return True
+    if model not in _unbatched_models:
+        _unbatched_models.add(model)
+        logger.warning(f"模型 {model} 的 batch 维度固定，不支持批量推理，WORKER_BATCH_SIZE 对该模型不起作用"
+                       f"（需要以可变 batch 维度导出的模型）")
+    return False
+
+def predict_masks(session, images: List[Image.Image]) -> List[List[Image.Image]]:
+    """
+    对多张图片执行一次批量推理，返回每张图片的掩码列表
+
+    rembg 会话的 predict() 对单张图片完成预处理、推理和掩码后处理。这里分三步复用它：
+    1. 对每张图片调用 predict()，在 inner_session.run() 处截获预处理后的输入；
+    2. 沿 batch 维拼接后调用一次 onnxruntime 推理；
+    3. 再次调用 predict()，让 run() 返回批量结果中对应的切片，由会话自身完成掩码后处理。
+    模型不支持批量输入或批量推理失败时，逐张推理。
+    """
+    if len(images) <= 1 or not _supports_batching(session):
+        return [session.predict(image) for image in images]
+
+    inner = session.inner_session
+    try:
+        # 截获每张图片的模型输入
+        feeds = []
+        session.inner_session = _CaptureSession(inner)
+        for image in images:
+            try:
+                session.predict(image)
+            except _CaptureInput as captured:
+                feeds.append(captured.feeds)
+            else:
+                # predict() 没有调用 run()，无法批量处理
+                raise RuntimeError("session.predict did not call inner_session.run")
+
+        # 输入尺寸由模型决定，拼接为一个 batch 执行推理
+        input_name = inner.get_inputs()[0].name
+        batch = np.concatenate([feed[input_name] for feed in feeds], axis=0)
+        outputs = inner.run(None, {input_name: batch})
+
+        # 按图片拆分输出，复用会话的后处理
+        masks = []
+        for i, image in enumerate(images):
+            session.inner_session = _ReplaySession(inner, [output[i:i + 1] for output in outputs])
+            masks.append(session.predict(image))
+        return masks
+    except Exception as e:
+        logger.warning(f"批量推理失败，改为逐张推理: {str(e)}")
+        session.inner_session = inner
+        return [session.predict(image) for image in images]
+    finally:
+        session.inner_session = inner
@@ -0,0 +1,181 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+
+class ExecutorSaturated(Exception):
+    """执行器的运行和排队名额已满"""
+
+class BoundedExecutor:
+    """
+    有界线程池执行器
+
+    将解码、人脸检测等 CPU 密集型操作移出事件循环，避免阻塞其他请求。
+    同时运行的任务数不超过 max_workers，排队任务数不超过 max_pending，
+    超出时立即拒绝（由调用方返回 429），并统计排队等待时间。
+    initializer 在每个线程创建时执行，finalizer 在关闭时于每个线程中执行一次。
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, name: str = "inline",
+                 initializer: Optional[Callable] = None, finalizer: Optional[Callable] = None):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name,
+            initializer=initializer
+        )
+        self._finalizer = finalizer
+        self._lock = threading.Lock()
+        self._inflight = 0
+
+        # 统计信息
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._waits = deque(maxlen=1000)  # 最近的排队等待时间（秒）
+
+    def _try_acquire(self) -> bool:
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self.rejected += 1
+                return False
+            self._inflight += 1
+            self.submitted += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+            self.completed += 1
+
+    def available(self) -> bool:
+        """是否还有空闲的运行名额（不需要排队）"""
+        with self._lock:
+            return self._inflight < self.max_workers
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        在线程池中执行函数并等待结果
+
+        异常:
+            ExecutorSaturated: 运行和排队名额已满
+        """
+        if not self._try_acquire():
+            raise ExecutorSaturated()
+
+        enqueued_at = time.perf_counter()
+
+        def call():
+            self._waits.append(time.perf_counter() - enqueued_at)
+            return fn(*args, **kwargs)
+
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            self._release()
+            raise
+        # 名额在线程中的任务结束时释放：等待的协程被取消（例如客户端断开）时线程仍在运行，
+        # 提前释放会使同时运行的任务数超过上限
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def try_submit(self, fn: Callable, *args, **kwargs) -> bool:
+        """在后台执行函数，不等待结果；名额已满时返回 False"""
+        if not self._try_acquire():
+            return False
+
+        def call():
+            try:
+                fn(*args, **kwargs)
+            finally:
+                self._release()
+
+        self._executor.submit(call)
+        return True
+
+    def _run_on_each_thread(self, fn: Callable):
+        """
+        在每个线程中各执行一次函数（不等待完成）
+
+        所有调用在屏障处互相等待，因此各自占用一个线程，线程池会创建全部 max_workers 个线程。
+        """
+        barrier = threading.Barrier(self.max_workers)
+
+        def call():
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+            fn()
+
+        return [self._executor.submit(call) for _ in range(self.max_workers)]
+
+    def prestart(self):
+        """预先创建全部线程，使 initializer 在启动时而不是第一个请求到达时执行"""
+        self._run_on_each_thread(lambda: None)
+
+    def stats(self) -> Dict:
+        """返回执行器统计信息（排队等待时间单位为毫秒）"""
+        waits = sorted(self._waits)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(len(waits) * p))] * 1000
+
+        with self._lock:
+            inflight = self._inflight
+        return {
+            "max_workers": self.max_workers,
+            "capacity": self.capacity,
+            "inflight": inflight,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "queue_wait_p50_ms": percentile(0.5),
+            "queue_wait_p95_ms": percentile(0.95),
+            "queue_wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+        }
+
+    def shutdown(self):
+        if self._finalizer is not None:
+            self._run_on_each_thread(self._finalizer)
+        self._executor.shutdown(wait=True)
+
+_inline_executor: Optional[BoundedExecutor] = None
+
+def get_inline_executor() -> BoundedExecutor:
+    """获取头像裁剪、人像检测等同步接口共用的执行器"""
+    global _inline_executor
+    if _inline_executor is None:
+        # 延迟导入，只有用到该执行器时才加载 MediaPipe
+        from app.utils.image_processing import get_face_detector, close_face_detectors
+        _inline_executor = BoundedExecutor(
+            max_workers=settings.INLINE_MAX_WORKERS or os.cpu_count() or 1,
+            max_pending=settings.INLINE_MAX_PENDING,
+            name="inline",
+            # 每个线程创建时预先初始化自己的人脸检测器，关闭时释放
+            initializer=get_face_detector,
+            finalizer=close_face_detectors
+        )
+        _inline_executor.prestart()
+    return _inline_executor
+
+_sync_executor: Optional[BoundedExecutor] = None
+
+def get_sync_executor() -> BoundedExecutor:
+    """获取背景移除同步处理的执行器（不排队，没有空闲线程时由调用方转为异步任务）"""
+    global _sync_executor
+    if _sync_executor is None:
+        _sync_executor = BoundedExecutor(
+            max_workers=max(1, settings.SYNC_MAX_WORKERS),
+            max_pending=0,
+            name="sync"
+        )
+    return _sync_executor
@@ -1,11 +1,30 @@
 from PIL import Image
+import io
 import cv2
 import mediapipe as mp
 import numpy as np
+import threading
 from rembg import remove
 from typing import Tuple, List, Optional
 from ..core.config import settings
 
+# 支持的编码格式：格式名 -> (文件扩展名, MIME 类型)
+IMAGE_FORMATS = {
+    "png": (".png", "image/png"),
+    "jpeg": (".jpg", "image/jpeg"),
+    "webp": (".webp", "image/webp"),
+}
+
+# 解码时可用的缩小倍数及对应的 OpenCV 读取标志
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# 每个线程持有自己的人脸检测器（MediaPipe 检测图不是线程安全的）
+_detector_local = threading.local()
+
 def validate_image(file) -> bool:
     """
     验证上传的图片文件是否合法
@@ -22,57 +41,212 @@ def validate_image(file) -> bool:
     """
     if file.content_type not in [f"image/{ext}" for ext in settings.ALLOWED_EXTENSIONS]:
         return False
-    if file.size > settings.MAX_UPLOAD_SIZE:
+    # 客户端可能不提供文件大小，此时由读取时的大小限制兜底
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
         return False
     return True
 
-def detect_faces(image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+def get_face_detector(model_selection: Optional[int] = None,
+                      min_detection_confidence: Optional[float] = None):
+    """
+    获取当前线程的人脸检测器
+    
+    检测器在首次使用时创建，之后在同一线程内复用，避免每次请求都重新初始化 MediaPipe 检测图
+    
+    参数:
+        model_selection (Optional[int]): 0 为近距离模型（2 米内），1 为全距离模型，默认取配置
+        min_detection_confidence (Optional[float]): 最低置信度，默认取配置
+    
+    返回:
+        FaceDetection: MediaPipe 人脸检测器
+    """
+    if model_selection is None:
+        model_selection = settings.FACE_DETECTION_MODEL
+    if min_detection_confidence is None:
+        min_detection_confidence = settings.FACE_DETECTION_CONFIDENCE
+    
+    detectors = getattr(_detector_local, "detectors", None)
+    if detectors is None:
+        detectors = _detector_local.detectors = {}
+    
+    key = (model_selection, min_detection_confidence)
+    detector = detectors.get(key)
+    if detector is None:
+        detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_detection_confidence
+        )
+        detectors[key] = detector
+    return detector
+
+def close_face_detectors():
+    """释放当前线程的人脸检测器"""
+    detectors = getattr(_detector_local, "detectors", None) or {}
+    for detector in detectors.values():
+        detector.close()
+    detectors.clear()
+
+def decode_image(contents: bytes, min_size: Optional[int] = None) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]]]:
+    """
+    解码图片，可选择以降低的分辨率解码
+    
+    指定 min_size 时，从文件头读取原图尺寸，选择长边仍不小于 min_size 的最大缩小倍数（2/4/8），
+    使用 IMREAD_REDUCED_COLOR_* 解码。JPEG 会直接在 DCT 阶段缩小，避免解码全部像素。
+    
+    参数:
+        contents (bytes): 图片文件内容
+        min_size (Optional[int]): 解码结果长边的最小尺寸，不指定时按原始分辨率解码
+    
+    返回:
+        Tuple[Optional[np.ndarray], Optional[Tuple[int, int]]]: 解码后的图像（失败时为 None）和原图尺寸 (width, height)
+    """
+    nparr = np.frombuffer(contents, np.uint8)
+    
+    flag = cv2.IMREAD_COLOR
+    original_size = None
+    if min_size:
+        try:
+            # 只读取文件头，不解码像素
+            with Image.open(io.BytesIO(contents)) as header:
+                original_size = header.size
+                # OpenCV 解码时会按 EXIF 方向旋转，旋转 90 度的方向需要交换宽高
+                if header.getexif().get(0x0112) in (5, 6, 7, 8):
+                    original_size = original_size[::-1]
+        except Exception:
+            original_size = None
+        if original_size:
+            long_side = max(original_size)
+            for factor, reduced_flag in _REDUCED_DECODE_FLAGS:
+                if long_side // factor >= min_size:
+                    flag = reduced_flag
+                    break
+    
+    img = cv2.imdecode(nparr, flag)
+    if img is None:
+        return None, None
+    if original_size is None:
+        original_size = (img.shape[1], img.shape[0])
+    return img, original_size
+
+def detect_faces(image: np.ndarray, model_selection: Optional[int] = None,
+                 min_detection_confidence: Optional[float] = None,
+                 detection_size: Optional[int] = None,
+                 original_size: Optional[Tuple[int, int]] = None) -> List[Tuple[int, int, int, int]]:
     """
     使用 MediaPipe 检测图像中的人脸
     
+    图像长边超过 detection_size 时先缩小再检测。MediaPipe 返回的是相对坐标，
+    按原图尺寸换算即可得到全分辨率下的人脸位置，可直接用于 crop_avatar。
+    
     参数:
         image (np.ndarray): 输入图像数组
+        model_selection (Optional[int]): 检测模型，默认取配置
+        min_detection_confidence (Optional[float]): 最低置信度，默认取配置
+        detection_size (Optional[int]): 检测时的最大长边尺寸，默认取配置，0 表示不缩小
+        original_size (Optional[Tuple[int, int]]): 原图尺寸 (width, height)，
+            图像是以降低的分辨率解码时传入，返回的坐标按该尺寸换算
     
     返回:
         List[Tuple[int, int, int, int]]: 检测到的人脸位置列表
         每个人脸位置包含 (x, y, width, height)
     """
-    mp_face_detection = mp.solutions.face_detection
-    with mp_face_detection.FaceDetection(min_detection_confidence=0.5) as face_detection:
-        results = face_detection.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        faces = []
-        if results.detections:
-            for detection in results.detections:
-                bbox = detection.location_data.relative_bounding_box
-                h, w, _ = image.shape
-                x = int(bbox.xmin * w)
-                y = int(bbox.ymin * h)
-                width = int(bbox.width * w)
-                height = int(bbox.height * h)
-                faces.append((x, y, width, height))
-        return faces
+    if detection_size is None:
+        detection_size = settings.FACE_DETECTION_SIZE
+    if original_size is None:
+        original_size = (image.shape[1], image.shape[0])
+    
+    if detection_size and max(image.shape[:2]) > detection_size:
+        image = resize_to_fit(image, detection_size)
+    
+    face_detection = get_face_detector(model_selection, min_detection_confidence)
+    results = face_detection.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    faces = []
+    if results.detections:
+        w, h = original_size
+        for detection in results.detections:
+            bbox = detection.location_data.relative_bounding_box
+            x = int(bbox.xmin * w)
+            y = int(bbox.ymin * h)
+            width = int(bbox.width * w)
+            height = int(bbox.height * h)
+            faces.append((x, y, width, height))
+    return faces
 
 def crop_avatar(image: np.ndarray, face_box: Tuple[int, int, int, int]) -> np.ndarray:
     """
-    根据人脸位置裁剪头像
+    根据人脸位置裁剪正方形头像
+    
+    裁剪区域为人脸大小的两倍；人脸靠近图像边缘时将裁剪区域整体移入图像内（人脸不再居中），
+    图像本身小于裁剪区域时缩小为图像短边，保证结果始终是正方形
     
     参数:
         image (np.ndarray): 输入图像数组
         face_box (Tuple[int, int, int, int]): 人脸位置 (x, y, width, height)
     
     返回:
-        np.ndarray: 裁剪后的头像图像
+        np.ndarray: 裁剪后的正方形头像图像
     """
     x, y, w, h = face_box
+    image_h, image_w = image.shape[:2]
     # 扩大裁剪区域，确保包含完整的人脸
     center_x = x + w // 2
     center_y = y + h // 2
-    size = max(w, h) * 2  # 扩大裁剪区域为原人脸大小的两倍
-    x1 = max(0, center_x - size // 2)
-    y1 = max(0, center_y - size // 2)
-    x2 = min(image.shape[1], x1 + size)
-    y2 = min(image.shape[0], y1 + size)
-    return image[y1:y2, x1:x2]
+    size = max(1, min(max(w, h) * 2, image_w, image_h))  # 扩大裁剪区域为原人脸大小的两倍
+    x1 = min(max(0, center_x - size // 2), image_w - size)
+    y1 = min(max(0, center_y - size // 2), image_h - size)
+    return image[y1:y1 + size, x1:x1 + size]
+
+def resize_to_fit(image: np.ndarray, size: int) -> np.ndarray:
+    """
+    按比例缩放图像，使长边等于 size
+    
+    头像裁剪结果在编码前先缩放到目标尺寸，避免编码完整分辨率的裁剪区域
+    
+    参数:
+        image (np.ndarray): 输入图像数组
+        size (int): 目标边长（像素）
+    
+    返回:
+        np.ndarray: 缩放后的图像
+    """
+    h, w = image.shape[:2]
+    scale = size / max(h, w)
+    if scale == 1:
+        return image
+    new_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    # 缩小使用区域插值避免摩尔纹，放大使用双三次插值
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(image, new_size, interpolation=interpolation)
+
+def encode_image(image: np.ndarray, image_format: str, quality: int = 90) -> bytes:
+    """
+    将图像编码为指定格式
+    
+    参数:
+        image (np.ndarray): 输入图像数组（BGR）
+        image_format (str): png、jpeg 或 webp
+        quality (int): JPEG/WebP 质量（1-100），PNG 忽略该参数
+    
+    返回:
+        bytes: 编码后的图片数据
+    
+    异常:
+        ValueError: 不支持的格式或编码失败
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    
+    if image_format == "jpeg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif image_format == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 3]
+    
+    ok, buffer = cv2.imencode(IMAGE_FORMATS[image_format][0], image, params)
+    if not ok:
+        raise ValueError(f"Failed to encode image as {image_format}")
+    return buffer.tobytes()
 
 def remove_background(image: np.ndarray) -> np.ndarray:
     """
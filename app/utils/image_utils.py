@@ -1,4 +1,5 @@
 import os
+import time
 import argparse
 import multiprocessing
 from rembg import remove, new_session
@@ -7,6 +8,12 @@ import numpy as np
 import io
 import logging
 
+from app.core.config import settings
+from app.utils.session_pool import get_session_pool
+from app.utils.batch_inference import predict_masks, PrecomputedMaskSession
+from app.utils.matting import upsample_mask, composite, load_rgb, refine_alpha, resolve_matting_engine, MATTING_ENGINES
+from app.utils.result_encoding import save_result, RESULT_FORMATS
+
 # 设置环境变量以解决OpenMP线程冲突问题
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 os.environ['OMP_NUM_THREADS'] = '1'  # 限制OpenMP线程数为1
@@ -23,8 +30,224 @@ except RuntimeError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def _record(timings, stage, started):
+    """将 started 至今的耗时（秒）累加到 timings[stage]，返回当前时间"""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - started
+    return now
+
+class _TimedSession:
+    """
+    记录 predict 耗时的模型会话包装
+    
+    rembg.remove 内部依次完成推理、alpha matting 和抠图，包装会话后才能把模型推理单独计时
+    """
+    
+    def __init__(self, session, timings):
+        self.session = session
+        self.timings = timings
+    
+    def predict(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.session.predict(*args, **kwargs)
+        finally:
+            _record(self.timings, "inference", started)
+    
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+def _prepare_image(input_image, max_size, timings=None):
+    """
+    加载图像并缩小到处理尺寸
+    
+    timings 不为空时记录 decode（解码）和 resize（缩放）阶段的耗时（秒）
+    
+    返回:
+    (处理用图像, 原始图像)
+    """
+    started = time.perf_counter()
+    # 处理输入图像
+    if isinstance(input_image, str):
+        # 如果是文件路径，打开图像
+        logger.info(f"从文件路径加载图像: {input_image}")
+        input_image = Image.open(input_image)
+    # Image.open 只读取文件头，显式解码以便与缩放分开计时
+    input_image.load()
+    started = _record(timings, "decode", started)
+    
+    # 保存原始图像
+    original_image = input_image
+    original_size = input_image.size
+    logger.info(f"原始图像尺寸: {original_size}")
+    
+    # 调整图像大小用于处理
+    if max(original_size) > max_size:
+        scale = max_size / max(original_size)
+        new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
+        logger.info(f"调整图像尺寸为: {new_size}")
+        input_image = input_image.resize(new_size, Image.LANCZOS)
+        _record(timings, "resize", started)
+    
+    return input_image, original_image
+
+def _oriented_size(image):
+    """按 EXIF 方向旋转后的图像尺寸（rembg 的输出已按 EXIF 方向旋转）"""
+    width, height = image.size
+    # 方向 5-8 需要旋转 90 度，宽高互换
+    if image.getexif().get(0x0112) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+def _refined_mask(input_image, session, matting_engine, alpha_foreground=240, alpha_background=10, alpha_erode=5):
+    """
+    在处理尺寸下计算细化后的 alpha（float32，0-1）
+    
+    会话返回多个掩码（纵向拼接，尺寸与图像不一致）时返回 None
+    """
+    if matting_engine == "pymatting":
+        # rembg 的 alpha matting 结果在输出图像的 alpha 通道中
+        logger.info(f"使用alpha_matting (前景阈值={alpha_foreground}, 背景阈值={alpha_background}, 腐蚀尺寸={alpha_erode})")
+        mask = remove(
+            input_image,
+            session=session,
+            alpha_matting=True,
+            alpha_matting_foreground_threshold=alpha_foreground,
+            alpha_matting_background_threshold=alpha_background,
+            alpha_matting_erode_size=alpha_erode
+        ).getchannel("A")
+    else:
+        mask = remove(input_image, session=session, only_mask=True)
+    
+    image = load_rgb(input_image)
+    if mask.size != (image.shape[1], image.shape[0]):
+        return None
+    
+    if matting_engine == "pymatting":
+        return np.asarray(mask, dtype=np.float32) / 255.0
+    
+    logger.info(f"边缘细化引擎: {matting_engine}")
+    return refine_alpha(image, np.asarray(mask), matting_engine, alpha_foreground, alpha_background, alpha_erode)
+
+def _composite_from_mask(input_image, original_image, session, bg_color=None,
+                         matting_engine="pymatting", alpha_foreground=240, alpha_background=10, alpha_erode=5,
+                         refine_edges=False, timings=None):
+    """
+    只在处理尺寸下计算 alpha 掩码，放大掩码后与原图像素合成
+    
+    与放大整张 RGBA 结果相比，前景颜色直接取自未经缩放的原图，
+    只需要对单通道掩码做一次重采样。会话返回多个掩码时返回 None，由调用方按原方式处理。
+    """
+    started = time.perf_counter()
+    alpha = _refined_mask(input_image, session, matting_engine, alpha_foreground, alpha_background, alpha_erode)
+    started = _record(timings, "matting", started)
+    if alpha is None:
+        return None
+    
+    original = load_rgb(original_image)
+    logger.info(f"放大掩码并与原图合成: {original.shape[1]}x{original.shape[0]}" + (" (引导滤波)" if refine_edges else ""))
+    alpha = upsample_mask(alpha, original, refine_edges)
+    output = composite(original, alpha, bg_color)
+    _record(timings, "upscale", started)
+    return output
+
+def _remove_and_resize(input_image, original_size, session, bg_color=None,
+                       matting_engine="pymatting", alpha_foreground=240, alpha_background=10, alpha_erode=5,
+                       timings=None):
+    """移除背景后将整张 RGBA 结果放大回原始尺寸（original_size 为按 EXIF 方向旋转后的尺寸）"""
+    started = time.perf_counter()
+    output = None
+    if matting_engine in ("guided", "band"):
+        alpha = _refined_mask(input_image, session, matting_engine, alpha_foreground, alpha_background, alpha_erode)
+        if alpha is not None:
+            output = composite(load_rgb(input_image), alpha, bg_color)
+        else:
+            logger.info("会话返回多个掩码，不使用边缘细化")
+            matting_engine = "none"
+    
+    if output is None and matting_engine == "pymatting":
+        logger.info(f"使用alpha_matting (前景阈值={alpha_foreground}, 背景阈值={alpha_background}, 腐蚀尺寸={alpha_erode})")
+        output = remove(
+            input_image,
+            session=session,
+            bgcolor=bg_color,
+            alpha_matting=True,
+            alpha_matting_foreground_threshold=alpha_foreground,
+            alpha_matting_background_threshold=alpha_background,
+            alpha_matting_erode_size=alpha_erode
+        )
+    elif output is None:
+        logger.info("不使用alpha_matting")
+        output = remove(
+            input_image,
+            session=session,
+            bgcolor=bg_color if bg_color else None,
+            alpha_matting=False
+        )
+    started = _record(timings, "matting", started)
+    
+    # 如果之前调整了大小，现在恢复到原始尺寸
+    if output.size != original_size:
+        logger.info(f"恢复到原始尺寸: {original_size}")
+        output = output.resize(original_size, Image.LANCZOS)
+        _record(timings, "upscale", started)
+    return output
+
+def _remove_and_save(input_image, original_image, output_path, session, bg_color=None,
+                     use_alpha_matting=True, alpha_foreground=240, alpha_background=10, alpha_erode=5,
+                     composite_mode="resize", refine_edges=False, matting_engine=None, timings=None,
+                     output_format="png", output_quality=None, png_compression=None, lossy_alpha=False):
+    """
+    对已缩放的图像移除背景，恢复原始尺寸并保存
+    
+    composite_mode 为 "resize" 时放大整张 RGBA 结果；
+    为 "mask" 时只放大掩码并与原图像素合成（refine_edges 控制是否使用引导滤波修正边缘）。
+    matting_engine 为空时按 use_alpha_matting 选择 pymatting 或 none。
+    output_format、output_quality、png_compression 和 lossy_alpha 为编码参数（见 save_result）。
+    timings 不为空时记录 inference（模型推理）、matting（掩码后处理和边缘细化）、
+    upscale（恢复原始尺寸与合成）和 encode（编码保存）阶段的耗时（秒）
+    """
+    matting_engine = resolve_matting_engine(matting_engine, use_alpha_matting)
+    stages = {}
+    session = _TimedSession(session, stages)
+    
+    # 移除背景
+    logger.info("开始移除背景...")
+    output = None
+    if composite_mode == "mask" and input_image.size != original_image.size:
+        output = _composite_from_mask(
+            input_image, original_image, session, bg_color,
+            matting_engine, alpha_foreground, alpha_background, alpha_erode, refine_edges, stages
+        )
+        if output is None:
+            logger.info("掩码与原图尺寸不一致，改为放大处理结果")
+    
+    if output is None:
+        output = _remove_and_resize(
+            input_image, _oriented_size(original_image), session, bg_color,
+            matting_engine, alpha_foreground, alpha_background, alpha_erode, stages
+        )
+    
+    # matting 阶段的计时包含了其中的模型推理，扣除后只保留后处理部分
+    stages["matting"] = max(0.0, stages.get("matting", 0.0) - stages.get("inference", 0.0))
+    started = time.perf_counter()
+    
+    # 保存结果（文件路径或BytesIO对象）
+    logger.info(f"保存处理结果 ({output_format})...")
+    save_result(output, output_path, output_format, output_quality, png_compression, lossy_alpha)
+    
+    _record(stages, "encode", started)
+    if timings is not None:
+        for stage, seconds in stages.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+    return output
+
 def change_background(input_image, output_path, bg_color=None, max_size=800, model="u2net", 
-                    use_alpha_matting=True, alpha_foreground=240, alpha_background=10, alpha_erode=5):
+                    use_alpha_matting=True, alpha_foreground=240, alpha_background=10, alpha_erode=5,
+                    session=None, composite_mode="resize", refine_edges=False, matting_engine=None,
+                    timings=None, output_format="png", output_quality=None, png_compression=None,
+                    lossy_alpha=False):
     """
     移除图像背景并替换为指定颜色
     
@@ -38,68 +261,30 @@ def change_background(input_image, output_path, bg_color=None, max_size=800, mod
     alpha_foreground: alpha_matting前景阈值 (0-255)，值越小，保留的前景越多
     alpha_background: alpha_matting背景阈值 (0-255)，值越大，移除的背景越多
     alpha_erode: alpha_matting腐蚀尺寸，影响边缘过渡区域的大小
+    session: 已加载的模型会话，为空时从进程级会话池获取（每个模型只加载一次）
+    composite_mode: "resize" 放大整张处理结果；"mask" 只放大掩码并与原图像素合成，前景更清晰且更省内存
+    refine_edges: composite_mode 为 "mask" 时，是否以原图为引导对放大后的掩码做引导滤波
+    matting_engine: 边缘细化引擎（none、guided、band、pymatting），为空时按 use_alpha_matting 选择 pymatting 或 none
+    timings: 不为空时记录各阶段耗时（秒）：decode、resize、inference、matting、upscale、encode
+    output_format: 输出格式（png、webp、avif），默认为png
+    output_quality: WebP/AVIF 编码质量（1-100），为空时使用 RESULT_DEFAULT_QUALITY
+    png_compression: PNG 压缩级别（0-9），为空时使用 RESULT_PNG_COMPRESSION
+    lossy_alpha: WebP 是否对透明通道使用有损编码
     """
     try:
         logger.info(f"开始处理图像，使用模型: {model}")
         
-        # 创建会话，指定模型
-        logger.info("正在创建模型会话...")
-        session = new_session(model)
-        
-        # 处理输入图像
-        if isinstance(input_image, str):
-            # 如果是文件路径，打开图像
-            logger.info(f"从文件路径加载图像: {input_image}")
-            input_image = Image.open(input_image)
-        
-        # 保存原始尺寸
-        original_size = input_image.size
-        logger.info(f"原始图像尺寸: {original_size}")
-        
-        # 调整图像大小用于处理
-        if max(original_size) > max_size:
-            scale = max_size / max(original_size)
-            new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
-            logger.info(f"调整图像尺寸为: {new_size}")
-            input_image = input_image.resize(new_size, Image.LANCZOS)
-        
-        # 移除背景
-        logger.info("开始移除背景...")
-        if use_alpha_matting:
-            logger.info(f"使用alpha_matting (前景阈值={alpha_foreground}, 背景阈值={alpha_background}, 腐蚀尺寸={alpha_erode})")
-            output = remove(
-                input_image,
-                session=session,
-                bgcolor=bg_color,
-                alpha_matting=True,
-                alpha_matting_foreground_threshold=alpha_foreground,
-                alpha_matting_background_threshold=alpha_background,
-                alpha_matting_erode_size=alpha_erode
-            )
-        else:
-            logger.info("不使用alpha_matting")
-            output = remove(
-                input_image,
-                session=session,
-                bgcolor=bg_color if bg_color else None,
-                alpha_matting=False
-            )
-        
-        # 如果之前调整了大小，现在恢复到原始尺寸
-        if max(original_size) > max_size:
-            logger.info(f"恢复到原始尺寸: {original_size}")
-            output = output.resize(original_size, Image.LANCZOS)
+        # 获取模型会话，重用已加载的会话避免每次重新加载模型
+        if session is None:
+            session = get_session_pool().get(model)
         
-        # 保存结果
-        logger.info("保存处理结果...")
-        if isinstance(output_path, (str, bytes, os.PathLike)):
-            # 如果是文件路径，保存到文件
-            logger.info(f"保存到文件: {output_path}")
-            output.save(output_path)
-        else:
-            # 如果是BytesIO对象，保存到内存
-            logger.info("保存到内存缓冲区")
-            output.save(output_path, format='PNG')
+        input_image, original_image = _prepare_image(input_image, max_size, timings)
+        output = _remove_and_save(
+            input_image, original_image, output_path, session, bg_color,
+            use_alpha_matting, alpha_foreground, alpha_background, alpha_erode,
+            composite_mode, refine_edges, matting_engine, timings,
+            output_format, output_quality, png_compression, lossy_alpha
+        )
         
         logger.info("图像处理完成")
         return output
@@ -108,78 +293,257 @@ def change_background(input_image, output_path, bg_color=None, max_size=800, mod
         logger.error(f"处理图像时出错: {str(e)}", exc_info=True)
         raise Exception(f"处理图像时出错: {str(e)}")
 
+def change_background_options(config):
+    """将背景移除配置快照（BackgroundRemovalConfig.processing_params）转换为 change_background 的处理参数"""
+    return {
+        "max_size": config.get('max_size', 800),
+        "use_alpha_matting": config.get('use_alpha_matting', True),
+        "alpha_foreground": config.get('alpha_foreground', 240),
+        "alpha_background": config.get('alpha_background', 10),
+        "alpha_erode": config.get('alpha_erode', 15),
+        "composite_mode": config.get('composite_mode', 'resize'),
+        "refine_edges": config.get('refine_edges', False),
+        "matting_engine": config.get('matting_engine'),
+        # auto 在提交任务时已按 Accept 头确定为具体格式，未确定时（例如旧任务）使用 png
+        "output_format": config.get('output_format') if config.get('output_format') in RESULT_FORMATS else 'png',
+        "output_quality": config.get('output_quality'),
+        "png_compression": config.get('png_compression'),
+        "lossy_alpha": config.get('lossy_alpha', False)
+    }
+
+def change_background_batch(jobs, session):
+    """
+    使用同一个模型会话批量处理多张图像，模型推理合并为一次批量推理
+    
+    参数:
+    jobs: 任务参数列表，每项为 change_background 的关键字参数字典
+          （input_image、output_path 以及可选的 bg_color、max_size、alpha_matting 和合成方式参数，不含 model/session），
+          可选的 timings 字典用于接收该图像的各阶段耗时，批量推理的耗时按图像数平均分摊
+    session: 模型会话，所有图像使用同一个模型
+    
+    返回:
+    与 jobs 一一对应的列表，成功的位置为 None，失败的位置为异常对象
+    """
+    errors = [None] * len(jobs)
+    
+    # 加载并缩放所有图像
+    prepared = []
+    for i, job in enumerate(jobs):
+        try:
+            image, original_image = _prepare_image(job['input_image'], job.get('max_size', 800), job.get('timings'))
+            prepared.append((i, image, original_image))
+        except Exception as e:
+            logger.error(f"加载图像时出错: {str(e)}", exc_info=True)
+            errors[i] = Exception(f"处理图像时出错: {str(e)}")
+    
+    if not prepared:
+        return errors
+    
+    # 一次批量推理得到所有图像的掩码
+    logger.info(f"批量推理 {len(prepared)} 张图像...")
+    started = time.perf_counter()
+    masks = predict_masks(session, [image for _, image, _ in prepared])
+    inference = (time.perf_counter() - started) / len(prepared)
+    for i, _, _ in prepared:
+        timings = jobs[i].get('timings')
+        if timings is not None:
+            timings["inference"] = timings.get("inference", 0.0) + inference
+    
+    # 使用各自的掩码和参数完成后处理
+    for (i, image, original_image), image_masks in zip(prepared, masks):
+        job = jobs[i]
+        try:
+            _remove_and_save(
+                image, original_image, job['output_path'], PrecomputedMaskSession(image_masks),
+                job.get('bg_color'),
+                job.get('use_alpha_matting', True),
+                job.get('alpha_foreground', 240),
+                job.get('alpha_background', 10),
+                job.get('alpha_erode', 5),
+                job.get('composite_mode', 'resize'),
+                job.get('refine_edges', False),
+                job.get('matting_engine'),
+                job.get('timings'),
+                job.get('output_format', 'png'),
+                job.get('output_quality'),
+                job.get('png_compression'),
+                job.get('lossy_alpha', False)
+            )
+        except Exception as e:
+            logger.error(f"处理图像时出错: {str(e)}", exc_info=True)
+            errors[i] = Exception(f"处理图像时出错: {str(e)}")
+    
+    return errors
+
+# process_directory 支持的输入格式
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff')
+
+# process_directory 工作进程中的模型会话（每个进程加载一次）
+_directory_session = None
+
+def _load_directory_session(model):
+    """加载 process_directory 使用的模型会话"""
+    global _directory_session
+    _directory_session = new_session(model)
+
+def _init_directory_worker(model):
+    """process_directory 进程池工作进程初始化：预先加载模型会话（只作为进程池的 initializer 使用）"""
+    # 工作进程只输出进度汇总，不输出每张图片的处理日志
+    logging.getLogger(__name__).setLevel(logging.WARNING)
+    # 进程池的工作进程是守护进程，不能再创建分块求解进程池，band 细化在当前进程中求解
+    settings.MATTING_WORKERS = 0
+    _load_directory_session(model)
+
+def _process_directory_file(job):
+    """
+    处理目录中的一张图像（在工作进程中执行）
+    
+    返回:
+    (相对路径, 各阶段耗时, 错误信息)
+    """
+    relative_path, input_path, output_path, options = job
+    timings = {}
+    # 先写入临时文件再重命名，中断时不会留下不完整的输出（否则下次运行会被当作已完成而跳过）
+    tmp_path = f"{output_path}.{os.getpid()}.tmp.png"
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        change_background(input_path, tmp_path, session=_directory_session, timings=timings, **options)
+        os.replace(tmp_path, output_path)
+        return relative_path, timings, None
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return relative_path, timings, str(e)
+
+def _find_images(input_dir, recursive=False):
+    """查找目录中的图像，返回相对路径列表"""
+    if not recursive:
+        return sorted(f for f in os.listdir(input_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    
+    image_files = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for f in sorted(files):
+            if f.lower().endswith(IMAGE_EXTENSIONS):
+                image_files.append(os.path.relpath(os.path.join(root, f), input_dir))
+    return image_files
+
+def _output_path_for(output_dir, relative_path):
+    """输出路径：保持输入的目录结构，文件名加 _bg_changed 后缀"""
+    stem = os.path.splitext(relative_path)[0]
+    return os.path.join(output_dir, f"{stem}_bg_changed.png")
+
+def _is_up_to_date(input_path, output_path):
+    """输出文件已存在且不早于输入文件"""
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+    except OSError:
+        return False
+
 def process_directory(input_dir, output_dir, bg_color=(255, 255, 255, 255), max_size=800, model="u2net", 
-                      use_alpha_matting=True, alpha_foreground=240, alpha_background=10, alpha_erode=5):
-    """处理目录中的所有图像"""
+                      use_alpha_matting=True, alpha_foreground=240, alpha_background=10, alpha_erode=5,
+                      composite_mode="resize", refine_edges=False, matting_engine=None,
+                      workers=1, recursive=False, force=False):
+    """
+    处理目录中的所有图像
+    
+    参数:
+    workers: 并行处理的进程数，每个进程加载自己的模型会话
+    recursive: 是否处理子目录（输出保持相同的目录结构）
+    force: 是否重新处理已有输出的图像。默认跳过输出已存在且不早于输入的图像，
+           因此中断后重新运行会从未完成的图像继续
+    其余参数同 change_background
+    
+    返回:
+    处理统计信息字典
+    """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    # 创建会话，重用会话可以加快速度
-    print(f"正在加载{model}模型...")
-    session = new_session(model)
-    
     # 获取所有图像文件
-    image_files = [f for f in os.listdir(input_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    
+    image_files = _find_images(input_dir, recursive)
     if not image_files:
         print(f"在 {input_dir} 中没有找到图像文件")
-        return
+        return None
     
-    # 处理每个图像
-    for i, img_file in enumerate(image_files, 1):
-        input_path = os.path.join(input_dir, img_file)
-        output_path = os.path.join(output_dir, f"{os.path.splitext(img_file)[0]}_bg_changed.png")
-        
-        print(f"[{i}/{len(image_files)}] 处理图像: {img_file}")
-        try:
-            # 打开输入图像
-            input_image = Image.open(input_path)
-            
-            # 保存原始尺寸
-            original_size = input_image.size
-            print(f"原始尺寸: {original_size[0]}x{original_size[1]}")
-            
-            # 调整图像大小用于处理
-            if max(original_size) > max_size:
-                scale = max_size / max(original_size)
-                new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
-                print(f"调整处理尺寸为: {new_size[0]}x{new_size[1]}")
-                input_image = input_image.resize(new_size, Image.LANCZOS)
-            
-            # 移除背景
-            if use_alpha_matting:
-                print(f"移除背景中... 使用增强alpha_matting (前景={alpha_foreground}, 背景={alpha_background}, 腐蚀={alpha_erode})")
-                output = remove(
-                    input_image,
-                    session=session,
-                    bgcolor=bg_color,
-                    alpha_matting=True,
-                    alpha_matting_foreground_threshold=alpha_foreground,
-                    alpha_matting_background_threshold=alpha_background,
-                    alpha_matting_erode_size=alpha_erode
-                )
-            else:
-                print(f"移除背景中... 不使用alpha_matting")
-                output = remove(
-                    input_image,
-                    session=session,
-                    bgcolor=bg_color,
-                    alpha_matting=False
-                )
-            
-            # 如果之前调整了大小，现在恢复到原始尺寸
-            if max(original_size) > max_size:
-                print(f"恢复到原始尺寸: {original_size[0]}x{original_size[1]}")
-                output = output.resize(original_size, Image.LANCZOS)
-            
-            # 保存结果
-            output.save(output_path)
-            print(f"已保存到: {output_path}")
-            
-        except Exception as e:
-            print(f"处理 {img_file} 时出错: {e}")
+    options = {
+        "bg_color": bg_color,
+        "max_size": max_size,
+        "model": model,
+        "use_alpha_matting": use_alpha_matting,
+        "alpha_foreground": alpha_foreground,
+        "alpha_background": alpha_background,
+        "alpha_erode": alpha_erode,
+        "composite_mode": composite_mode,
+        "refine_edges": refine_edges,
+        "matting_engine": matting_engine,
+    }
+    
+    # 跳过已处理的图像
+    jobs = []
+    skipped = 0
+    for relative_path in image_files:
+        input_path = os.path.join(input_dir, relative_path)
+        output_path = _output_path_for(output_dir, relative_path)
+        if not force and _is_up_to_date(input_path, output_path):
+            skipped += 1
+            continue
+        jobs.append((relative_path, input_path, output_path, options))
+    
+    print(f"共 {len(image_files)} 张图像，跳过已处理的 {skipped} 张，待处理 {len(jobs)} 张")
+    if not jobs:
+        return {"total": len(image_files), "processed": 0, "skipped": skipped, "failed": 0}
+    
+    workers = max(1, min(workers, len(jobs)))
+    print(f"正在加载{model}模型（{workers} 个进程）...")
+    
+    stage_totals = {}
+    failed = 0
+    started = time.perf_counter()
     
+    def report(index, result):
+        nonlocal failed
+        relative_path, timings, error = result
+        for stage, seconds in timings.items():
+            stage_totals.setdefault(stage, []).append(seconds)
+        if error:
+            failed += 1
+            print(f"[{index}/{len(jobs)}] 处理 {relative_path} 时出错: {error}")
+        else:
+            print(f"[{index}/{len(jobs)}] {relative_path} ({sum(timings.values()):.2f}s)")
+    
+    if workers == 1:
+        # 单进程时直接在当前进程中处理，复用同一个会话（保留日志输出和分块并行求解）
+        _load_directory_session(model)
+        for index, job in enumerate(jobs, 1):
+            report(index, _process_directory_file(job))
+    else:
+        with multiprocessing.get_context('spawn').Pool(
+            workers, initializer=_init_directory_worker, initargs=(model,)
+        ) as pool:
+            for index, result in enumerate(pool.imap_unordered(_process_directory_file, jobs), 1):
+                report(index, result)
+    
+    elapsed = time.perf_counter() - started
+    processed = len(jobs) - failed
+    
+    # 输出吞吐量和各阶段耗时（各进程耗时之和按图像平均）
     print("所有图像处理完成!")
+    print(f"成功 {processed} 张，失败 {failed} 张，跳过 {skipped} 张，"
+          f"耗时 {elapsed:.1f}s，吞吐量 {processed / elapsed:.2f} 张/秒")
+    for stage, values in stage_totals.items():
+        values.sort()
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"  {stage:9} 平均 {sum(values) / len(values) * 1000:8.1f}ms  p95 {p95 * 1000:8.1f}ms  合计 {sum(values):8.1f}s")
+    
+    return {
+        "total": len(image_files),
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed": elapsed,
+        "stages": {stage: sum(values) for stage, values in stage_totals.items()},
+    }
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="使用AI模型替换图像背景颜色")
@@ -192,6 +556,14 @@ if __name__ == "__main__":
     parser.add_argument("--alpha-fg", type=int, help="alpha_matting前景阈值 (0-255)，值越小，保留的前景越多", default=240)
     parser.add_argument("--alpha-bg", type=int, help="alpha_matting背景阈值 (0-255)，值越大，移除的背景越多", default=10)
     parser.add_argument("--alpha-erode", type=int, help="alpha_matting腐蚀尺寸，增大该值使边缘过渡更平滑", default=5)
+    parser.add_argument("--composite", choices=["resize", "mask"], default="resize",
+                        help="合成方式：resize 放大处理结果，mask 只放大掩码并与原图合成（前景更清晰）")
+    parser.add_argument("--refine-edges", action="store_true", help="mask 合成时使用引导滤波修正边缘")
+    parser.add_argument("--workers", type=int, default=1, help="处理目录时的并行进程数，每个进程加载自己的模型")
+    parser.add_argument("--recursive", action="store_true", help="处理目录时包含子目录")
+    parser.add_argument("--force", action="store_true", help="重新处理已有输出的图像（默认跳过输出比输入新的图像）")
+    parser.add_argument("--matting", choices=MATTING_ENGINES,
+                        help="边缘细化引擎：none 不细化，guided 引导滤波，band 只在过渡带求解 closed-form，pymatting 原有的 alpha matting")
     
     args = parser.parse_args()
     
@@ -211,9 +583,14 @@ if __name__ == "__main__":
     # 检查是文件还是目录
     if os.path.isfile(args.input):
         change_background(args.input, args.output, bg_color, args.max_size, args.model, 
-                          use_alpha_matting, args.alpha_fg, args.alpha_bg, args.alpha_erode)
+                          use_alpha_matting, args.alpha_fg, args.alpha_bg, args.alpha_erode,
+                          composite_mode=args.composite, refine_edges=args.refine_edges,
+                          matting_engine=args.matting)
     elif os.path.isdir(args.input):
         process_directory(args.input, args.output, bg_color, args.max_size, args.model,
-                          use_alpha_matting, args.alpha_fg, args.alpha_bg, args.alpha_erode)
+                          use_alpha_matting, args.alpha_fg, args.alpha_bg, args.alpha_erode,
+                          composite_mode=args.composite, refine_edges=args.refine_edges,
+                          matting_engine=args.matting, workers=args.workers,
+                          recursive=args.recursive, force=args.force)
     else:
         print(f"输入路径不存在: {args.input}")
\ No newline at end of file
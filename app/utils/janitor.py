@@ -0,0 +1,141 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.utils import metrics
+from app.utils.task_queue import TaskQueue, remove_file
+
+logger = logging.getLogger(__name__)
+
+def _scan(directory: Path) -> Iterator[Tuple[float, int, Path]]:
+    """递归列出目录中的文件 (修改时间, 大小, 路径)，只读取文件元数据"""
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _scan(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield stat.st_mtime, stat.st_size, Path(entry.path)
+            except FileNotFoundError:
+                continue
+
+def remove_older_than(directory: Path, max_age: float) -> int:
+    """删除目录中修改时间早于 max_age 秒之前的文件，返回释放的字节数"""
+    cutoff = time.time() - max_age
+    return sum(remove_file(path) for mtime, _, path in _scan(directory) if mtime < cutoff)
+
+class Janitor:
+    """
+    磁盘清理任务
+
+    在 API 进程的后台线程中每隔 JANITOR_INTERVAL 秒执行一次：
+    - 通过队列后端的过期索引删除超过 TASK_RESULT_TTL 的已结束任务及其结果图片
+    - 删除结果图片目录中超过 TASK_RESULT_TTL、没有任务引用的图片（例如任务数据已在 Redis 中过期），
+      尚未结束的批量任务中的图片仍被任务引用，不会被删除
+    - 删除超过 UPLOAD_TTL 的上传文件（正常情况下任务结束时已由工作进程删除）
+    - 上传、结果和队列目录的总大小超过 DATA_DISK_QUOTA_MB 时，按修改时间从早到晚删除结果图片
+
+    每次执行的结果（各类释放的字节数）记录在 last_report 中，并累加到 janitor_reclaimed_bytes_total 指标。
+    """
+
+    def __init__(self, task_queue: TaskQueue, upload_dir: str = "data/uploads",
+                 result_image_dir: str = "data/results/images",
+                 data_dirs: Sequence[str] = ("data/uploads", "data/results", "data/queue")):
+        self.task_queue = task_queue
+        self.upload_dir = Path(upload_dir)
+        self.result_image_dir = Path(result_image_dir)
+        self.data_dirs = [Path(data_dir) for data_dir in data_dirs]
+        self.stop_event = threading.Event()
+        self.last_report: Optional[Dict] = None
+        self._thread = None
+
+    def start(self):
+        """启动后台清理线程（JANITOR_INTERVAL 为 0 时不启动）"""
+        if settings.JANITOR_INTERVAL <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台清理线程"""
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        # 启动时立即清理一次，之后按间隔执行
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"磁盘清理失败: {str(e)}")
+            if self.stop_event.wait(settings.JANITOR_INTERVAL):
+                return
+
+    def run_once(self) -> Dict[str, int]:
+        """执行一次清理，返回各类释放的字节数"""
+        started = time.perf_counter()
+        reclaimed = {
+            "results": self.task_queue.cleanup_expired(),
+            "result_images": self._remove_unreferenced_images(),
+            "uploads": remove_older_than(self.upload_dir, settings.UPLOAD_TTL),
+        }
+        reclaimed["quota"], usage = self._enforce_quota()
+
+        for target, freed in reclaimed.items():
+            if freed:
+                metrics.JANITOR_RECLAIMED.labels(target).inc(freed)
+        total = sum(reclaimed.values())
+        if total:
+            logger.info(f"磁盘清理释放了 {total / 1024 / 1024:.1f}MB: {reclaimed}")
+
+        self.last_report = {
+            "finished_at": datetime.now().isoformat(),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "reclaimed_bytes": reclaimed,
+            "usage_bytes": usage,
+        }
+        return reclaimed
+
+    def _remove_unreferenced_images(self) -> int:
+        """删除修改时间超过 TASK_RESULT_TTL 且对应任务（文件名为任务ID）已不存在的结果图片"""
+        cutoff = time.time() - settings.TASK_RESULT_TTL
+        freed = 0
+        for mtime, _, path in _scan(self.result_image_dir):
+            if mtime < cutoff and self.task_queue.get_task_status(path.stem) is None:
+                freed += remove_file(path)
+        return freed
+
+    def _enforce_quota(self) -> Tuple[int, int]:
+        """
+        总大小超过 DATA_DISK_QUOTA_MB 时删除最早的结果图片
+
+        待处理任务的上传文件和任务数据不会被删除；结果图片被删除的任务查询结果时返回 404。
+
+        返回:
+            (释放的字节数, 清理后的总大小)
+        """
+        usage = sum(size for data_dir in self.data_dirs for _, size, _ in _scan(data_dir))
+        quota = settings.DATA_DISK_QUOTA_MB * 1024 * 1024
+        if quota <= 0 or usage <= quota:
+            return 0, usage
+
+        freed = 0
+        for _, size, path in sorted(_scan(self.result_image_dir)):
+            if usage <= quota:
+                break
+            freed += remove_file(path)
+            usage -= size
+        if usage > quota:
+            logger.warning(f"删除全部结果图片后仍超出磁盘配额: {usage / 1024 / 1024:.1f}MB")
+        return freed, usage
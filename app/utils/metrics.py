@@ -0,0 +1,145 @@
+import os
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+from app.utils.task_queue import task_lane
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, multiprocess, values
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# 单张图片各阶段耗时的分桶（秒）
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 排队等待时间的分桶（秒）
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+# 多进程模式下指标值只在首次使用标签时创建文件，因此所有指标都带标签，
+# 保证导入本模块不会在指标目录中留下文件（启动时清理目录不会影响当前进程）
+QUEUE_WAIT = Histogram(
+    "task_queue_wait_seconds", "任务从入队到被工作进程领取的等待时间，lane 为任务通道（interactive、bulk）",
+    ["task_type", "lane"], buckets=QUEUE_WAIT_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    "image_stage_duration_seconds",
+    "背景移除各阶段耗时：decode、resize、inference、matting、upscale、encode",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+TASK_DURATION = Histogram(
+    "task_duration_seconds", "工作进程处理单个任务的总耗时",
+    ["task_type"], buckets=STAGE_BUCKETS
+)
+TASKS_COMPLETED = Counter("tasks_completed_total", "完成的任务数", ["task_type"])
+TASKS_FAILED = Counter("tasks_failed_total", "失败的任务数", ["task_type"])
+TASKS_EXPIRED = Counter(
+    "task_lease_expired_total", "租约过期被回收的任务数，result 为 requeued（重新排队）或 dead（转入死信）",
+    ["result"]
+)
+JANITOR_RECLAIMED = Counter(
+    "janitor_reclaimed_bytes_total", "清理任务释放的磁盘空间（字节），target 为 results、result_images、uploads 或 quota",
+    ["target"]
+)
+SESSION_REQUESTS = Counter(
+    "model_session_requests_total", "模型会话池请求数，result 为 hit（复用）或 load（加载）",
+    ["model", "result"]
+)
+SESSION_EVICTIONS = Counter("model_session_evictions_total", "模型会话池淘汰的会话数", ["model"])
+REQUEST_LATENCY = Histogram(
+    "background_removal_latency_seconds",
+    "背景移除从提交到结果可用的耗时，path 为 sync（同步返回）、cache（命中结果缓存）或 async（任务队列）",
+    ["path"], buckets=QUEUE_WAIT_BUCKETS
+)
+
+# 在抓取时计算的指标 {指标名: (说明, 标签名, 数据源)}
+_gauge_sources: Dict[str, tuple] = {}
+
+def _task_age(task_data: Dict) -> Optional[float]:
+    """任务创建（created_at）至今的秒数，无法解析时返回 None"""
+    try:
+        created_at = datetime.fromisoformat(task_data['created_at'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return max(0.0, (datetime.now() - created_at).total_seconds())
+
+def observe_queue_wait(task_data: Dict):
+    """记录任务的排队等待时间（created_at 到当前时间）"""
+    wait = _task_age(task_data)
+    if wait is not None:
+        QUEUE_WAIT.labels(task_data.get('type', 'unknown'), task_lane(task_data)).observe(wait)
+
+def observe_latency(path: str, seconds: float):
+    """记录背景移除请求从提交到结果可用的耗时"""
+    REQUEST_LATENCY.labels(path).observe(seconds)
+
+def observe_stages(timings: Dict[str, float]):
+    """记录 change_background 返回的各阶段耗时"""
+    for stage, seconds in timings.items():
+        STAGE_DURATION.labels(stage).observe(seconds)
+
+def observe_task(task_data: Dict, seconds: float, failed: bool = False):
+    """记录任务的处理耗时和结果，背景移除任务成功时同时记录异步路径的端到端耗时"""
+    task_type = task_data.get('type', 'unknown')
+    TASK_DURATION.labels(task_type).observe(seconds)
+    if failed:
+        TASKS_FAILED.labels(task_type).inc()
+        return
+    TASKS_COMPLETED.labels(task_type).inc()
+    age = _task_age(task_data)
+    if task_type == "background_removal" and age is not None:
+        observe_latency("async", age)
+
+def register_gauge(name: str, documentation: str, source: Callable, label: Optional[str] = None):
+    """
+    注册在抓取 /metrics 时计算的指标（只在 API 进程中注册）
+
+    source 返回一个数值；指定 label 时返回 {标签值: 数值} 字典
+    """
+    _gauge_sources[name] = (documentation, label, source)
+
+class _GaugeCollector:
+    """将 register_gauge 注册的数据源转换为 Gauge 指标"""
+
+    def collect(self):
+        for name, (documentation, label, source) in list(_gauge_sources.items()):
+            try:
+                value = source()
+            except Exception as e:
+                # 队列后端暂时不可用时跳过该指标，不影响其他指标
+                logger.warning(f"采集指标 {name} 失败: {str(e)}")
+                continue
+            if label is None:
+                yield GaugeMetricFamily(name, documentation, value=value)
+                continue
+            gauge = GaugeMetricFamily(name, documentation, labels=[label])
+            for label_value, sample in value.items():
+                gauge.add_metric([str(label_value)], sample)
+            yield gauge
+
+def init_metrics():
+    """
+    启用多进程模式（API 进程启动时和工作进程中调用，应在记录任何指标之前调用）
+
+    设置 PROMETHEUS_MULTIPROC_DIR 并创建目录，工作进程由 API 进程启动，会继承同一个目录，
+    各进程写入的指标在 /metrics 中汇总。prometheus_client 在导入时根据该环境变量选择指标值的实现，
+    这里设置后重新选择；本模块的指标都带标签，值在首次使用标签时才创建，因此导入之后设置同样生效。
+    未调用时（例如命令行批量处理）指标只保存在当前进程的内存中，不写入磁盘。
+    """
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.METRICS_MULTIPROC_DIR)
+    Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).mkdir(parents=True, exist_ok=True)
+    values.ValueClass = values.get_value_class()
+
+def clear_multiproc_dir():
+    """删除上次运行留下的指标文件（应在启动工作进程之前调用）"""
+    for path in Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).glob("*.db"):
+        path.unlink(missing_ok=True)
+
+def render() -> bytes:
+    """汇总所有进程的指标，生成 Prometheus 文本格式"""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_GaugeCollector())
+    return generate_latest(registry)
@@ -0,0 +1,304 @@
+import json
+import time
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+from app.utils.task_queue import (
+    QueueBackend, TASK_LANES, expire_lease, lane_order, remove_file, retention_start, task_lane, task_user
+)
+
+# 入队唤醒信号列表保留的最大长度
+READY_SIGNAL_LIMIT = 1000
+
+# 原子地领取下一个任务：先处理旧版本的 pending 列表，再按通道顺序从最久没有被服务的用户的列表中领取
+# 领取的任务同时登记租约到期时间
+# KEYS: processing 列表, 旧版本 pending 列表, 租约有序集合；ARGV: 键前缀, 当前时间, 租约到期时间, 通道...
+CLAIM_SCRIPT = """
+local task_id = redis.call('RPOPLPUSH', KEYS[2], KEYS[1])
+if not task_id then
+    for i = 4, #ARGV do
+        local users_key = ARGV[1] .. ':users:' .. ARGV[i]
+        for _, user in ipairs(redis.call('ZRANGE', users_key, 0, -1)) do
+            task_id = redis.call('RPOPLPUSH', ARGV[1] .. ':pending:' .. ARGV[i] .. ':' .. user, KEYS[1])
+            if task_id then
+                redis.call('ZADD', users_key, ARGV[2], user)
+                break
+            end
+            redis.call('ZREM', users_key, user)
+        end
+        if task_id then
+            break
+        end
+    end
+end
+if task_id then
+    redis.call('ZADD', KEYS[3], ARGV[3], task_id)
+end
+return task_id
+"""
+
+class RedisQueueBackend(QueueBackend):
+    """
+    基于 Redis 的队列后端
+
+    多个 API 实例和工作节点共享同一个队列：
+    - {prefix}:pending:{lane}:{user}  各通道中每个用户的待处理任务 ID 列表（LPUSH 入队，先进先出）
+    - {prefix}:users:{lane}  有待处理任务的用户，分数为上次被领取任务的时间（新用户为 0）
+    - {prefix}:ready         入队唤醒信号，空闲的工作进程阻塞等待该列表
+    - {prefix}:pending       旧版本的待处理任务 ID 列表，优先领取完
+    - {prefix}:processing    处理中任务 ID 列表
+    - {prefix}:leases        处理中任务的租约到期时间
+    - {prefix}:delayed       等待重试的任务，分数为最早可以领取的时间
+    - {prefix}:task:{id}     任务哈希（status、data），完成后按 TTL 自动过期
+    - {prefix}:result:{id}   结果图片内容（可选），供其他节点上的 API 返回结果
+    - {prefix}:input:{id}    上传的图片内容（可选），供其他节点上的工作进程读取，任务结束时删除
+    - {prefix}:expiry        按结束时间排序的已完成任务，用于清理本地结果图片
+    """
+
+    name = "redis"
+    supports_blocking = True
+
+    def __init__(self, client: Optional[redis.Redis] = None, prefix: Optional[str] = None,
+                 result_ttl: Optional[int] = None, store_result_images: Optional[bool] = None,
+                 store_input_images: Optional[bool] = None):
+        # 允许传入现成的客户端（例如测试时使用 fakeredis）
+        self.client = client if client is not None else redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
+        self.prefix = prefix or settings.REDIS_QUEUE_PREFIX
+        self.result_ttl = result_ttl or settings.REDIS_RESULT_TTL
+        self.store_result_images = (
+            settings.REDIS_STORE_RESULT_IMAGES if store_result_images is None else store_result_images
+        )
+        self.store_input_images = (
+            settings.REDIS_STORE_INPUT_IMAGES if store_input_images is None else store_input_images
+        )
+        self._claim_script = self.client.register_script(CLAIM_SCRIPT)
+        # 旧版本领取的任务是否已登记租约（每个实例只需检查一次）
+        self._leases_backfilled = False
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    @staticmethod
+    def _str(value) -> Optional[str]:
+        """客户端未开启 decode_responses 时返回的是 bytes"""
+        if isinstance(value, bytes):
+            return value.decode('utf-8')
+        return value
+
+    def add(self, task_data: Dict):
+        """保存任务"""
+        task_id = task_data['id']
+        status = task_data.get('status', 'pending')
+        pipe = self.client.pipeline()
+        pipe.hset(self._key("task", task_id), mapping={"status": status, "data": json.dumps(task_data)})
+        if status == 'pending' and not task_data.get('attempts'):
+            self._store_input(pipe, task_data)
+        if status == 'pending' and task_data.get('available_at', 0) > time.time():
+            # 重试任务到期后由 expire_leases 放回待处理列表
+            pipe.zadd(self._key("delayed"), {task_id: task_data['available_at']})
+        elif status == 'pending':
+            lane, user = task_lane(task_data), task_user(task_data)
+            pipe.lpush(self._key("pending", lane, user), task_id)
+            # 新用户以 0 分加入，排在已被服务过的用户之前；已有的用户保持原分数
+            pipe.zadd(self._key("users", lane), {user: 0}, nx=True)
+            pipe.lpush(self._key("ready"), 1)
+            pipe.ltrim(self._key("ready"), 0, READY_SIGNAL_LIMIT - 1)
+        elif status == 'processing':
+            pipe.lpush(self._key("processing"), task_id)
+        elif status != 'running':
+            self._expire(pipe, task_data)
+        pipe.execute()
+
+    def _store_input(self, pipe, task_data: Dict):
+        """首次入队时保存上传的图片，使不共享磁盘的工作节点也能处理该任务"""
+        input_path = task_data.get('params', {}).get('input_path')
+        if not self.store_input_images or not input_path or not Path(input_path).exists():
+            return
+        with open(input_path, 'rb') as f:
+            pipe.set(self._key("input", task_data['id']), f.read(), ex=settings.UPLOAD_TTL)
+
+    def _expire(self, pipe, task_data: Dict):
+        """为已结束的任务设置过期时间并登记到清理索引"""
+        task_id = task_data['id']
+        pipe.delete(self._key("input", task_id))
+        if task_data.get('result_path'):
+            pipe.hset(self._key("result_paths"), task_id, task_data['result_path'])
+        # 按结束时间登记，排队时间较长的任务完成后同样保留完整的时长；
+        # 批量任务中的图片在批量任务结束后由 finish_batch 重新保存时登记
+        finished_at = retention_start(task_data)
+        if finished_at is None:
+            return
+        pipe.expire(self._key("task", task_id), self.result_ttl)
+        pipe.expire(self._key("result", task_id), self.result_ttl)
+        pipe.zadd(self._key("expiry"), {task_id: datetime.fromisoformat(finished_at).timestamp()})
+
+    def _claim(self, task_id: Optional[str]) -> Optional[Dict]:
+        """将已移入处理中列表的任务标记为处理中"""
+        if task_id is None:
+            return None
+        task_id = self._str(task_id)
+        task_key = self._key("task", task_id)
+        data = self._str(self.client.hget(task_key, "data"))
+        if data is None:
+            # 任务数据已丢失
+            self.client.lrem(self._key("processing"), 0, task_id)
+            return None
+        task_data = json.loads(data)
+        task_data['status'] = 'processing'
+        self.client.hset(task_key, mapping={"status": "processing", "data": json.dumps(task_data)})
+        return task_data
+
+    def claim_next(self) -> Optional[Dict]:
+        """领取下一个待处理任务（在 Lua 脚本中原子执行，每个任务只被一个节点领取）"""
+        now = time.time()
+        task_id = self._claim_script(
+            keys=[self._key("processing"), self._key("pending"), self._key("leases")],
+            args=[self.prefix, now, now + settings.TASK_LEASE_SECONDS, *lane_order()]
+        )
+        return self._claim(task_id)
+
+    def claim_next_blocking(self, timeout: float) -> Optional[Dict]:
+        """阻塞等待入队信号并领取任务，任意节点入队都会立即唤醒"""
+        deadline = time.monotonic() + timeout
+        while True:
+            task_data = self.claim_next()
+            if task_data:
+                return task_data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # BLPOP 的超时为整数秒，0 表示永久阻塞；多余的信号只会导致一次空的领取
+            if self.client.blpop(self._key("ready"), max(1, int(remaining))) is None:
+                return self.claim_next()
+
+    def complete(self, task_id: str, result_path: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """完成任务并保存结果（租约已被回收的任务不会被修改）"""
+        task_key = self._key("task", task_id)
+        status, data = map(self._str, self.client.hmget(task_key, "status", "data"))
+        if data is None or status != 'processing':
+            return False
+
+        task_data = json.loads(data)
+        task_data['status'] = 'completed' if not error else 'failed'
+        task_data['completed_at'] = datetime.now().isoformat()
+        if result_path:
+            task_data['result_path'] = result_path
+        if error:
+            task_data['error'] = error
+
+        pipe = self.client.pipeline()
+        pipe.hset(task_key, mapping={"status": task_data['status'], "data": json.dumps(task_data)})
+        pipe.lrem(self._key("processing"), 0, task_id)
+        pipe.zrem(self._key("leases"), task_id)
+        if result_path and self.store_result_images and Path(result_path).exists():
+            # 保存结果图片，使不共享磁盘的 API 节点也能返回结果（过期时间与任务数据一起在 _expire 中设置）
+            with open(result_path, 'rb') as f:
+                pipe.set(self._key("result", task_id), f.read())
+        self._expire(pipe, task_data)
+        pipe.execute()
+        return True
+
+    def renew(self, task_id: str) -> bool:
+        """延长处理中任务的租约"""
+        if self.client.zscore(self._key("leases"), task_id) is None:
+            return False
+        self.client.zadd(self._key("leases"), {task_id: time.time() + settings.TASK_LEASE_SECONDS}, xx=True)
+        return True
+
+    def _load(self, task_id: str) -> Optional[Dict]:
+        data = self._str(self.client.hget(self._key("task", task_id), "data"))
+        return json.loads(data) if data is not None else None
+
+    def expire_leases(self) -> List[Tuple[str, str]]:
+        """回收租约过期的任务，并将到期的重试任务放回待处理列表（ZREM 成功的节点负责处理，多个节点可同时执行）"""
+        now = time.time()
+        leases_key = self._key("leases")
+
+        # 旧版本领取的任务没有租约，首次检查时登记，从现在开始计时
+        if not self._leases_backfilled:
+            processing = self.client.lrange(self._key("processing"), 0, -1)
+            if processing:
+                deadline = now + settings.TASK_LEASE_SECONDS
+                self.client.zadd(leases_key, {self._str(task_id): deadline for task_id in processing}, nx=True)
+            self._leases_backfilled = True
+
+        expired = []
+        for task_id in map(self._str, self.client.zrangebyscore(leases_key, "-inf", now)):
+            if not self.client.zrem(leases_key, task_id):
+                continue
+            self.client.lrem(self._key("processing"), 0, task_id)
+            # 租约过期前任务可能已经完成（complete 与本次检查之间的竞争），不再放回队列
+            if self._str(self.client.hget(self._key("task", task_id), "status")) != 'processing':
+                continue
+            task_data = self._load(task_id)
+            if task_data is None:
+                continue
+            task_data = expire_lease(task_data, now)
+            self.add(task_data)
+            expired.append((task_id, task_data['status']))
+
+        for task_id in map(self._str, self.client.zrangebyscore(self._key("delayed"), "-inf", now)):
+            if not self.client.zrem(self._key("delayed"), task_id):
+                continue
+            task_data = self._load(task_id)
+            if task_data is not None:
+                self.add(task_data)
+        return expired
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        """获取任务状态"""
+        status, data = map(self._str, self.client.hmget(self._key("task", task_id), "status", "data"))
+        if data is None:
+            return None
+        task_data = json.loads(data)
+        task_data['status'] = status
+        return task_data
+
+    def get_input_bytes(self, task_id: str) -> Optional[bytes]:
+        """获取保存在 Redis 中的上传图片"""
+        if not self.store_input_images:
+            return None
+        return self.client.get(self._key("input", task_id))
+
+    def get_result_bytes(self, task_id: str) -> Optional[bytes]:
+        """获取保存在 Redis 中的结果图片"""
+        if not self.store_result_images:
+            return None
+        return self.client.get(self._key("result", task_id))
+
+    def depth(self) -> Dict[str, int]:
+        """待处理（包括等待重试）和处理中的任务数"""
+        pipe = self.client.pipeline()
+        pipe.llen(self._key("pending"))
+        pipe.zcard(self._key("delayed"))
+        pipe.llen(self._key("processing"))
+        for lane in TASK_LANES:
+            for user in self.client.zrange(self._key("users", lane), 0, -1):
+                pipe.llen(self._key("pending", lane, self._str(user)))
+        legacy, delayed, processing, *pending = pipe.execute()
+        return {'pending': legacy + delayed + sum(pending), 'processing': processing}
+
+    def cleanup_expired(self, max_age: timedelta) -> int:
+        """删除过期任务在本地磁盘上的结果图片（任务数据本身由 Redis TTL 过期）"""
+        cutoff = (datetime.now() - max_age).timestamp()
+        expired = [self._str(task_id) for task_id in self.client.zrangebyscore(self._key("expiry"), "-inf", cutoff)]
+        if not expired:
+            return 0
+        freed = 0
+        result_paths = map(self._str, self.client.hmget(self._key("result_paths"), expired))
+        for result_path in result_paths:
+            if result_path:
+                freed += remove_file(Path(result_path))
+        pipe = self.client.pipeline()
+        pipe.zrem(self._key("expiry"), *expired)
+        pipe.hdel(self._key("result_paths"), *expired)
+        pipe.execute()
+        return freed
@@ -0,0 +1,172 @@
+import os
+import time
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 参与缓存键计算的配置参数，其他字段（名称、描述等）不影响处理结果
+CACHE_KEY_FIELDS = (
+    "model",
+    "max_size",
+    "use_alpha_matting",
+    "alpha_foreground",
+    "alpha_background",
+    "alpha_erode",
+    "composite_mode",
+    "refine_edges",
+    "matting_engine",
+    "output_format",
+    "output_quality",
+    "png_compression",
+    "lossy_alpha",
+)
+
+def make_cache_key(content_sha256: str, config: Dict) -> str:
+    """根据图片内容的 SHA-256 和生效的处理参数计算缓存键"""
+    params = {field: config.get(field) for field in CACHE_KEY_FIELDS}
+    digest = hashlib.sha256(content_sha256.encode('utf-8'))
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def link_or_copy(source: Path, target: Path):
+    """优先使用硬链接，跨文件系统等情况下退回复制"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+class ResultCache:
+    """
+    背景移除结果缓存
+
+    以图片内容和处理参数（包括输出格式和编码参数）的哈希为键保存已生成的结果图片，
+    重复提交的图片直接复用结果而不再重新推理。缓存文件的扩展名固定为 .png，内容按缓存键对应的输出格式编码。
+    按最近使用时间（文件 mtime）淘汰超过容量的条目，并删除超过保留时间的条目。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size_mb: Optional[int] = None,
+                 ttl: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or settings.RESULT_CACHE_DIR)
+        self.max_bytes = (max_size_mb or settings.RESULT_CACHE_MAX_SIZE_MB) * 1024 * 1024
+        self.ttl = ttl or settings.RESULT_CACHE_TTL
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+
+        # 统计计数（进程内）
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.png"
+
+    def get(self, key: str) -> Optional[Path]:
+        """查找缓存结果，命中时刷新最近使用时间"""
+        path = self._path(key)
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        if time.time() - mtime > self.ttl:
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            self.evictions += 1
+            return None
+
+        # 更新 mtime 作为最近使用时间
+        os.utime(path)
+        self.hits += 1
+        return path
+
+    def put(self, key: str, source_path: str):
+        """保存处理结果到缓存"""
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            link_or_copy(Path(source_path), tmp_path)
+            os.replace(tmp_path, path)
+            self.stores += 1
+        except OSError as e:
+            logger.warning(f"写入结果缓存失败: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        # 限制淘汰频率，避免每次写入都扫描缓存目录
+        if time.time() - self._last_evict > settings.RESULT_CACHE_EVICT_INTERVAL:
+            self.evict()
+
+    def put_bytes(self, key: str, content: bytes):
+        """保存内存中的处理结果到缓存（同步处理时结果不落盘）"""
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, path)
+            self.stores += 1
+        except OSError as e:
+            logger.warning(f"写入结果缓存失败: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        if time.time() - self._last_evict > settings.RESULT_CACHE_EVICT_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，并按最近使用时间淘汰超出容量的条目"""
+        with self._lock:
+            self._last_evict = time.time()
+            now = time.time()
+            entries = []
+            for path in self.cache_dir.glob("*.png"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.ttl:
+                    path.unlink(missing_ok=True)
+                    self.evictions += 1
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        """返回缓存统计信息"""
+        entries = 0
+        total = 0
+        for path in self.cache_dir.glob("*.png"):
+            try:
+                total += path.stat().st_size
+                entries += 1
+            except FileNotFoundError:
+                continue
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": total,
+            "max_size_bytes": self.max_bytes,
+        }
@@ -0,0 +1,112 @@
+from typing import Optional, Tuple
+
+from PIL import Image, features
+
+from app.core.config import settings
+
+# 背景移除结果的输出格式 {格式: (文件扩展名, MIME 类型)}
+RESULT_FORMATS = {
+    "png": ("png", "image/png"),
+    "webp": ("webp", "image/webp"),
+    "avif": ("avif", "image/avif"),
+}
+
+# 配置为 auto 或客户端不接受配置的格式时，按体积从小到大依次尝试的格式
+NEGOTIATION_ORDER = ("avif", "webp", "png")
+
+def _encodable_formats() -> Tuple[str, ...]:
+    """
+    检测当前 Pillow 支持编码的输出格式（AVIF 需要 Pillow 11.2 以上且编译了 libavif）
+
+    通过 get_supported() 判断，旧版本 Pillow 不认识 avif 时 features.check 每次调用都会发出警告
+    """
+    supported = features.get_supported()
+    return tuple(name for name in RESULT_FORMATS if name == "png" or name in supported)
+
+# 导入时检测一次，每次协商格式时直接使用
+_AVAILABLE_FORMATS = _encodable_formats()
+
+def available_formats() -> Tuple[str, ...]:
+    """当前 Pillow 支持编码的输出格式"""
+    return _AVAILABLE_FORMATS
+
+def result_extension(output_format: Optional[str]) -> str:
+    """结果图片的文件扩展名"""
+    return RESULT_FORMATS.get(output_format or "png", RESULT_FORMATS["png"])[0]
+
+def media_type_for(path: str) -> str:
+    """根据结果图片的扩展名返回 MIME 类型"""
+    extension = str(path).rsplit(".", 1)[-1].lower()
+    for file_extension, media_type in RESULT_FORMATS.values():
+        if file_extension == extension:
+            return media_type
+    return "image/png"
+
+def _parse_accept(accept: str) -> dict:
+    """解析 Accept 请求头，返回 {媒体类型: q 值}"""
+    accepted = {}
+    for item in accept.split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[media_type.lower()] = q
+    return accepted
+
+def negotiate_format(preferred: Optional[str], accept: Optional[str]) -> str:
+    """
+    根据配置的格式和请求的 Accept 头确定结果图片的格式
+
+    preferred 为 auto 时，选择客户端明确列出（不含通配符）且服务端支持的体积最小的格式，否则为 PNG；
+    preferred 为具体格式时，客户端接受（包括 image/* 和 */*）且服务端支持则直接使用，
+    否则按 auto 的规则选择。没有 Accept 头时视为接受任意格式。
+    """
+    preferred = preferred or "png"
+    supported = available_formats()
+    accepted = _parse_accept(accept) if accept else None
+
+    if preferred != "auto" and preferred in supported:
+        if accepted is None:
+            return preferred
+        media_type = RESULT_FORMATS[preferred][1]
+        q = accepted.get(media_type, accepted.get("image/*", accepted.get("*/*", 0.0)))
+        if q > 0:
+            return preferred
+
+    if accepted:
+        for name in NEGOTIATION_ORDER:
+            if name in supported and accepted.get(RESULT_FORMATS[name][1], 0.0) > 0:
+                return name
+    return "png"
+
+def save_result(image: Image.Image, target, output_format: Optional[str] = "png",
+                quality: Optional[int] = None, png_compression: Optional[int] = None,
+                lossy_alpha: bool = False):
+    """
+    按输出格式编码背景移除结果，target 为文件路径或 BytesIO
+
+    quality 为 WebP/AVIF 的编码质量（为空时使用 RESULT_DEFAULT_QUALITY），WebP 为 100 时使用无损编码；
+    png_compression 为 PNG 的 zlib 压缩级别（0-9，为空时使用 RESULT_PNG_COMPRESSION）。
+    WebP 的透明通道默认无损编码，lossy_alpha 为 True 时与颜色使用相同的质量；
+    Pillow 不支持单独设置 AVIF 透明通道的质量，透明通道总是与颜色使用相同的质量（有损），不受 lossy_alpha 影响。
+    """
+    output_format = output_format or "png"
+    quality = settings.RESULT_DEFAULT_QUALITY if quality is None else quality
+    if output_format == "png":
+        compress_level = settings.RESULT_PNG_COMPRESSION if png_compression is None else png_compression
+        image.save(target, format="PNG", compress_level=compress_level)
+    elif output_format == "webp":
+        image.save(
+            target, format="WEBP", quality=quality, lossless=quality >= 100,
+            alpha_quality=quality if lossy_alpha else 100, method=settings.RESULT_WEBP_METHOD
+        )
+    elif output_format == "avif":
+        image.save(target, format="AVIF", quality=quality, speed=settings.RESULT_AVIF_SPEED)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
@@ -0,0 +1,119 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from rembg import new_session
+
+from app.core.config import settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# 无法确定模型文件大小时使用的估算值（u2net 模型约 170MB）
+DEFAULT_MODEL_SIZE_MB = 180
+
+
+def _model_file_size(model: str) -> int:
+    """
+    估算模型占用的内存（字节）
+
+    rembg 将模型下载到 U2NET_HOME（默认 ~/.u2net）目录下，
+    ONNX 会话占用的内存与模型文件大小基本成正比，因此这里以文件大小作为估算值。
+    """
+    u2net_home = os.path.expanduser(
+        os.getenv("U2NET_HOME", os.path.join(os.getenv("XDG_DATA_HOME", "~"), ".u2net"))
+    )
+    model_path = os.path.join(u2net_home, f"{model}.onnx")
+    try:
+        return os.path.getsize(model_path)
+    except OSError:
+        return DEFAULT_MODEL_SIZE_MB * 1024 * 1024
+
+
+class SessionPool:
+    """
+    rembg 模型会话池
+
+    每个模型只加载一次并常驻内存，后续任务直接复用已预热的会话；
+    当已加载模型的估算内存超过预算时，按最近最少使用（LRU）顺序淘汰。
+    """
+
+    def __init__(self, memory_budget_mb: int = 1024):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._sessions: "OrderedDict[str, object]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def get(self, model: str):
+        """获取指定模型的会话，不存在时加载"""
+        with self._lock:
+            session = self._sessions.get(model)
+            if session is not None:
+                self._sessions.move_to_end(model)
+                self.hits += 1
+                metrics.SESSION_REQUESTS.labels(model, "hit").inc()
+                return session
+
+            logger.info(f"正在加载模型会话: {model}")
+            session = new_session(model)
+            self._sessions[model] = session
+            self._sizes[model] = _model_file_size(model)
+            self.loads += 1
+            metrics.SESSION_REQUESTS.labels(model, "load").inc()
+            self._evict()
+            return session
+
+    def is_loaded(self, model: str) -> bool:
+        """模型会话是否已加载（不加锁，避免在其他模型加载期间阻塞调用方）"""
+        return model in self._sessions
+
+    def _evict(self):
+        """淘汰最近最少使用的模型，直到内存占用回到预算以内（至少保留刚使用的模型）"""
+        while self.memory_usage() > self.memory_budget and len(self._sessions) > 1:
+            model = next(iter(self._sessions))
+            del self._sessions[model]
+            del self._sizes[model]
+            self.evictions += 1
+            metrics.SESSION_EVICTIONS.labels(model).inc()
+            logger.info(f"淘汰模型会话: {model}")
+
+    def memory_usage(self) -> int:
+        """当前已加载模型的估算内存（字节）"""
+        return sum(self._sizes.values())
+
+    def clear(self):
+        """释放所有会话"""
+        with self._lock:
+            self._sessions.clear()
+            self._sizes.clear()
+
+    def stats(self) -> Dict:
+        """返回会话池统计信息"""
+        with self._lock:
+            return {
+                "models": list(self._sessions.keys()),
+                "memory_usage": self.memory_usage(),
+                "memory_budget": self.memory_budget,
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+            }
+
+
+# 进程级默认会话池，未显式传入会话时使用
+_default_pool: Optional[SessionPool] = None
+
+
+def get_session_pool() -> SessionPool:
+    """获取当前进程的默认会话池"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = SessionPool(memory_budget_mb=settings.MODEL_SESSION_MEMORY_MB)
+    return _default_pool
@@ -0,0 +1,249 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.task_queue import (
+    QueueBackend, expire_lease, lane_order, remove_file, retention_start, task_lane, task_user
+)
+
+class SQLiteQueueBackend(QueueBackend):
+    """
+    基于 SQLite 的队列后端
+
+    使用 WAL 模式，任务保存在带 (status, lane, user_id, created_at) 索引的表中，
+    领取任务只需几次索引查询加一次条件更新，不再需要遍历目录。
+    task_served 表记录每个通道中各用户上次被领取任务的时间，用于在用户之间轮转。
+    lease_expires_at 为处理中任务的租约到期时间，available_at 为重试任务最早可以被领取的时间。
+    completed_at 列为开始计算保留时间的时间（见 retention_start），批量任务结束前其中的图片为 NULL，不会被清理。
+    多个进程可以共享同一个数据库文件。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str = "data/tasks.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 连接不能跨线程共享，每个线程使用自己的连接
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None 表示自动提交，事务由代码显式控制
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        """创建任务表和索引"""
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                completed_at TEXT,
+                data TEXT NOT NULL,
+                lane TEXT NOT NULL DEFAULT 'interactive',
+                user_id TEXT NOT NULL DEFAULT '',
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_expires_at REAL
+            )
+        """)
+        # 旧版本的任务表缺少的列
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column, definition in (
+            ("lane", "TEXT NOT NULL DEFAULT 'interactive'"),
+            ("user_id", "TEXT NOT NULL DEFAULT ''"),
+            ("available_at", "REAL NOT NULL DEFAULT 0"),
+            ("lease_expires_at", "REAL"),
+        ):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks (status, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_completed ON tasks (status, completed_at)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_lane_user ON tasks (status, lane, user_id, created_at)"
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS task_served (
+                lane TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                last_served REAL NOT NULL,
+                PRIMARY KEY (lane, user_id)
+            )
+        """)
+
+    def add(self, task_data: Dict):
+        """保存任务"""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO tasks (id, status, created_at, completed_at, data, lane, user_id, available_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                task_data['id'],
+                task_data.get('status', 'pending'),
+                task_data['created_at'],
+                retention_start(task_data),
+                json.dumps(task_data),
+                task_lane(task_data),
+                task_user(task_data),
+                task_data.get('available_at', 0),
+            )
+        )
+
+    def _next_pending(self, conn: sqlite3.Connection, now: float):
+        """按通道顺序找到最久没有被服务的用户，返回该用户最早的可领取任务 (id, data, 通道, 用户)"""
+        for lane in lane_order():
+            row = conn.execute("""
+                SELECT p.user_id FROM (
+                    SELECT DISTINCT user_id FROM tasks
+                    WHERE status = 'pending' AND lane = ? AND available_at <= ?
+                ) AS p
+                LEFT JOIN task_served AS s ON s.lane = ? AND s.user_id = p.user_id
+                ORDER BY COALESCE(s.last_served, 0)
+                LIMIT 1
+            """, (lane, now, lane)).fetchone()
+            if row is None:
+                continue
+            user_id = row[0]
+            task_id, data = conn.execute(
+                "SELECT id, data FROM tasks WHERE status = 'pending' AND lane = ? AND user_id = ? "
+                "AND available_at <= ? ORDER BY created_at LIMIT 1",
+                (lane, user_id, now)
+            ).fetchone()
+            return task_id, data, lane, user_id
+        return None
+
+    def claim_next(self) -> Optional[Dict]:
+        """领取下一个待处理任务（通道优先级和用户轮转见 QueueBackend）"""
+        conn = self._connect()
+        # BEGIN IMMEDIATE 获取写锁，保证同一任务只会被一个进程领取
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = self._next_pending(conn, now)
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            task_id, data, lane, user_id = row
+            task_data = json.loads(data)
+            task_data['status'] = 'processing'
+            conn.execute(
+                "UPDATE tasks SET status = 'processing', data = ?, lease_expires_at = ? WHERE id = ?",
+                (json.dumps(task_data), now + settings.TASK_LEASE_SECONDS, task_id)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO task_served (lane, user_id, last_served) VALUES (?, ?, ?)",
+                (lane, user_id, time.time())
+            )
+            conn.execute("COMMIT")
+            return task_data
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def complete(self, task_id: str, result_path: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """完成任务并保存结果（条件更新，租约过期已被回收的任务不会被修改）"""
+        task_data = self.get(task_id)
+        if not task_data or task_data['status'] != 'processing':
+            return False
+
+        task_data['status'] = 'completed' if not error else 'failed'
+        task_data['completed_at'] = datetime.now().isoformat()
+        if result_path:
+            task_data['result_path'] = result_path
+        if error:
+            task_data['error'] = error
+
+        cursor = self._connect().execute(
+            "UPDATE tasks SET status = ?, completed_at = ?, data = ? WHERE id = ? AND status = 'processing'",
+            (task_data['status'], retention_start(task_data), json.dumps(task_data), task_id)
+        )
+        return cursor.rowcount > 0
+
+    def renew(self, task_id: str) -> bool:
+        """延长处理中任务的租约"""
+        cursor = self._connect().execute(
+            "UPDATE tasks SET lease_expires_at = ? WHERE id = ? AND status = 'processing'",
+            (time.time() + settings.TASK_LEASE_SECONDS, task_id)
+        )
+        return cursor.rowcount > 0
+
+    def expire_leases(self) -> List[Tuple[str, str]]:
+        """回收租约过期的处理中任务（旧版本领取的任务没有租约，同样视为过期）"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, data FROM tasks WHERE status = 'processing' AND COALESCE(lease_expires_at, 0) < ?",
+                (now,)
+            ).fetchall()
+            expired = []
+            for task_id, data in rows:
+                task_data = expire_lease(json.loads(data), now)
+                conn.execute(
+                    "UPDATE tasks SET status = ?, completed_at = ?, data = ?, available_at = ?, "
+                    "lease_expires_at = NULL WHERE id = ?",
+                    (
+                        task_data['status'],
+                        retention_start(task_data),
+                        json.dumps(task_data),
+                        task_data.get('available_at', 0),
+                        task_id,
+                    )
+                )
+                expired.append((task_id, task_data['status']))
+            conn.execute("COMMIT")
+            return expired
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        """获取任务状态"""
+        row = self._connect().execute("SELECT status, data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        status, data = row
+        task_data = json.loads(data)
+        task_data['status'] = status
+        return task_data
+
+    def depth(self) -> Dict[str, int]:
+        """按状态统计待处理和处理中的任务数（使用状态索引）"""
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) FROM tasks WHERE status IN ('pending', 'processing') GROUP BY status"
+        ).fetchall()
+        depth = {'pending': 0, 'processing': 0}
+        depth.update(dict(rows))
+        return depth
+
+    def cleanup_expired(self, max_age: timedelta) -> int:
+        """清理过期的结果及其图片文件（通过 (status, completed_at) 索引查找过期任务）"""
+        conn = self._connect()
+        freed = 0
+        cutoff = (datetime.now() - max_age).isoformat()
+        rows = conn.execute(
+            "SELECT id, data FROM tasks WHERE status IN ('completed', 'failed', 'dead') AND completed_at < ?",
+            (cutoff,)
+        ).fetchall()
+        for task_id, data in rows:
+            try:
+                result_path = json.loads(data).get('result_path')
+            except ValueError:
+                result_path = None
+            if result_path:
+                freed += remove_file(Path(result_path))
+            conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        return freed
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from typing import Dict, Optional, Set
+
+class TaskEventBroker:
+    """
+    任务状态变更广播
+
+    工作进程通过 multiprocessing.Queue 发送 (task_id, status) 事件，
+    API 进程中的后台线程读取后分发给订阅了该任务的 SSE 连接，
+    使状态变化能够立即推送给客户端而不需要客户端轮询。
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._source = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, source, loop: asyncio.AbstractEventLoop):
+        """开始从工作进程的事件队列读取事件"""
+        self._source = source
+        self._loop = loop
+        self._thread = threading.Thread(target=self._run, name="task-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止读取线程"""
+        if self._source is not None and self._thread is not None:
+            self._source.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            try:
+                event = self._source.get()
+            except (EOFError, OSError):
+                break
+            if event is None:
+                break
+            task_id, status = event
+            if task_id in self._subscribers:
+                self._loop.call_soon_threadsafe(self._publish, task_id, status)
+
+    def _publish(self, task_id: str, status: str):
+        """在事件循环线程中分发事件"""
+        for queue in self._subscribers.get(task_id, ()):
+            queue.put_nowait(status)
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        """订阅任务的状态变更"""
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        """取消订阅"""
+        subscribers = self._subscribers.get(task_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[task_id]
+
+# API 进程内的全局事件广播实例
+task_events = TaskEventBroker()
@@ -1,137 +1,719 @@
 import os
+import sys
 import json
 import time
 import uuid
-import shutil
+import random
+import hashlib
+from abc import ABC, abstractmethod
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# 任务通道，按优先级从高到低排列：interactive 为单张图片的网页上传，bulk 为批量提交
+TASK_LANES = ("interactive", "bulk")
+DEFAULT_LANE = "interactive"
+
+# 任务的结束状态
+TERMINAL_STATUSES = ('completed', 'failed', 'dead')
+
+def task_lane(task_data: Dict) -> str:
+    """任务所属的通道（旧版本创建的任务没有通道字段，按交互通道处理）"""
+    return task_data.get('lane') or DEFAULT_LANE
+
+def task_user(task_data: Dict) -> str:
+    """任务所属的用户，用于在用户之间轮转调度"""
+    return str(task_data.get('params', {}).get('user_id') or "")
+
+def expire_lease(task_data: Dict, now: float) -> Dict:
+    """
+    处理租约过期（工作进程崩溃或卡死）的任务
+
+    执行次数未达到 TASK_MAX_ATTEMPTS 时放回待处理状态，available_at 之后才能再次领取（指数退避）；
+    否则转入死信状态 dead，不再自动重试。
+    """
+    attempts = task_data.get('attempts', 0) + 1
+    task_data['attempts'] = attempts
+    if attempts >= settings.TASK_MAX_ATTEMPTS:
+        task_data['status'] = 'dead'
+        task_data['completed_at'] = datetime.now().isoformat()
+        task_data['error'] = f"Task lease expired {attempts} times, worker may have crashed"
+    else:
+        task_data['status'] = 'pending'
+        task_data['available_at'] = now + settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return task_data
+
+def retention_start(task_data: Dict) -> Optional[str]:
+    """
+    已结束任务开始计算保留时间的时间（ISO 格式），未结束的任务返回 None
+
+    通常为任务的结束时间；批量任务中的图片在整个批量任务结束前不过期（返回 None），
+    finish_batch 记录 batch_finished_at 后从批量任务结束时开始计算，
+    避免长时间运行的批量任务中先结束的图片在批量任务结束前被清理。
+    """
+    if task_data.get('status') not in TERMINAL_STATUSES:
+        return None
+    if task_data.get('params', {}).get('job_id'):
+        return task_data.get('batch_finished_at')
+    return task_data.get('completed_at') or task_data.get('created_at')
+
+def remove_file(path: Path) -> int:
+    """删除文件，返回实际释放的字节数（文件不存在或还有其他硬链接时为 0）"""
+    try:
+        stat = path.stat()
+        path.unlink()
+    except FileNotFoundError:
+        return 0
+    return stat.st_size if stat.st_nlink <= 1 else 0
+
+def lane_order() -> Tuple[str, ...]:
+    """
+    本次领取任务时检查各通道的顺序
+
+    交互通道优先；以 TASK_QUEUE_BULK_SHARE 的概率先检查批量通道，
+    保证交互任务持续到达时批量任务仍能获得一定比例的处理能力。
+    """
+    if random.random() < settings.TASK_QUEUE_BULK_SHARE:
+        return tuple(reversed(TASK_LANES))
+    return TASK_LANES
+
+class QueueBackend(ABC):
+    """
+    任务队列存储后端接口
+
+    任务以字典形式保存，至少包含 id、type、params、status、created_at 字段，
+    status 取值为 pending / processing / completed / failed / dead（死信），lane 为任务通道；
+    批量任务的汇总记录在所有图片结束前为 running，不会被领取，也不会过期。
+    available_at 为重试任务最早可以被领取的时间（时间戳）。
+
+    领取的任务持有 TASK_LEASE_SECONDS 秒的租约，工作进程处理期间通过 renew 续约；
+    expire_leases 将租约过期的任务按 expire_lease 放回队列或转入死信状态。
+
+    领取顺序：按 lane_order() 依次检查各通道，通道内在有待处理任务的用户之间轮转
+    （优先领取最久没有被服务的用户的任务），同一用户的任务按入队时间先进先出，
+    避免一个用户的大批量任务阻塞其他用户。
+
+    子类必须实现所有抽象方法，缺少任何一个时创建实例即报错。
+    """
+
+    name = "base"
+    # 后端是否支持阻塞式领取（有任务入队时立即返回）
+    supports_blocking = False
+
+    @abstractmethod
+    def add(self, task_data: Dict):
+        """保存任务（按 task_data['status'] 放入对应状态）"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_next(self) -> Optional[Dict]:
+        """原子地领取最早的待处理任务并标记为处理中"""
+        raise NotImplementedError
+
+    def claim_next_blocking(self, timeout: float) -> Optional[Dict]:
+        """阻塞等待并领取下一个任务，超时返回 None（仅 supports_blocking 为 True 的后端实现）"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, task_id: str, result_path: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """将处理中的任务标记为完成或失败；任务已不在处理中（租约过期已被回收）时不做修改并返回 False"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def renew(self, task_id: str) -> bool:
+        """续约处理中的任务，任务已不在处理中（例如租约过期已被回收）时返回 False"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire_leases(self) -> List[Tuple[str, str]]:
+        """回收租约过期的任务，返回 (任务ID, 新状态) 列表"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict]:
+        """获取任务数据"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def cleanup_expired(self, max_age: timedelta) -> int:
+        """清理结束时间（completed_at）超过 max_age 的已结束任务及其结果图片，返回释放的字节数"""
+        raise NotImplementedError
+
+    def get_input_bytes(self, task_id: str) -> Optional[bytes]:
+        """获取后端中保存的上传图片内容，后端不保存图片时返回 None"""
+        return None
+
+    def get_result_bytes(self, task_id: str) -> Optional[bytes]:
+        """获取后端中保存的结果图片内容，后端不保存图片时返回 None"""
+        return None
+
+    @abstractmethod
+    def depth(self) -> Dict[str, int]:
+        """待处理和处理中的任务数量 {"pending": n, "processing": n}"""
+        raise NotImplementedError
+
+class FileQueueBackend(QueueBackend):
+    """
+    基于文件系统的队列后端
+
+    每个任务一个 JSON 文件，按所在目录区分状态：
+    queue_dir/{通道}/{用户}（待处理）、queue_dir/processing（处理中）、result_dir（已完成）。
+    每个用户目录中的 .served 文件的修改时间记录该用户上次被领取任务的时间。
+    待处理文件的修改时间为最早可领取时间（重试任务设置为未来的时间）；
+    处理中文件的修改时间为上次续约的时间，超过 TASK_LEASE_SECONDS 未续约即视为租约过期。
+    """
+
+    name = "file"
+    # 用户目录中记录上次领取时间的文件
+    SERVED_MARKER = ".served"
 
-class TaskQueue:
     def __init__(self, queue_dir: str = "data/queue", result_dir: str = "data/results"):
         self.queue_dir = Path(queue_dir)
         self.result_dir = Path(result_dir)
         self.processing_dir = self.queue_dir / "processing"
-        
+
         # 创建必要的目录
         self.queue_dir.mkdir(parents=True, exist_ok=True)
         self.result_dir.mkdir(parents=True, exist_ok=True)
         self.processing_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 清理过期的结果
-        self._cleanup_expired_results()
-    
-    def _cleanup_expired_results(self):
-        """清理过期的结果文件"""
-        now = datetime.now()
-        for result_file in self.result_dir.glob("*.json"):
-            try:
-                with open(result_file, 'r') as f:
-                    data = json.load(f)
-                    created_at = datetime.fromisoformat(data['created_at'])
-                    if now - created_at > timedelta(hours=1):
-                        # 删除结果文件和相关的图片文件
-                        result_file.unlink()
-                        if 'result_path' in data:
-                            result_image = Path(data['result_path'])
-                            if result_image.exists():
-                                result_image.unlink()
-            except Exception:
-                # 如果文件损坏，直接删除
-                result_file.unlink()
-    
-    def add_task(self, task_type: str, params: Dict) -> str:
-        """添加新任务到队列"""
-        task_id = str(uuid.uuid4())
-        task_file = self.queue_dir / f"{task_id}.json"
-        
-        task_data = {
-            'id': task_id,
-            'type': task_type,
-            'params': params,
-            'status': 'pending',
-            'created_at': datetime.now().isoformat()
-        }
-        
-        with open(task_file, 'w') as f:
-            json.dump(task_data, f)
-        
-        return task_id
-    
-    def get_next_task(self) -> Optional[Tuple[str, Dict]]:
+
+    def cleanup_expired(self, max_age: timedelta) -> int:
+        """
+        清理过期的结果文件
+
+        结果文件的修改时间即任务结束的时间（批量任务中的图片在批量任务结束时重新写入），
+        以此作为过期索引，只读取已过期的文件来找到结果图片；
+        同时删除中断写入留下的临时文件，以及超过 max_age 没有任务的用户目录。
+        """
+        cutoff = time.time() - max_age.total_seconds()
+        freed = 0
+        with os.scandir(self.result_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith((".json", ".tmp")) or not entry.is_file():
+                    continue
+                try:
+                    if entry.stat().st_mtime >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+
+                result_file = Path(entry.path)
+                if result_file.suffix == ".json":
+                    try:
+                        with open(result_file, 'r') as f:
+                            task_data = json.load(f)
+                    except FileNotFoundError:
+                        continue
+                    except ValueError:
+                        # 文件损坏，直接删除
+                        task_data = {}
+                    if task_data and retention_start(task_data) is None:
+                        # 批量任务或其中的图片，批量任务尚未结束
+                        continue
+                    result_path = task_data.get('result_path')
+                    if result_path:
+                        freed += remove_file(Path(result_path))
+                freed += remove_file(result_file)
+
+        freed += self._prune_user_dirs(cutoff)
+        return freed
+
+    def _prune_user_dirs(self, cutoff: float) -> int:
+        """删除没有待处理任务、且在 cutoff 之后没有被领取过任务的用户目录"""
+        freed = 0
+        for lane in TASK_LANES:
+            lane_dir = self.queue_dir / lane
+            if not lane_dir.is_dir():
+                continue
+            for user_dir in lane_dir.iterdir():
+                if self._last_served(user_dir) >= cutoff or any(user_dir.glob("*.json")):
+                    continue
+                freed += remove_file(user_dir / self.SERVED_MARKER)
+                try:
+                    user_dir.rmdir()
+                except OSError:
+                    # 期间有新任务入队
+                    continue
+        return freed
+
+    def _user_dir(self, task_data: Dict) -> Path:
+        """待处理任务所在的用户目录（用户ID可能包含任意字符，目录名使用其哈希）"""
+        user_key = hashlib.sha1(task_user(task_data).encode('utf-8')).hexdigest()[:16]
+        return self.queue_dir / task_lane(task_data) / user_key
+
+    def add(self, task_data: Dict):
+        """保存任务文件"""
+        status = task_data.get('status', 'pending')
+        if status == 'processing':
+            task_file = self.processing_dir / f"{task_data['id']}.json"
+        elif status in TERMINAL_STATUSES or status == 'running':
+            task_file = self.result_dir / f"{task_data['id']}.json"
+        else:
+            user_dir = self._user_dir(task_data)
+            user_dir.mkdir(parents=True, exist_ok=True)
+            task_file = user_dir / f"{task_data['id']}.json"
+
+        try:
+            with open(task_file, 'w') as f:
+                json.dump(task_data, f)
+        except FileNotFoundError:
+            # 空的用户目录刚被清理任务删除，重新创建
+            task_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(task_file, 'w') as f:
+                json.dump(task_data, f)
+        if status == 'pending' and task_data.get('available_at'):
+            # 修改时间晚于当前时间的任务暂不领取
+            os.utime(task_file, (task_data['available_at'], task_data['available_at']))
+
+    def _last_served(self, user_dir: Path) -> float:
+        """用户上次被领取任务的时间，从未领取过时为 0"""
+        try:
+            return (user_dir / self.SERVED_MARKER).stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def claim_next(self) -> Optional[Dict]:
         """获取下一个待处理的任务"""
-        # 获取所有待处理的任务
-        pending_tasks = list(self.queue_dir.glob("*.json"))
+        # 旧版本直接保存在 queue_dir 下的任务优先处理
+        task_data = self._claim_oldest(self.queue_dir.glob("*.json"))
+        if task_data:
+            return task_data
+
+        for lane in lane_order():
+            lane_dir = self.queue_dir / lane
+            if not lane_dir.is_dir():
+                continue
+            # 从最久没有被服务的用户开始尝试
+            user_dirs = sorted(
+                (user_dir for user_dir in lane_dir.iterdir() if user_dir.is_dir()),
+                key=self._last_served
+            )
+            for user_dir in user_dirs:
+                task_data = self._claim_oldest(user_dir.glob("*.json"))
+                if task_data:
+                    (user_dir / self.SERVED_MARKER).touch()
+                    return task_data
+
+        return None
+
+    def _claim_oldest(self, task_files) -> Optional[Dict]:
+        """领取给定任务文件中最早入队的一个"""
+        # 获取所有可以领取的待处理任务
+        now = time.time()
+        pending_tasks = []
+        for task_file in task_files:
+            try:
+                mtime = task_file.stat().st_mtime
+            except FileNotFoundError:
+                # 已被其他工作进程领取
+                continue
+            if mtime <= now:
+                pending_tasks.append((mtime, task_file))
         if not pending_tasks:
             return None
-        
+
         # 按创建时间排序
-        pending_tasks.sort(key=lambda x: x.stat().st_mtime)
-        task_file = pending_tasks[0]
-        
-        try:
-            with open(task_file, 'r') as f:
-                task_data = json.load(f)
-            
-            # 移动任务到处理中目录
+        pending_tasks.sort(key=lambda x: x[0])
+
+        for _, task_file in pending_tasks:
+            # 通过原子重命名领取任务，重命名失败说明任务已被其他工作进程领取
             processing_file = self.processing_dir / task_file.name
-            shutil.move(str(task_file), str(processing_file))
-            
-            return task_data['id'], task_data
-        except Exception:
-            # 如果文件损坏，直接删除
-            task_file.unlink()
-            return None
-    
-    def complete_task(self, task_id: str, result_path: Optional[str] = None, error: Optional[str] = None):
-        """完成任务并保存结果"""
+            try:
+                os.rename(task_file, processing_file)
+                # 重命名保留了入队时间，更新修改时间作为租约的开始
+                os.utime(processing_file)
+            except FileNotFoundError:
+                continue
+
+            try:
+                with open(processing_file, 'r') as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                # 如果文件损坏，直接删除
+                processing_file.unlink(missing_ok=True)
+
+        return None
+
+    def complete(self, task_id: str, result_path: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """
+        完成任务并保存结果
+
+        先将处理中的文件重命名为 .completing，与 expire_leases 的重命名互斥，保证任务只会被完成或回收一次；
+        写入失败时保留 .completing 文件并抛出异常，expire_leases 在租约时长之后将其恢复为处理中并回收，任务不会丢失
+        """
         processing_file = self.processing_dir / f"{task_id}.json"
-        if not processing_file.exists():
-            return
-        
+        completing_file = processing_file.with_suffix(".completing")
         try:
-            with open(processing_file, 'r') as f:
-                task_data = json.load(f)
-            
-            # 更新任务状态
-            task_data['status'] = 'completed' if not error else 'failed'
-            task_data['completed_at'] = datetime.now().isoformat()
-            if result_path:
-                task_data['result_path'] = result_path
-            if error:
-                task_data['error'] = error
-            
-            # 保存结果
-            result_file = self.result_dir / f"{task_id}.json"
-            with open(result_file, 'w') as f:
-                json.dump(task_data, f)
-            
-            # 删除处理中的文件
-            processing_file.unlink()
-        except Exception:
-            # 如果出错，确保清理文件
-            processing_file.unlink()
-    
-    def get_task_status(self, task_id: str) -> Optional[Dict]:
+            os.rename(processing_file, completing_file)
+        except FileNotFoundError:
+            # 租约已过期，任务已被回收
+            return False
+        os.utime(completing_file)
+        with open(completing_file, 'r') as f:
+            task_data = json.load(f)
+
+        # 更新任务状态
+        task_data['status'] = 'completed' if not error else 'failed'
+        task_data['completed_at'] = datetime.now().isoformat()
+        if result_path:
+            task_data['result_path'] = result_path
+        if error:
+            task_data['error'] = error
+
+        # 先写临时文件再重命名，避免读到不完整的结果
+        result_file = self.result_dir / f"{task_id}.json"
+        tmp_file = result_file.with_suffix(".tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(task_data, f)
+        os.replace(tmp_file, result_file)
+
+        # 删除处理中的文件
+        completing_file.unlink(missing_ok=True)
+        return True
+
+    def renew(self, task_id: str) -> bool:
+        """更新处理中文件的修改时间"""
+        try:
+            os.utime(self.processing_dir / f"{task_id}.json")
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _recover_interrupted(self, cutoff: float):
+        """
+        恢复回收或完成过程中进程崩溃留下的中间文件
+
+        超过租约时长仍存在的 .expired / .completing 文件（重命名时已更新修改时间）恢复为处理中的文件，
+        由 expire_leases 按租约过期处理；结果已写入的 .completing 文件直接删除。
+        """
+        for pattern in ("*.expired", "*.completing"):
+            for stale_file in self.processing_dir.glob(pattern):
+                try:
+                    if stale_file.stat().st_mtime >= cutoff:
+                        continue
+                    if stale_file.suffix == ".completing" and (self.result_dir / f"{stale_file.stem}.json").exists():
+                        stale_file.unlink()
+                        continue
+                    os.rename(stale_file, stale_file.with_suffix(".json"))
+                except FileNotFoundError:
+                    continue
+
+    def expire_leases(self) -> List[Tuple[str, str]]:
+        """回收超过 TASK_LEASE_SECONDS 未续约的处理中任务"""
+        now = time.time()
+        cutoff = now - settings.TASK_LEASE_SECONDS
+        self._recover_interrupted(cutoff)
+        expired = []
+        for processing_file in self.processing_dir.glob("*.json"):
+            try:
+                if processing_file.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+
+            # 先重命名，保证同一任务只会被一个进程回收
+            expired_file = processing_file.with_suffix(".expired")
+            try:
+                os.rename(processing_file, expired_file)
+                # 更新修改时间，崩溃时由 _recover_interrupted 在租约时长之后恢复
+                os.utime(expired_file)
+                with open(expired_file, 'r') as f:
+                    task_data = json.load(f)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                expired_file.unlink(missing_ok=True)
+                continue
+
+            task_data = expire_lease(task_data, now)
+            self.add(task_data)
+            expired_file.unlink(missing_ok=True)
+            expired.append((task_data['id'], task_data['status']))
+        return expired
+
+    def get(self, task_id: str) -> Optional[Dict]:
         """获取任务状态"""
-        # 检查处理中的任务
-        processing_file = self.processing_dir / f"{task_id}.json"
-        if processing_file.exists():
-            with open(processing_file, 'r') as f:
-                task_data = json.load(f)
+        # 检查处理中的任务（包括正在完成或回收的任务）
+        for suffix in (".json", ".completing", ".expired"):
+            try:
+                with open(self.processing_dir / f"{task_id}{suffix}", 'r') as f:
+                    task_data = json.load(f)
+            except FileNotFoundError:
+                continue
             task_data['status'] = 'processing'
             return task_data
-        
+
         # 检查已完成的任务
         result_file = self.result_dir / f"{task_id}.json"
         if result_file.exists():
             with open(result_file, 'r') as f:
                 return json.load(f)
-        
+
         # 检查队列中的任务
-        queue_file = self.queue_dir / f"{task_id}.json"
-        if queue_file.exists():
+        for queue_file in self._pending_files(task_id):
             with open(queue_file, 'r') as f:
                 return json.load(f)
-        
-        return None 
\ No newline at end of file
+
+        return None
+
+    def _pending_files(self, task_id: str = "*"):
+        """待处理的任务文件（包括旧版本直接保存在 queue_dir 下的文件）"""
+        yield from self.queue_dir.glob(f"{task_id}.json")
+        for lane in TASK_LANES:
+            yield from (self.queue_dir / lane).glob(f"*/{task_id}.json")
+
+    def depth(self) -> Dict[str, int]:
+        """统计待处理和处理中目录中的任务文件数"""
+        return {
+            'pending': sum(1 for _ in self._pending_files()),
+            'processing': sum(1 for _ in self.processing_dir.glob("*.json")),
+        }
+
+    def iter_tasks(self):
+        """遍历所有任务文件，返回 (文件路径, 任务状态)"""
+        for task_file in self._pending_files():
+            yield task_file, 'pending'
+        for task_file in self.processing_dir.glob("*.json"):
+            yield task_file, 'processing'
+        for task_file in self.result_dir.glob("*.json"):
+            yield task_file, None
+
+def create_backend(name: Optional[str] = None, queue_dir: str = "data/queue",
+                   result_dir: str = "data/results") -> QueueBackend:
+    """根据名称创建队列后端，名称为空时使用配置中的 TASK_QUEUE_BACKEND"""
+    name = (name or settings.TASK_QUEUE_BACKEND).lower()
+    if name == "file":
+        return FileQueueBackend(queue_dir, result_dir)
+    if name == "sqlite":
+        from app.utils.sqlite_queue import SQLiteQueueBackend
+        return SQLiteQueueBackend(settings.TASK_QUEUE_SQLITE_PATH)
+    if name == "redis":
+        from app.utils.redis_queue import RedisQueueBackend
+        return RedisQueueBackend()
+    raise ValueError(f"Unknown task queue backend: {name}")
+
+class TaskQueue:
+    """
+    任务队列
+
+    负责生成任务数据并委托给具体的存储后端（文件、SQLite、Redis）保存和调度。
+    """
+
+    def __init__(self, queue_dir: str = "data/queue", result_dir: str = "data/results",
+                 backend: Optional[QueueBackend] = None):
+        self.backend = backend if backend is not None else create_backend(
+            queue_dir=queue_dir, result_dir=result_dir
+        )
+        # 任务入队通知（multiprocessing.Event），由工作进程池创建并在 API 进程和工作进程间共享
+        self.notifier = None
+
+    def add_task(self, task_type: str, params: Dict, lane: str = DEFAULT_LANE) -> str:
+        """
+        添加新任务到队列
+
+        lane 为任务通道（TASK_LANES）：交互通道的任务优先于批量通道领取，
+        params 中的 user_id 用于在同一通道的用户之间轮转调度。
+        """
+        if lane not in TASK_LANES:
+            raise ValueError(f"Unknown task lane: {lane}")
+        task_id = str(uuid.uuid4())
+
+        task_data = {
+            'id': task_id,
+            'type': task_type,
+            'params': params,
+            'lane': lane,
+            'status': 'pending',
+            'created_at': datetime.now().isoformat()
+        }
+        self.backend.add(task_data)
+
+        # 唤醒等待中的工作进程
+        if self.notifier is not None:
+            self.notifier.set()
+
+        return task_id
+
+    def add_completed_task(self, task_type: str, params: Dict, result_path: Optional[str] = None,
+                           task_id: Optional[str] = None) -> str:
+        """添加一个已完成的任务（例如结果来自缓存时、批量任务的汇总记录），不经过工作进程"""
+        task_id = task_id or str(uuid.uuid4())
+        now = datetime.now().isoformat()
+
+        task_data = {
+            'id': task_id,
+            'type': task_type,
+            'params': params,
+            'status': 'completed',
+            'created_at': now,
+            'completed_at': now
+        }
+        if result_path:
+            task_data['result_path'] = result_path
+        self.backend.add(task_data)
+
+        return task_id
+
+    def add_batch_task(self, params: Dict, task_id: Optional[str] = None) -> str:
+        """
+        添加批量任务的汇总记录（不经过工作进程）
+
+        记录为 running 状态，所有图片结束后由 finish_batch 标记为完成，之后才开始计算保留时间。
+        """
+        task_id = task_id or str(uuid.uuid4())
+        self.backend.add({
+            'id': task_id,
+            'type': 'background_batch',
+            'params': params,
+            'status': 'running',
+            'created_at': datetime.now().isoformat()
+        })
+        return task_id
+
+    def finish_batch(self, job_id: str) -> bool:
+        """
+        批量任务的所有图片都已结束时，将汇总记录标记为完成，返回是否完成
+
+        每张图片结束后调用。图片的结束状态先写入再检查，因此最后结束的图片总能看到全部结束；
+        从后往前检查（后提交的图片通常后处理），未结束时尽早返回。
+        批量任务结束前图片不会过期（见 retention_start），结束时为各图片登记保留时间。
+        """
+        job = self.backend.get(job_id)
+        if not job or job.get('status') != 'running':
+            return False
+        for item in reversed(job['params'].get('items', [])):
+            task_data = self.backend.get(item['task_id']) if item.get('task_id') else None
+            if task_data and task_data['status'] not in TERMINAL_STATUSES:
+                return False
+
+        job['status'] = 'completed'
+        job['completed_at'] = datetime.now().isoformat()
+        self.backend.add(job)
+
+        # 各图片从批量任务结束时开始计算保留时间（重新保存以登记过期时间）
+        for item in job['params'].get('items', []):
+            task_data = self.backend.get(item['task_id']) if item.get('task_id') else None
+            if task_data and task_data['status'] in TERMINAL_STATUSES:
+                task_data['batch_finished_at'] = job['completed_at']
+                self.backend.add(task_data)
+        return True
+
+    def attach_notifier(self, notifier):
+        """设置任务入队通知事件"""
+        self.notifier = notifier
+
+    def get_next_task(self) -> Optional[Tuple[str, Dict]]:
+        """获取下一个待处理的任务"""
+        task_data = self.backend.claim_next()
+        if not task_data:
+            return None
+        return task_data['id'], task_data
+
+    def wait_for_task(self, timeout: float) -> Optional[Tuple[str, Dict]]:
+        """
+        等待并领取下一个任务
+
+        支持阻塞领取的后端（Redis）直接阻塞等待；其他后端在有通知事件时等待事件，
+        有任务入队时立即唤醒，超时后再检查一次，作为轮询兜底。
+        """
+        if self.backend.supports_blocking:
+            task_data = self.backend.claim_next_blocking(timeout)
+            if not task_data:
+                return None
+            return task_data['id'], task_data
+
+        # 先清除事件再检查队列，避免错过检查之后才到达的通知
+        if self.notifier is not None:
+            self.notifier.clear()
+        task = self.get_next_task()
+        if task:
+            return task
+
+        if self.notifier is not None:
+            self.notifier.wait(timeout)
+        else:
+            time.sleep(timeout)
+        return self.get_next_task()
+
+    def complete_task(self, task_id: str, result_path: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """完成任务并保存结果，任务的租约已过期（已被回收）时返回 False"""
+        return self.backend.complete(task_id, result_path=result_path, error=error)
+
+    def renew_lease(self, task_id: str) -> bool:
+        """续约处理中的任务，返回 False 表示租约已过期、任务已被回收"""
+        return self.backend.renew(task_id)
+
+    def expire_leases(self) -> List[Tuple[str, str]]:
+        """回收租约过期的任务（重新排队或转入死信状态），返回 (任务ID, 新状态) 列表"""
+        return self.backend.expire_leases()
+
+    def get_task_status(self, task_id: str) -> Optional[Dict]:
+        """获取任务状态"""
+        return self.backend.get(task_id)
+
+    def cleanup_expired(self) -> int:
+        """清理结束超过 TASK_RESULT_TTL 的任务及其结果图片，返回释放的字节数（由清理任务定期调用）"""
+        return self.backend.cleanup_expired(timedelta(seconds=settings.TASK_RESULT_TTL))
+
+    def get_input_bytes(self, task_id: str) -> Optional[bytes]:
+        """获取后端中保存的上传图片（上传文件不在本机磁盘上时使用）"""
+        return self.backend.get_input_bytes(task_id)
+
+    def get_result_bytes(self, task_id: str) -> Optional[bytes]:
+        """获取后端中保存的结果图片（结果文件不在本机磁盘上时使用）"""
+        return self.backend.get_result_bytes(task_id)
+
+    def queue_depth(self) -> Dict[str, int]:
+        """待处理和处理中的任务数量"""
+        return self.backend.depth()
+
+def migrate_file_tasks(target: QueueBackend, queue_dir: str = "data/queue",
+                       result_dir: str = "data/results") -> int:
+    """
+    将文件队列中的任务迁移到其他后端
+
+    待处理和处理中的任务以待处理状态导入（处理中的任务会被重新执行），
+    已完成和失败的任务按原状态导入，迁移成功的文件会被删除。
+
+    返回:
+        int: 迁移的任务数量
+    """
+    source = FileQueueBackend(queue_dir, result_dir)
+    migrated = 0
+    for task_file, status in list(source.iter_tasks()):
+        try:
+            with open(task_file, 'r') as f:
+                task_data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if 'id' not in task_data or 'type' not in task_data:
+            # 不是任务文件
+            continue
+
+        task_data['status'] = status or task_data.get('status', 'completed')
+        if status == 'processing':
+            task_data['status'] = 'pending'
+        task_data.setdefault('created_at', datetime.now().isoformat())
+
+        target.add(task_data)
+        task_file.unlink(missing_ok=True)
+        migrated += 1
+    return migrated
+
+if __name__ == "__main__":
+    # 用法: python -m app.utils.task_queue migrate [backend]
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("用法: python -m app.utils.task_queue migrate [backend]")
+        sys.exit(1)
+
+    backend_name = sys.argv[2] if len(sys.argv) > 2 else settings.TASK_QUEUE_BACKEND
+    if backend_name == "file":
+        print("目标后端不能是文件队列")
+        sys.exit(1)
+
+    count = migrate_file_tasks(create_backend(backend_name))
+    print(f"已迁移 {count} 个任务到 {backend_name} 后端")
@@ -0,0 +1,166 @@
+import uuid
+import hashlib
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+# 每次从上传流读取的字节数
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# ZIP 文件头
+ZIP_MAGIC = b"PK\x03\x04"
+
+class UploadTooLarge(Exception):
+    """上传文件超过大小限制"""
+
+class UnsupportedImageType(Exception):
+    """上传文件不是允许的图片格式"""
+
+@dataclass
+class SavedUpload:
+    """已保存到磁盘的上传文件"""
+    path: Path
+    size: int
+    sha256: str
+    image_type: str
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """根据文件头判断图片的真实格式，无法识别时返回 None"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+class _UploadWriter:
+    """分块写入文件，同时计算 SHA-256 并检查大小限制"""
+
+    def __init__(self, upload_dir: Path, max_size: int, file_type: Optional[str], allowed_types=None):
+        allowed_types = settings.ALLOWED_EXTENSIONS if allowed_types is None else allowed_types
+        if file_type is None or file_type not in allowed_types:
+            raise UnsupportedImageType()
+
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        extension = "jpg" if file_type == "jpeg" else file_type
+        self.path = upload_dir / f"{uuid.uuid4().hex}.{extension}"
+        self.file_type = file_type
+        self.max_size = max_size
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadTooLarge()
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def finish(self) -> SavedUpload:
+        self._file.close()
+        return SavedUpload(path=self.path, size=self.size, sha256=self._digest.hexdigest(),
+                           image_type=self.file_type)
+
+    def abort(self):
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+async def save_upload(file: UploadFile, upload_dir: Path, max_size: Optional[int] = None,
+                      zip_max_size: Optional[int] = None) -> SavedUpload:
+    """
+    将上传文件分块写入磁盘
+
+    使用随机文件名（不使用客户端提供的文件名，避免并发请求之间相互覆盖），
+    边写入边计算 SHA-256，超过大小限制或文件头不是允许的图片格式时删除已写入的部分并抛出异常，
+    因此每个请求占用的内存只有一个分块大小。指定 zip_max_size 时也接受不超过该大小的 ZIP 文件（image_type 为 "zip"）。
+
+    异常:
+        UploadTooLarge: 文件超过 max_size
+        UnsupportedImageType: 文件头不是允许的图片格式
+    """
+    max_size = max_size or settings.MAX_UPLOAD_SIZE
+
+    first_chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    file_type = sniff_image_type(first_chunk)
+    allowed_types = set(settings.ALLOWED_EXTENSIONS)
+    if file_type is None and zip_max_size and first_chunk.startswith(ZIP_MAGIC):
+        file_type = "zip"
+        allowed_types.add("zip")
+        max_size = zip_max_size
+
+    writer = _UploadWriter(upload_dir, max_size, file_type, allowed_types)
+    try:
+        chunk = first_chunk
+        while chunk:
+            writer.write(chunk)
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish()
+
+def extract_zip_images(zip_path: Path, upload_dir: Path, max_files: int,
+                       max_size: Optional[int] = None) -> List[Tuple[str, Union[SavedUpload, Exception]]]:
+    """
+    将 ZIP 中的图片逐个分块解压到上传目录（同步函数，应在线程池中调用）
+
+    跳过目录和 macOS 的元数据文件。每个文件按实际解压出的字节数检查大小限制（不信任 ZIP 头中记录的大小），
+    不是允许的图片格式或超过大小的文件以异常对象返回，不影响其他文件。
+
+    返回:
+        (ZIP 内文件名, SavedUpload 或异常) 列表
+
+    异常:
+        UploadTooLarge: 图片数量超过 max_files
+        zipfile.BadZipFile: 不是有效的 ZIP 文件
+    """
+    max_size = max_size or settings.MAX_UPLOAD_SIZE
+    items = []
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+            and not Path(info.filename).name.startswith(".")
+        ]
+        if len(members) > max_files:
+            raise UploadTooLarge()
+
+        try:
+            for info in members:
+                items.append((info.filename, _extract_member(archive, info, upload_dir, max_size)))
+        except BaseException:
+            # ZIP 损坏等错误时删除已解压的文件
+            for _, item in items:
+                if isinstance(item, SavedUpload):
+                    item.path.unlink(missing_ok=True)
+            raise
+    return items
+
+def _extract_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, upload_dir: Path,
+                    max_size: int) -> Union[SavedUpload, Exception]:
+    """解压 ZIP 中的一个文件，不是图片或超过大小限制时返回异常对象"""
+    with archive.open(info) as member:
+        first_chunk = member.read(UPLOAD_CHUNK_SIZE)
+        try:
+            writer = _UploadWriter(upload_dir, max_size, sniff_image_type(first_chunk))
+        except UnsupportedImageType as e:
+            return e
+        try:
+            chunk = first_chunk
+            while chunk:
+                writer.write(chunk)
+                chunk = member.read(UPLOAD_CHUNK_SIZE)
+        except UploadTooLarge as e:
+            writer.abort()
+            return e
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.finish()
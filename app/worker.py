@@ -1,8 +1,10 @@
 import os
 import time
+import signal
+import threading
 import multiprocessing
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 from sqlalchemy.orm import Session
 
 # 设置环境变量以解决OpenMP线程冲突问题
@@ -18,103 +20,462 @@ except RuntimeError:
     pass
 
 from app.utils.task_queue import TaskQueue
-from app.utils.image_utils import change_background
+from app.utils.image_utils import change_background, change_background_batch, change_background_options
+from app.utils.session_pool import SessionPool
+from app.utils.batch_inference import check_batching
+from app.utils.result_cache import ResultCache
+from app.utils.result_encoding import result_extension
+from app.utils.matting import shutdown_tile_pool
+from app.utils import metrics
 from app.core.config import settings
 from app.database import SessionLocal
 from app.models.config import BackgroundRemovalConfig
 
 class Worker:
-    def __init__(self):
+    def __init__(self, stop_event=None, name: str = "worker", task_event=None, events=None):
+        self.name = name
+        # 任务状态变更事件队列，API 进程据此向客户端推送状态
+        self.events = events
+        # 由工作进程池传入的停止事件，置位后处理完当前任务即退出
+        self.stop_event = stop_event
         self.task_queue = TaskQueue()
+        # API 进程添加任务时置位的通知事件，空闲时立即唤醒而不是等待轮询
+        if task_event is not None:
+            self.task_queue.attach_notifier(task_event)
+        # 工作进程持有的模型会话池，每个模型只加载一次并保持预热
+        self.sessions = SessionPool(memory_budget_mb=settings.MODEL_SESSION_MEMORY_MB)
+        self.result_cache = ResultCache() if settings.RESULT_CACHE_ENABLED else None
+        # 任务未携带配置快照时使用的配置缓存 {config_id: (过期时间, 配置)}
+        self._config_cache = {}
+        # 正在处理的任务，由心跳线程定期续约
+        self._leases = set()
+        self._leases_lock = threading.Lock()
+        self._heartbeat_stop = threading.Event()
         self.running = False
     
     def start(self):
         """启动工作进程"""
         self.running = True
-        print("Worker started...")
+        print(f"Worker {self.name} started...")
+        heartbeat = threading.Thread(target=self._heartbeat, name=f"{self.name}-heartbeat", daemon=True)
+        heartbeat.start()
+        if settings.WORKER_BATCH_SIZE > 1:
+            self._check_batching()
         
-        while self.running:
+        while self._should_run():
             try:
-                # 获取下一个任务
-                task = self.task_queue.get_next_task()
+                # 获取下一个任务，没有任务时等待入队通知（超时后兜底轮询）
+                task = self.task_queue.wait_for_task(settings.WORKER_POLL_INTERVAL)
                 if not task:
-                    time.sleep(1)  # 没有任务时等待1秒
                     continue
                 
-                task_id, task_data = task
-                print(f"Processing task {task_id}...")
-                
+                # 开启批量推理时，收集更多待处理任务合并处理
+                tasks = self._collect_batch(task)
+                task_ids = [task_id for task_id, _ in tasks]
+                with self._leases_lock:
+                    self._leases.update(task_ids)
                 try:
-                    # 处理任务
-                    result_path = self._process_task(task_data)
-                    # 完成任务
-                    self.task_queue.complete_task(task_id, result_path=result_path)
-                except Exception as e:
-                    print(f"Error processing task {task_id}: {str(e)}")
-                    self.task_queue.complete_task(task_id, error=str(e))
+                    for _, task_data in tasks:
+                        metrics.observe_queue_wait(task_data)
+                    if len(tasks) > 1:
+                        self._run_batch(tasks)
+                    else:
+                        self._run_task(*task)
+                finally:
+                    # 未能标记完成的任务停止续约，租约过期后由其他工作进程重新执行
+                    with self._leases_lock:
+                        self._leases.difference_update(task_ids)
                 
             except Exception as e:
                 print(f"Worker error: {str(e)}")
-                time.sleep(1)
+                self._wait(1)
+        
+        self._heartbeat_stop.set()
+        print(f"Worker {self.name} stopped.")
+    
+    def _check_batching(self):
+        """开启批量推理时预先加载默认模型，并检查其是否支持批量推理（不支持时输出警告）"""
+        try:
+            model = self._get_config().get('model', 'u2net')
+            check_batching(self.sessions.get(model), model)
+        except Exception as e:
+            print(f"[{self.name}] Failed to check batch inference support: {str(e)}")
+    
+    def _heartbeat(self):
+        """定期续约正在处理的任务；进程崩溃后续约停止，任务在租约过期后重新排队"""
+        while not self._heartbeat_stop.wait(settings.TASK_HEARTBEAT_INTERVAL):
+            with self._leases_lock:
+                task_ids = list(self._leases)
+            for task_id in task_ids:
+                try:
+                    if not self.task_queue.renew_lease(task_id):
+                        print(f"[{self.name}] Lease of task {task_id} expired before renewal")
+                except Exception as e:
+                    print(f"Failed to renew lease of task {task_id}: {str(e)}")
+    
+    def _run_task(self, task_id: str, task_data: dict):
+        """处理单个任务并记录结果"""
+        print(f"[{self.name}] Processing task {task_id}...")
+        self._publish(task_id, 'processing')
+        started = time.perf_counter()
+        timings = {}
+        
+        try:
+            # 处理任务
+            result_path = self._process_task(task_data, timings)
+            # 完成任务
+            self._complete(task_id, task_data, result_path)
+            self._observe(task_data, started, timings)
+        except Exception as e:
+            self._fail(task_id, task_data, e)
+            self._observe(task_data, started, timings, failed=True)
+    
+    def _observe(self, task_data: dict, started: float, timings: Optional[dict], failed: bool = False):
+        """记录任务耗时、各阶段耗时和结果到监控指标"""
+        try:
+            metrics.observe_task(task_data, time.perf_counter() - started, failed)
+            if timings:
+                metrics.observe_stages(timings)
+        except Exception as e:
+            print(f"Failed to record metrics: {str(e)}")
+    
+    def _complete(self, task_id: str, task_data: dict, result_path: Optional[str]):
+        """标记任务完成，并写入结果缓存"""
+        # 写入结果缓存，相同图片和参数再次提交时直接复用
+        cache_key = task_data['params'].get('cache_key')
+        if result_path and cache_key and self.result_cache is not None:
+            self.result_cache.put(cache_key, result_path)
+        
+        if not self.task_queue.complete_task(task_id, result_path=result_path):
+            self._lease_lost(task_id)
+            return
+        self._remove_upload(task_data)
+        self._finish_batch(task_data)
+        self._publish(task_id, 'completed')
+        stats = self.sessions.stats()
+        print(f"Task {task_id} completed (session loads={stats['loads']}, "
+              f"hits={stats['hits']}, evictions={stats['evictions']})")
+    
+    def _fail(self, task_id: str, task_data: dict, error: Exception):
+        """标记任务失败"""
+        print(f"Error processing task {task_id}: {str(error)}")
+        if not self.task_queue.complete_task(task_id, error=str(error)):
+            self._lease_lost(task_id)
+            return
+        self._remove_upload(task_data)
+        self._finish_batch(task_data)
+        self._publish(task_id, 'failed')
+    
+    def _lease_lost(self, task_id: str):
+        """任务的租约已过期并被回收（已重新排队或转入死信），保留上传的原图，不通知状态变更"""
+        print(f"[{self.name}] Lease of task {task_id} expired before completion, result discarded")
+    
+    def _finish_batch(self, task_data: dict):
+        """任务属于批量任务时，检查该批量任务是否已全部结束"""
+        job_id = task_data['params'].get('job_id')
+        if not job_id:
+            return
+        try:
+            self.task_queue.finish_batch(job_id)
+        except Exception as e:
+            print(f"Failed to update batch {job_id}: {str(e)}")
+    
+    def _remove_upload(self, task_data: dict):
+        """任务结束后删除上传的原图（结果已写入任务数据后再删除，任务重新执行时原图仍在）"""
+        input_path = task_data['params'].get('input_path')
+        if input_path:
+            Path(input_path).unlink(missing_ok=True)
+    
+    def _collect_batch(self, first) -> list:
+        """在等待时间内继续领取任务，直到达到批量大小"""
+        if settings.WORKER_BATCH_SIZE <= 1 or first[1]['type'] != "background_removal":
+            return [first]
+        
+        tasks = [first]
+        deadline = time.monotonic() + settings.WORKER_BATCH_MAX_WAIT_MS / 1000
+        while len(tasks) < settings.WORKER_BATCH_SIZE:
+            task = self.task_queue.get_next_task()
+            if task:
+                tasks.append(task)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._wait(min(remaining, 0.005))
+        return tasks
+    
+    def _run_batch(self, tasks: list):
+        """批量处理任务：使用相同模型的背景移除任务合并为一次推理"""
+        groups = {}
+        started = time.perf_counter()
+        for task_id, task_data in tasks:
+            if task_data['type'] != "background_removal":
+                self._run_task(task_id, task_data)
+                continue
+            
+            self._publish(task_id, 'processing')
+            try:
+                job, model = self._prepare_background_job(task_data)
+            except Exception as e:
+                self._fail(task_id, task_data, e)
+                self._observe(task_data, started, None, failed=True)
+                continue
+            # 接收该任务的各阶段耗时
+            job['timings'] = {}
+            groups.setdefault(model, []).append((task_id, task_data, job))
+        
+        for model, items in groups.items():
+            print(f"[{self.name}] Processing batch of {len(items)} tasks with model {model}...")
+            try:
+                session = self.sessions.get(model)
+                check_batching(session, model)
+                errors = change_background_batch([job for _, _, job in items], session)
+            except Exception as e:
+                errors = [e] * len(items)
+            
+            for (task_id, task_data, job), error in zip(items, errors):
+                if error is None:
+                    self._complete(task_id, task_data, job['output_path'])
+                else:
+                    self._fail(task_id, task_data, error)
+                self._observe(task_data, started, job['timings'], failed=error is not None)
     
     def stop(self):
         """停止工作进程"""
         self.running = False
     
-    def _process_task(self, task_data: dict) -> Optional[str]:
-        """处理单个任务"""
-        task_type = task_data['type']
+    def _publish(self, task_id: str, status: str):
+        """通知 API 进程任务状态已变更"""
+        if self.events is None:
+            return
+        try:
+            self.events.put_nowait((task_id, status))
+        except Exception as e:
+            print(f"Failed to publish task event: {str(e)}")
+    
+    def _should_run(self) -> bool:
+        """是否继续领取任务"""
+        if self.stop_event is not None and self.stop_event.is_set():
+            return False
+        return self.running
+    
+    def _wait(self, seconds: float):
+        """等待一段时间，收到停止信号时提前返回"""
+        if self.stop_event is not None:
+            self.stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+    
+    def _prepare_background_job(self, task_data: dict) -> Tuple[dict, str]:
+        """
+        解析背景移除任务的输入、输出路径和配置
+        
+        返回:
+            (change_background 的关键字参数, 模型名称)
+        """
         params = task_data['params']
         
-        # 创建结果目录
+        # 获取输入图片路径
+        input_path = params.get('input_path')
+        if input_path and not os.path.exists(input_path):
+            self._fetch_upload(task_data['id'], input_path)
+        if not input_path or not os.path.exists(input_path):
+            raise ValueError("Input image not found")
+        
+        # 优先使用提交任务时记录的配置快照，保证任务可复现且不需要查询数据库
+        config = params.get('config') or self._get_config(params.get('config_id'))
+        options = change_background_options(config)
+        
+        # 创建结果目录并按输出格式生成输出路径
         result_dir = Path("data/results/images")
         result_dir.mkdir(parents=True, exist_ok=True)
+        output_path = result_dir / f"{task_data['id']}.{result_extension(options['output_format'])}"
+        
+        job = {
+            "input_image": input_path,
+            "output_path": str(output_path),
+            **options
+        }
+        return job, config.get('model', 'u2net')
+    
+    def _fetch_upload(self, task_id: str, input_path: str):
+        """上传文件不在本机磁盘上时（API 在其他节点），从队列后端取回并写入原路径，任务结束后照常删除"""
+        contents = self.task_queue.get_input_bytes(task_id)
+        if contents is None:
+            return
+        Path(input_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(input_path, 'wb') as f:
+            f.write(contents)
+    
+    def _get_config(self, config_id: Optional[int] = None) -> dict:
+        """查询背景移除配置（未指定时为默认配置），结果在进程内缓存 CONFIG_CACHE_TTL 秒"""
+        cached = self._config_cache.get(config_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        db = SessionLocal()
+        try:
+            if config_id:
+                config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.id == config_id).first()
+                if not config:
+                    raise ValueError(f"Configuration {config_id} not found")
+            else:
+                config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.is_default == True).first()
+                if not config:
+                    raise ValueError("No default configuration found")
+            
+            snapshot = config.processing_params()
+        finally:
+            db.close()
+        
+        self._config_cache[config_id] = (time.monotonic() + settings.CONFIG_CACHE_TTL, snapshot)
+        return snapshot
+    
+    def _process_task(self, task_data: dict, timings: Optional[dict] = None) -> Optional[str]:
+        """处理单个任务，timings 不为空时记录各阶段耗时"""
+        task_type = task_data['type']
         
         # 处理不同类型的任务
         if task_type == "background_removal":
-            # 获取输入图片路径
-            input_path = params.get('input_path')
-            if not input_path or not os.path.exists(input_path):
-                raise ValueError("Input image not found")
+            job, model = self._prepare_background_job(task_data)
             
-            # 生成输出路径
-            output_path = result_dir / f"{task_data['id']}.png"
+            # 处理图片
+            change_background(model=model, session=self.sessions.get(model), timings=timings, **job)
             
-            # 获取配置
-            db = SessionLocal()
-            try:
-                config_id = params.get('config_id')
-                if config_id:
-                    config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.id == config_id).first()
-                    if not config:
-                        raise ValueError(f"Configuration {config_id} not found")
-                else:
-                    config = db.query(BackgroundRemovalConfig).filter(BackgroundRemovalConfig.is_default == True).first()
-                    if not config:
-                        raise ValueError("No default configuration found")
-                
-                # 处理图片
-                change_background(
-                    input_image=input_path,
-                    output_path=str(output_path),
-                    model=config.model,
-                    use_alpha_matting=config.use_alpha_matting,
-                    alpha_foreground=config.alpha_foreground,
-                    alpha_background=config.alpha_background,
-                    alpha_erode=config.alpha_erode
-                )
-                
-                return str(output_path)
-            finally:
-                db.close()
+            return job['output_path']
         
         raise ValueError(f"Unknown task type: {task_type}")
 
-def start_worker():
+def start_worker(stop_event=None, name: str = "worker", task_event=None, events=None):
     """启动工作进程"""
-    worker = Worker()
+    if stop_event is not None:
+        # 由进程池统一通过停止事件关闭，忽略终端发送给整个进程组的 Ctrl+C，
+        # 保证正在处理的任务能够完成
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    # 指标写入 API 进程创建的多进程指标目录
+    metrics.init_metrics()
+    worker = Worker(stop_event=stop_event, name=name, task_event=task_event, events=events)
     try:
         worker.start()
     except KeyboardInterrupt:
         worker.stop()
-        print("Worker stopped.")
\ No newline at end of file
+        print("Worker stopped.")
+    finally:
+        # 关闭 band 引擎的分块求解进程
+        shutdown_tile_pool()
+
+class WorkerPool:
+    """
+    工作进程池
+    
+    启动固定数量的工作进程（每个进程持有自己的模型会话池），
+    监控进程状态并重启意外退出的进程，关闭时通过停止事件让进程处理完当前任务后退出。
+    """
+    
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = max(1, concurrency or settings.WORKER_CONCURRENCY)
+        # 确保工作进程使用spawn方式启动，避免OpenMP线程冲突
+        self.ctx = multiprocessing.get_context('spawn')
+        self.stop_event = self.ctx.Event()
+        # 任务入队通知事件，API 进程的任务队列需要通过 attach_notifier 关联
+        self.task_event = self.ctx.Event()
+        # 工作进程上报的任务状态变更事件
+        self.events = self.ctx.Queue()
+        self.processes = []
+        self.restarts = 0
+        self._supervisor = None
+        self._lock = threading.Lock()
+        # 回收过期租约使用的任务队列（在监控线程中创建）
+        self._task_queue = None
+        self._next_sweep = 0.0
+    
+    def _spawn(self, index: int):
+        """启动第 index 个工作进程"""
+        process = self.ctx.Process(
+            target=start_worker,
+            args=(self.stop_event, f"worker-{index}", self.task_event, self.events),
+            name=f"worker-{index}"
+        )
+        process.start()
+        return process
+    
+    def start(self):
+        """启动所有工作进程和监控线程"""
+        with self._lock:
+            self.processes = [self._spawn(i) for i in range(self.concurrency)]
+        self._supervisor = threading.Thread(target=self._supervise, name="worker-supervisor", daemon=True)
+        self._supervisor.start()
+        print(f"Worker pool started with {self.concurrency} processes")
+    
+    def _supervise(self):
+        """监控工作进程，重启崩溃的进程，并定期回收租约过期的任务"""
+        while not self.stop_event.wait(min(settings.WORKER_RESTART_DELAY, settings.TASK_SWEEP_INTERVAL)):
+            with self._lock:
+                for i, process in enumerate(self.processes):
+                    if process.is_alive() or self.stop_event.is_set():
+                        continue
+                    print(f"Worker {process.name} exited with code {process.exitcode}, restarting...")
+                    process.join()
+                    self.processes[i] = self._spawn(i)
+                    self.restarts += 1
+            self._sweep_leases()
+    
+    def _sweep_leases(self):
+        """将租约过期的任务重新排队或转入死信状态，并通知订阅的客户端"""
+        if time.monotonic() < self._next_sweep:
+            return
+        self._next_sweep = time.monotonic() + settings.TASK_SWEEP_INTERVAL
+        try:
+            if self._task_queue is None:
+                self._task_queue = TaskQueue()
+            expired = self._task_queue.expire_leases()
+        except Exception as e:
+            print(f"Failed to expire task leases: {str(e)}")
+            return
+        
+        for task_id, status in expired:
+            if status == 'pending':
+                print(f"Task {task_id} lease expired, requeued for retry")
+            else:
+                print(f"Task {task_id} lease expired too many times, moved to dead letter")
+            metrics.TASKS_EXPIRED.labels("requeued" if status == 'pending' else "dead").inc()
+            self.events.put((task_id, status))
+            if status == 'dead':
+                self._finish_batch(task_id)
+        if expired:
+            # 唤醒空闲的工作进程（重试任务在退避时间之后才能领取）
+            self.task_event.set()
+    
+    def _finish_batch(self, task_id: str):
+        """转入死信状态的任务属于批量任务时，检查该批量任务是否已全部结束"""
+        try:
+            task_data = self._task_queue.get_task_status(task_id)
+            job_id = task_data['params'].get('job_id') if task_data else None
+            if job_id:
+                self._task_queue.finish_batch(job_id)
+        except Exception as e:
+            print(f"Failed to update batch of task {task_id}: {str(e)}")
+    
+    def stop(self, timeout: Optional[float] = None):
+        """停止所有工作进程，等待当前任务完成，超时后强制终止"""
+        timeout = settings.WORKER_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        self.stop_event.set()
+        # 唤醒正在等待任务的工作进程
+        self.task_event.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+        
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            for process in self.processes:
+                process.join(max(0, deadline - time.monotonic()))
+                if process.is_alive():
+                    print(f"Worker {process.name} did not stop in time, terminating...")
+                    process.terminate()
+                    process.join()
+    
+    def alive_count(self) -> int:
+        """存活的工作进程数量"""
+        with self._lock:
+            return sum(1 for process in self.processes if process.is_alive())
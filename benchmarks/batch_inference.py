@@ -0,0 +1,76 @@
+"""
+批量推理吞吐量基准测试
+
+对比不同批量大小下 change_background_batch 的吞吐量（图片/秒）。
+
+用法:
+    python -m benchmarks.batch_inference --model u2netp --images 32 --batch-sizes 1,2,4,8
+    python -m benchmarks.batch_inference --input-dir samples/ --alpha-matting
+"""
+import io
+import os
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_utils import change_background_batch
+from app.utils.session_pool import SessionPool
+
+
+def load_images(input_dir, count, size):
+    """加载测试图片，未指定目录时生成随机图片"""
+    if input_dir:
+        files = sorted(
+            f for f in os.listdir(input_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))
+        )[:count]
+        return [Image.open(os.path.join(input_dir, f)).convert("RGB") for f in files]
+
+    rng = np.random.default_rng(0)
+    return [
+        Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8))
+        for _ in range(count)
+    ]
+
+
+def run(session, images, batch_size, max_size, alpha_matting):
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        jobs = [
+            {
+                "input_image": image,
+                "output_path": io.BytesIO(),
+                "max_size": max_size,
+                "use_alpha_matting": alpha_matting,
+            }
+            for image in images[i:i + batch_size]
+        ]
+        errors = change_background_batch(jobs, session)
+        failed = [e for e in errors if e is not None]
+        if failed:
+            raise failed[0]
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量推理吞吐量基准测试")
+    parser.add_argument("--model", default="u2netp", help="模型名称")
+    parser.add_argument("--input-dir", help="测试图片目录，不指定时使用随机图片")
+    parser.add_argument("--images", type=int, default=32, help="图片数量")
+    parser.add_argument("--size", type=int, default=800, help="随机图片边长")
+    parser.add_argument("--max-size", type=int, default=800, help="处理时的最大尺寸")
+    parser.add_argument("--batch-sizes", default="1,2,4,8", help="逗号分隔的批量大小")
+    parser.add_argument("--alpha-matting", action="store_true", help="开启 alpha matting")
+    args = parser.parse_args()
+
+    images = load_images(args.input_dir, args.images, args.size)
+    session = SessionPool().get(args.model)
+
+    # 预热
+    run(session, images[:1], 1, args.max_size, args.alpha_matting)
+
+    print(f"model={args.model} images={len(images)} alpha_matting={args.alpha_matting}")
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        elapsed = run(session, images, batch_size, args.max_size, args.alpha_matting)
+        print(f"batch={batch_size:3d}  {elapsed:7.2f}s  {len(images) / elapsed:7.2f} img/s")
@@ -0,0 +1,94 @@
+"""
+人脸检测尺寸基准测试
+
+对每个检测尺寸，比较两种解码方式的“解码 + 检测”延迟：
+- resize：按原始分辨率解码后缩小到检测尺寸（头像裁剪接口的方式，需要原图用于裁剪）
+- reduced：使用 IMREAD_REDUCED_* 以降低的分辨率解码（人像检测接口的方式）
+并以原图检测结果为基准，统计检出率和人脸框的平均 IoU。
+
+用法:
+    python -m benchmarks.detection_size --images samples/*.jpg --sizes 0 1280 960 640 480 320
+"""
+import time
+import argparse
+import statistics
+
+from app.utils.image_processing import decode_image, detect_faces, get_face_detector
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def match(reference, faces):
+    """返回与基准人脸框匹配（IoU >= 0.5）的数量和这些匹配的 IoU"""
+    ious = []
+    for ref in reference:
+        best = max((iou(ref, face) for face in faces), default=0.0)
+        if best >= 0.5:
+            ious.append(best)
+    return len(ious), ious
+
+
+def run_full(contents, size):
+    img, _ = decode_image(contents)
+    return detect_faces(img, detection_size=size)
+
+
+def run_reduced(contents, size):
+    img, original_size = decode_image(contents, size or None)
+    return detect_faces(img, detection_size=size, original_size=original_size)
+
+
+def measure(fn, images, size, iterations):
+    timings = []
+    results = []
+    for contents in images:
+        for i in range(iterations):
+            start = time.perf_counter()
+            faces = fn(contents, size)
+            timings.append((time.perf_counter() - start) * 1000)
+        results.append(faces)
+    timings.sort()
+    return timings, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="人脸检测尺寸基准测试")
+    parser.add_argument("--images", nargs="+", required=True, help="测试图片（建议使用相机拍摄的大尺寸 JPEG）")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[0, 1280, 960, 640, 480, 320],
+                        help="检测尺寸列表，0 表示原图检测")
+    parser.add_argument("--iterations", type=int, default=5, help="每张图片的调用次数")
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            images.append(f.read())
+
+    # 预热检测器，并以原图检测结果作为基准
+    get_face_detector()
+    reference = [run_full(contents, 0) for contents in images]
+    total_faces = sum(len(faces) for faces in reference)
+    print(f"images={len(images)} reference_faces={total_faces} iterations={args.iterations}")
+
+    for size in args.sizes:
+        for name, fn in (("resize", run_full), ("reduced", run_reduced)):
+            timings, results = measure(fn, images, size, args.iterations)
+            matched = 0
+            ious = []
+            for ref, faces in zip(reference, results):
+                count, face_ious = match(ref, faces)
+                matched += count
+                ious.extend(face_ious)
+            recall = matched / total_faces if total_faces else 1.0
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"size={size or 'full':>5} {name:8} "
+                  f"p50={timings[len(timings) // 2]:7.2f}ms p95={p95:7.2f}ms "
+                  f"recall={recall:.3f} mean_iou={statistics.mean(ious) if ious else 0.0:.3f}")
@@ -0,0 +1,61 @@
+"""
+人脸检测延迟基准测试
+
+对比每次调用都新建 MediaPipe 检测器（冷启动）与复用检测器（预热）的单次调用延迟。
+
+用法:
+    python -m benchmarks.face_detection --image samples/portrait.jpg --iterations 50
+"""
+import time
+import argparse
+import statistics
+
+import cv2
+import numpy as np
+import mediapipe as mp
+
+from app.utils.image_processing import detect_faces, get_face_detector
+
+
+def cold_detect(image, model_selection, confidence):
+    """旧的实现：每次调用创建新的检测器"""
+    with mp.solutions.face_detection.FaceDetection(
+        model_selection=model_selection, min_detection_confidence=confidence
+    ) as face_detection:
+        return face_detection.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+
+def measure(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings
+
+
+def report(name, timings):
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:6} mean={statistics.mean(timings):7.2f}ms "
+          f"p50={timings[len(timings) // 2]:7.2f}ms p95={p95:7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="人脸检测延迟基准测试")
+    parser.add_argument("--image", help="测试图片，不指定时使用随机图片")
+    parser.add_argument("--iterations", type=int, default=50, help="每种方式的调用次数")
+    parser.add_argument("--model", type=int, default=0, help="检测模型：0 近距离，1 全距离")
+    parser.add_argument("--confidence", type=float, default=0.5, help="最低置信度")
+    args = parser.parse_args()
+
+    if args.image:
+        image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    else:
+        image = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+
+    print(f"image={image.shape[1]}x{image.shape[0]} iterations={args.iterations}")
+    report("cold", measure(lambda: cold_detect(image, args.model, args.confidence), args.iterations))
+
+    get_face_detector(args.model, args.confidence)
+    report("warm", measure(lambda: detect_faces(image, args.model, args.confidence), args.iterations))
@@ -0,0 +1,102 @@
+"""
+混合负载下的排队等待时间基准测试
+
+一个用户一次提交大量批量任务，同时其他用户陆续提交单张图片，对比两种调度方式下各类任务的排队等待时间：
+- fifo: 所有任务进入同一个通道且不区分用户（相当于旧的先进先出队列）
+- fair: 批量任务进入 bulk 通道，单张图片进入 interactive 通道，通道内按用户轮转
+
+工作进程领取任务后休眠 --work-ms 毫秒模拟处理耗时。
+
+用法:
+    python -m benchmarks.fair_queue --backend sqlite --bulk 300 --interactive 30 --workers 2
+"""
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+from app.utils.task_queue import TaskQueue, create_backend
+
+
+def _make_queue(backend_name: str, workdir: str) -> TaskQueue:
+    if backend_name == "sqlite":
+        # 使用临时目录中的数据库，不影响服务的任务数据
+        from app.utils.sqlite_queue import SQLiteQueueBackend
+        return TaskQueue(backend=SQLiteQueueBackend(f"{workdir}/tasks.db"))
+    return TaskQueue(backend=create_backend(backend_name, f"{workdir}/queue", f"{workdir}/results"))
+
+
+def _consumer(backend_name, workdir, stop_event, waits, work_ms):
+    """模拟工作进程：领取任务，记录排队等待时间，按固定耗时处理"""
+    task_queue = _make_queue(backend_name, workdir)
+    while not stop_event.is_set():
+        task = task_queue.get_next_task()
+        if not task:
+            time.sleep(0.005)
+            continue
+        task_id, task_data = task
+        params = task_data['params']
+        waits.put((params['kind'], time.time() - params['enqueued_at']))
+        time.sleep(work_ms / 1000)
+        task_queue.complete_task(task_id, result_path=None)
+
+
+def run(mode, backend_name, bulk, interactive, users, workers, work_ms, mean_gap):
+    ctx = multiprocessing.get_context('spawn')
+    stop_event = ctx.Event()
+    waits = ctx.Queue()
+
+    def submit(task_queue, kind, user_id):
+        lane = "bulk" if kind == "bulk" and mode == "fair" else "interactive"
+        params = {"kind": kind, "enqueued_at": time.time(), "user_id": user_id if mode == "fair" else None}
+        task_queue.add_task("benchmark", params, lane=lane)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        task_queue = _make_queue(backend_name, workdir)
+        consumers = [
+            ctx.Process(target=_consumer, args=(backend_name, workdir, stop_event, waits, work_ms))
+            for _ in range(workers)
+        ]
+
+        # 先堆积一个用户的批量任务，再启动工作进程
+        for _ in range(bulk):
+            submit(task_queue, "bulk", "bulk-user")
+        for consumer in consumers:
+            consumer.start()
+
+        for i in range(interactive):
+            time.sleep(random.expovariate(1 / mean_gap))
+            submit(task_queue, "interactive", f"user-{i % users}")
+
+        results = {"bulk": [], "interactive": []}
+        for _ in range(bulk + interactive):
+            kind, wait = waits.get(timeout=300)
+            results[kind].append(wait)
+        stop_event.set()
+        for consumer in consumers:
+            consumer.join()
+
+    for kind, values in results.items():
+        values.sort()
+
+        def percentile(p):
+            return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+        print(f"[{mode:4}] {kind:11} n={len(values):4} p50={percentile(0.5):8.1f}ms "
+              f"p95={percentile(0.95):8.1f}ms p99={percentile(0.99):8.1f}ms max={values[-1] * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="混合负载下的排队等待时间基准测试")
+    parser.add_argument("--backend", default="file", help="队列后端：file、sqlite 或 redis")
+    parser.add_argument("--bulk", type=int, default=300, help="批量用户一次提交的任务数")
+    parser.add_argument("--interactive", type=int, default=30, help="单张上传的任务数")
+    parser.add_argument("--users", type=int, default=5, help="单张上传的用户数")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--work-ms", type=float, default=20, help="每个任务的模拟处理耗时（毫秒）")
+    parser.add_argument("--mean-gap", type=float, default=0.1, help="单张上传的平均到达间隔（秒）")
+    args = parser.parse_args()
+
+    for mode in ("fifo", "fair"):
+        run(mode, args.backend, args.bulk, args.interactive, args.users, args.workers, args.work_ms, args.mean_gap)
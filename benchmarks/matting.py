@@ -0,0 +1,90 @@
+"""
+边缘细化引擎基准测试
+
+在多个处理尺寸下，对每个引擎（none、guided、band、pymatting）统计细化耗时和进程峰值内存（RSS）。
+每个组合在独立的子进程中运行，峰值内存互不影响；报告的 RSS 增量为细化前后峰值之差。
+
+用法:
+    python -m benchmarks.matting --image samples/portrait.jpg --model u2netp --sizes 400 800 1600
+    python -m benchmarks.matting --sizes 400 800 --erode 5 15 30
+"""
+import time
+import argparse
+import resource
+import multiprocessing
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.utils.matting import MATTING_ENGINES, refine_alpha
+
+
+def synthetic_sample(size):
+    """生成渐变背景上的椭圆主体及其软边掩码"""
+    h, w = size * 3 // 4, size
+    y, x = np.mgrid[0:h, 0:w]
+    image = np.dstack([x * 255 // w, y * 255 // h, np.full((h, w), 128)]).astype(np.uint8)
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.ellipse(mask, (w // 2, h // 2), (w // 4, h // 3), 0, 0, 360, 255, -1)
+    image[mask > 0] = (220, 180, 150)
+    mask = cv2.GaussianBlur(mask, (0, 0), max(1, size / 200))
+    return image, mask
+
+
+def load_sample(path, model, size):
+    """加载图片并缩放到处理尺寸，使用模型生成掩码"""
+    from rembg import remove, new_session
+
+    image = Image.open(path).convert("RGB")
+    scale = size / max(image.size)
+    image = image.resize((int(image.width * scale), int(image.height * scale)), Image.LANCZOS)
+    mask = remove(image, session=new_session(model), only_mask=True)
+    return np.asarray(image), np.asarray(mask)
+
+
+def refine(engine, image, mask, erode):
+    if engine == "pymatting":
+        from rembg.bg import alpha_matting_cutout
+        alpha_matting_cutout(Image.fromarray(image), Image.fromarray(mask), 240, 10, erode)
+    else:
+        refine_alpha(image, mask, engine, 240, 10, erode)
+
+
+def run(engine, image, mask, erode, results):
+    """在子进程中执行一次细化并返回耗时和峰值内存"""
+    # 先在小图上运行一次，排除 pymatting 的 numba JIT 编译时间
+    refine(engine, *synthetic_sample(64), min(erode, 3))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    refine(engine, image, mask, erode)
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 下 ru_maxrss 单位为 KB
+    results.put((elapsed * 1000, after / 1024, (after - before) / 1024))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="边缘细化引擎基准测试")
+    parser.add_argument("--image", help="测试图片，不指定时使用合成图片和掩码")
+    parser.add_argument("--model", default="u2netp", help="生成掩码使用的模型（仅在指定 --image 时使用）")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[400, 800, 1600], help="处理尺寸（长边像素）")
+    parser.add_argument("--erode", nargs="+", type=int, default=[15], help="腐蚀尺寸列表")
+    parser.add_argument("--engines", nargs="+", default=list(MATTING_ENGINES), choices=MATTING_ENGINES)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        if args.image:
+            image, mask = load_sample(args.image, args.model, size)
+        else:
+            image, mask = synthetic_sample(size)
+        for erode in args.erode:
+            for engine in args.engines:
+                results = ctx.Queue()
+                process = ctx.Process(target=run, args=(engine, image, mask, erode, results))
+                process.start()
+                elapsed, peak, delta = results.get()
+                process.join()
+                print(f"size={image.shape[1]}x{image.shape[0]} erode={erode:3} {engine:9} "
+                      f"time={elapsed:9.1f}ms peak_rss={peak:7.1f}MB rss_delta={delta:7.1f}MB")
@@ -0,0 +1,93 @@
+"""
+任务入队到开始处理的延迟基准测试
+
+对比旧的固定轮询（没有任务时 sleep 1 秒）与入队通知两种领取方式，
+输出延迟分布。
+
+用法:
+    python -m benchmarks.queue_latency --tasks 50 --backend file
+"""
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+from app.utils.task_queue import TaskQueue, create_backend
+
+
+def _make_queue(backend_name: str, workdir: str) -> TaskQueue:
+    return TaskQueue(backend=create_backend(backend_name, f"{workdir}/queue", f"{workdir}/results"))
+
+
+def _consumer(mode, backend_name, workdir, task_event, stop_event, latencies, poll_interval):
+    """模拟工作进程：领取任务并记录入队到开始处理的延迟"""
+    task_queue = _make_queue(backend_name, workdir)
+    if mode == "notify":
+        task_queue.attach_notifier(task_event)
+
+    while not stop_event.is_set():
+        if mode == "notify":
+            task = task_queue.wait_for_task(poll_interval)
+        else:
+            task = task_queue.get_next_task()
+            if not task:
+                time.sleep(poll_interval)
+                continue
+        if not task:
+            continue
+
+        task_id, task_data = task
+        latencies.put(time.time() - task_data['params']['enqueued_at'])
+        task_queue.complete_task(task_id, result_path=None)
+
+
+def run(mode: str, backend_name: str, tasks: int, mean_gap: float, poll_interval: float):
+    ctx = multiprocessing.get_context('spawn')
+    task_event = ctx.Event()
+    stop_event = ctx.Event()
+    latencies = ctx.Queue()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        task_queue = _make_queue(backend_name, workdir)
+        task_queue.attach_notifier(task_event)
+
+        consumer = ctx.Process(
+            target=_consumer,
+            args=(mode, backend_name, workdir, task_event, stop_event, latencies, poll_interval)
+        )
+        consumer.start()
+        time.sleep(1)  # 等待消费者进程启动
+
+        for _ in range(tasks):
+            # 请求随机到达，模拟空闲工作进程收到新任务
+            time.sleep(random.expovariate(1 / mean_gap))
+            task_queue.add_task("benchmark", {"enqueued_at": time.time()})
+
+        results = [latencies.get(timeout=30) for _ in range(tasks)]
+        stop_event.set()
+        task_event.set()
+        consumer.join()
+
+    results.sort()
+
+    def percentile(p):
+        return results[min(len(results) - 1, int(len(results) * p))] * 1000
+
+    print(f"[{mode:6}] n={len(results)} "
+          f"mean={statistics.mean(results) * 1000:.1f}ms "
+          f"p50={percentile(0.5):.1f}ms p90={percentile(0.9):.1f}ms "
+          f"p99={percentile(0.99):.1f}ms max={results[-1] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="任务入队到开始处理的延迟基准测试")
+    parser.add_argument("--tasks", type=int, default=50, help="任务数量")
+    parser.add_argument("--backend", default="file", help="队列后端：file 或 sqlite")
+    parser.add_argument("--mean-gap", type=float, default=0.5, help="任务到达的平均间隔（秒）")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="轮询间隔（秒）")
+    args = parser.parse_args()
+
+    for mode in ("poll", "notify"):
+        run(mode, args.backend, args.tasks, args.mean_gap, args.poll_interval)
@@ -0,0 +1,105 @@
+"""
+背景移除结果编码格式的耗时与体积基准测试
+
+对同一张 RGBA 结果图片按不同格式和参数编码，统计编码耗时（中位数）、体积（相对默认 PNG 的比例）
+以及解码后透明通道的最大误差，用于选择在出口带宽、存储和编码耗时之间折中的格式：
+- png:  压缩级别 1、6（默认）、9
+- webp: 质量 75、85、100（无损），透明通道无损或有损（lossy_alpha）
+- avif: 质量 50、70、85（需要 Pillow 11.2 以上且编译了 libavif）
+
+未指定 --image 时生成一张带柔和边缘的合成商品图（默认 3840x2160）。
+
+用法:
+    python -m benchmarks.result_formats --image data/results/images/<task_id>.png --repeat 3
+"""
+import io
+import time
+import argparse
+import statistics
+
+import numpy as np
+from PIL import Image
+
+from app.utils.result_encoding import available_formats, save_result
+
+# (格式, 质量, PNG 压缩级别, 透明通道有损)
+VARIANTS = (
+    ("png", None, 1, False),
+    ("png", None, 6, False),
+    ("png", None, 9, False),
+    ("webp", 75, None, False),
+    ("webp", 75, None, True),
+    ("webp", 85, None, False),
+    ("webp", 85, None, True),
+    ("webp", 100, None, False),
+    ("avif", 50, None, False),
+    ("avif", 70, None, False),
+    ("avif", 85, None, False),
+)
+
+
+def _synthetic_image(width, height):
+    """生成带渐变、纹理和柔和边缘透明通道的合成商品图"""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    rgb = np.stack([
+        128 + 100 * np.sin(xx / 90),
+        128 + 100 * np.cos(yy / 70),
+        128 + 60 * np.sin((xx + yy) / 150),
+    ], axis=-1) + rng.normal(0, 6, (height, width, 3))
+    # 椭圆形前景，边缘有几十像素的过渡带
+    distance = ((xx - width / 2) / (width * 0.3)) ** 2 + ((yy - height / 2) / (height * 0.4)) ** 2
+    alpha = np.clip((1.0 - distance) * 20, 0, 1) * 255
+    rgba = np.dstack([np.clip(rgb, 0, 255), alpha]).astype(np.uint8)
+    return Image.fromarray(rgba, "RGBA")
+
+
+def _encode(image, output_format, quality, png_compression, lossy_alpha):
+    buffer = io.BytesIO()
+    started = time.perf_counter()
+    save_result(image, buffer, output_format, quality, png_compression, lossy_alpha)
+    return time.perf_counter() - started, buffer.getvalue()
+
+
+def run(image, repeat):
+    alpha = np.asarray(image.getchannel("A"), dtype=np.int16)
+    supported = available_formats()
+    baseline = None
+    print(f"image {image.width}x{image.height}, formats available: {', '.join(supported)}")
+    for output_format, quality, png_compression, lossy_alpha in VARIANTS:
+        if output_format not in supported:
+            print(f"[{output_format:4}] skipped (encoder not available)")
+            continue
+        timings = []
+        for _ in range(repeat):
+            seconds, content = _encode(image, output_format, quality, png_compression, lossy_alpha)
+            timings.append(seconds)
+        if baseline is None and output_format == "png" and png_compression == 6:
+            baseline = len(content)
+
+        with Image.open(io.BytesIO(content)) as decoded:
+            decoded_alpha = np.asarray(decoded.convert("RGBA").getchannel("A"), dtype=np.int16)
+        alpha_error = int(np.abs(decoded_alpha - alpha).max())
+
+        if output_format == "png":
+            label = f"level={png_compression}"
+        else:
+            label = f"q={quality}" + (" lossy-alpha" if lossy_alpha else "")
+        ratio = f"{len(content) / baseline:6.2f}x" if baseline else "     -"
+        print(f"[{output_format:4}] {label:18} encode={statistics.median(timings) * 1000:8.1f}ms "
+              f"size={len(content) / 1024:9.1f}KB vs png-6={ratio} alpha-max-err={alpha_error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="背景移除结果编码格式的耗时与体积基准测试")
+    parser.add_argument("--image", help="RGBA 结果图片路径，不指定时使用合成图片")
+    parser.add_argument("--width", type=int, default=3840, help="合成图片宽度（像素）")
+    parser.add_argument("--height", type=int, default=2160, help="合成图片高度（像素）")
+    parser.add_argument("--repeat", type=int, default=3, help="每种参数的编码次数（取中位数）")
+    args = parser.parse_args()
+
+    if args.image:
+        source = Image.open(args.image).convert("RGBA")
+    else:
+        source = _synthetic_image(args.width, args.height)
+    run(source, args.repeat)
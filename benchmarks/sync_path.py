@@ -0,0 +1,95 @@
+"""
+背景移除同步处理与异步任务的端到端延迟基准测试
+
+对运行中的服务依次发送请求，统计两条路径从提交到拿到结果图片的耗时分布：
+- async: POST /remove 提交任务，轮询 /status 直到完成，再 GET /result 下载结果
+- sync:  POST /remove?sync=true 直接返回 PNG；不满足同步条件而返回任务ID的请求按异步流程等待，并计入回退次数
+
+每个请求使用不同的随机图片，避免命中结果缓存。
+
+用法:
+    python -m benchmarks.sync_path --url http://localhost:8000 --token <JWT> --requests 30 --size 320
+"""
+import json
+import time
+import uuid
+import argparse
+import statistics
+import urllib.request
+
+import cv2
+import numpy as np
+
+
+def _random_png(size):
+    image = np.random.default_rng().integers(0, 255, (size * 3 // 4, size, 3), dtype=np.uint8)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def _post_image(url, content):
+    """以 multipart/form-data 上传图片，返回 (Content-Type, 响应内容)"""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="image.png"\r\n'
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    request = urllib.request.Request(
+        url, data=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.headers.get("Content-Type", ""), response.read()
+
+
+def _get(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+def _wait_result(base, task_id, token, poll_interval):
+    """轮询任务状态直到完成，下载结果图片"""
+    while True:
+        status = json.loads(_get(f"{base}/status/{task_id}?token={token}"))
+        if status["status"] == "completed":
+            return _get(f"{base}/result/{task_id}?token={token}")
+        if status["status"] in ("failed", "dead"):
+            raise RuntimeError(status.get("error"))
+        time.sleep(poll_interval)
+
+
+def run(path, base, token, requests, size, poll_interval):
+    latencies = []
+    fallbacks = 0
+    query = f"token={token}" + ("&sync=true" if path == "sync" else "")
+    for _ in range(requests):
+        content = _random_png(size)
+        started = time.perf_counter()
+        content_type, body = _post_image(f"{base}/remove?{query}", content)
+        if not content_type.startswith("image/"):
+            if path == "sync":
+                fallbacks += 1
+            _wait_result(base, json.loads(body)["task_id"], token, poll_interval)
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"[{path:5}] n={len(latencies)} mean={statistics.mean(latencies) * 1000:.1f}ms "
+          f"p50={percentile(0.5):.1f}ms p90={percentile(0.9):.1f}ms p99={percentile(0.99):.1f}ms "
+          f"max={latencies[-1] * 1000:.1f}ms fallbacks={fallbacks}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="背景移除同步处理与异步任务的端到端延迟基准测试")
+    parser.add_argument("--url", default="http://localhost:8000", help="服务地址")
+    parser.add_argument("--token", required=True, help="JWT 令牌")
+    parser.add_argument("--requests", type=int, default=30, help="每条路径的请求数")
+    parser.add_argument("--size", type=int, default=320, help="测试图片宽度（像素）")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="异步路径轮询任务状态的间隔（秒）")
+    args = parser.parse_args()
+
+    base = f"{args.url.rstrip('/')}/api/v1/background"
+    for path in ("async", "sync"):
+        run(path, base, args.token, args.requests, args.size, args.poll_interval)
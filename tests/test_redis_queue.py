@@ -0,0 +1,151 @@
+"""
+RedisQueueBackend 测试（使用 fakeredis，不需要 Redis 服务器）
+
+运行:
+    python -m pytest tests/test_redis_queue.py
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core.config import settings
+from app.utils.redis_queue import RedisQueueBackend
+
+
+def _task(task_id, status="pending", **extra):
+    task_data = {
+        "id": task_id,
+        "type": "background_removal",
+        "params": {},
+        "status": status,
+        "created_at": datetime.now().isoformat(),
+    }
+    task_data.update(extra)
+    return task_data
+
+
+@pytest.fixture
+def backend():
+    return RedisQueueBackend(client=fakeredis.FakeRedis(), prefix="test", result_ttl=60)
+
+
+def test_add_and_claim_in_order(backend):
+    backend.add(_task("a"))
+    backend.add(_task("b"))
+    assert backend.depth() == {"pending": 2, "processing": 0}
+
+    assert backend.claim_next()["id"] == "a"
+    assert backend.get("a")["status"] == "processing"
+    assert backend.claim_next()["id"] == "b"
+    assert backend.claim_next() is None
+    assert backend.depth() == {"pending": 0, "processing": 2}
+
+
+def test_claim_rotates_between_users(backend):
+    for task_id, user in (("a1", "alice"), ("a2", "alice"), ("b1", "bob")):
+        backend.add(_task(task_id, params={"user_id": user}))
+
+    claimed = [backend.claim_next()["id"] for _ in range(3)]
+    assert claimed == ["a1", "b1", "a2"]
+
+
+def test_complete_stores_result(backend, tmp_path):
+    result_path = tmp_path / "a.png"
+    result_path.write_bytes(b"image")
+    backend.add(_task("a"))
+    backend.claim_next()
+
+    backend.complete("a", result_path=str(result_path))
+    task_data = backend.get("a")
+    assert task_data["status"] == "completed"
+    assert task_data["result_path"] == str(result_path)
+    assert backend.get_result_bytes("a") == b"image"
+    assert not backend.renew("a")
+    assert backend.depth() == {"pending": 0, "processing": 0}
+
+
+def test_complete_with_error(backend):
+    backend.add(_task("a"))
+    backend.claim_next()
+
+    backend.complete("a", error="boom")
+    task_data = backend.get("a")
+    assert task_data["status"] == "failed"
+    assert task_data["error"] == "boom"
+
+
+def test_expired_lease_is_retried_then_dead(backend, monkeypatch):
+    monkeypatch.setattr(settings, "TASK_LEASE_SECONDS", 0)
+    monkeypatch.setattr(settings, "TASK_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(settings, "TASK_MAX_ATTEMPTS", 2)
+    backend.add(_task("a"))
+
+    backend.claim_next()
+    time.sleep(0.01)
+    assert backend.expire_leases() == [("a", "pending")]
+    assert backend.get("a")["attempts"] == 1
+
+    assert backend.claim_next()["id"] == "a"
+    time.sleep(0.01)
+    assert backend.expire_leases() == [("a", "dead")]
+    assert backend.get("a")["status"] == "dead"
+    assert backend.claim_next() is None
+
+
+def test_expire_leases_skips_finished_task(backend, monkeypatch):
+    monkeypatch.setattr(settings, "TASK_LEASE_SECONDS", 0)
+    backend.add(_task("a"))
+    backend.claim_next()
+    # 模拟任务完成时租约恰好过期：任务已完成，但租约记录还在
+    backend.client.hset(backend._key("task", "a"), "status", "completed")
+    time.sleep(0.01)
+
+    assert backend.expire_leases() == []
+    assert backend.get("a")["status"] == "completed"
+    assert backend.claim_next() is None
+
+
+def test_renew_extends_lease(backend, monkeypatch):
+    backend.add(_task("a"))
+    backend.claim_next()
+    monkeypatch.setattr(settings, "TASK_LEASE_SECONDS", 60)
+
+    assert backend.renew("a")
+    assert backend.expire_leases() == []
+    assert backend.get("a")["status"] == "processing"
+
+
+def test_cleanup_expired_uses_completion_time(backend, tmp_path):
+    result_path = tmp_path / "a.png"
+    result_path.write_bytes(b"image")
+    # 入队时间很早，但刚刚完成，不应被清理
+    backend.add(_task("a", created_at=(datetime.now() - timedelta(hours=2)).isoformat()))
+    backend.claim_next()
+    backend.complete("a", result_path=str(result_path))
+
+    assert backend.cleanup_expired(timedelta(hours=1)) == 0
+    assert result_path.exists()
+
+    # 结束时间早于保留时长后删除本地结果图片
+    old = time.time() - 7200
+    os.utime(result_path, (old, old))
+    backend.client.zadd(backend._key("expiry"), {"a": old})
+    assert backend.cleanup_expired(timedelta(hours=1)) == len(b"image")
+    assert not result_path.exists()
+
+
+def test_upload_is_stored_until_task_finishes(backend, tmp_path):
+    input_path = tmp_path / "a.jpg"
+    input_path.write_bytes(b"upload")
+    backend.add(_task("a", params={"input_path": str(input_path)}))
+    # 工作节点不共享 API 节点的磁盘时从 Redis 读取上传的图片
+    input_path.unlink()
+    assert backend.get_input_bytes("a") == b"upload"
+
+    backend.claim_next()
+    backend.complete("a")
+    assert backend.get_input_bytes("a") is None